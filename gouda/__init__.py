@@ -1 +1,31 @@
 __version__ = '0.1.13'
+
+
+# setup.py imports this module, so the functions below import their
+# implementations only when they are called
+
+
+def decode_many(*args, **kwargs):
+    """Generator of the results of decoding many images - see
+    gouda.batch.decode_many
+    """
+    from gouda.batch import decode_many
+    return decode_many(*args, **kwargs)
+
+
+def decode_async(*args, **kwargs):
+    """Coroutine that decodes an image or the image file at a path without
+    blocking the event loop - see gouda.aio.decode_async. Requires Python 3.5
+    or later.
+    """
+    from gouda.aio import decode_async
+    return decode_async(*args, **kwargs)
+
+
+def decode_many_async(*args, **kwargs):
+    """Asynchronous iterator of the results of decoding many images - see
+    gouda.aio.decode_many_async. Requires Python 3.5 or later.
+    """
+    from gouda.aio import decode_many_async
+    return decode_many_async(*args, **kwargs)
+
@@ -0,0 +1,189 @@
+"""Decoding barcodes from asyncio coroutines.
+
+Requires Python 3.5 or later.
+"""
+import asyncio
+import collections
+import multiprocessing
+import threading
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from gouda.batch import STRATEGIES, decode_source
+from gouda.util import debug_print
+
+
+class AsyncDecoder(object):
+    """Decodes images in a pool of max_workers threads - by default, one per
+    CPU - on behalf of coroutines.
+
+    At most limit images are decoded concurrently by engines of the same
+    type. limits is a dict mapping types of engines to limits; limit is
+    used for other types and by default is max_workers. Engines that are not
+    safe to use from more than one thread should be given a limit of 1.
+
+    An AsyncDecoder should be used with a single event loop.
+    """
+    def __init__(self, max_workers=None, limits=None, limit=None):
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.limits = dict(limits or {})
+        self.limit = limit or self.max_workers
+        if self.limit < 1 or any(v < 1 for v in self.limits.values()):
+            raise ValueError('Invalid limits')
+        self._executor = ThreadPoolExecutor(self.max_workers)
+        # Mapping from type of engine to asyncio.Semaphore
+        self._semaphores = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        "Shuts down the pool of threads once decoding has finished"
+        self._executor.shutdown(wait=False)
+
+    def _semaphore(self, engine):
+        engine_type = type(engine)
+        if engine_type not in self._semaphores:
+            self._semaphores[engine_type] = asyncio.Semaphore(
+                self.limits.get(engine_type, self.limit)
+            )
+        return self._semaphores[engine_type]
+
+    async def decode(self, source, engine, strategies=STRATEGIES,
+                     read_greyscale=False, timeout=None):
+        """Returns the gouda.batch.DecodeResult of the first of strategies to
+        find barcodes in source - an image as a numpy array or the path to an
+        image file, read as greyscale if read_greyscale is True. timeout is
+        the time allowed for decoding - see gouda.batch.decode_image.
+
+        If the coroutine is cancelled, strategies stop at their next call to
+        the engine.
+        """
+        loop = asyncio.get_event_loop()
+        cancelled = threading.Event()
+        async with self._semaphore(engine):
+            future = loop.run_in_executor(self._executor, partial(
+                decode_source, source, strategies, engine, read_greyscale,
+                timeout, cancelled
+            ))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                debug_print('Cancelling decoding of [{0}]'.format(
+                    'image' if hasattr(source, 'shape') else source
+                ))
+                cancelled.set()
+                # Hold the engine until the strategy has stopped
+                await asyncio.wait([future])
+                raise
+
+    def decode_many(self, sources, engine, strategies=STRATEGIES,
+                    read_greyscale=False, timeout=None, ahead=None):
+        """Returns an asynchronous iterator of tuples (source, result, error)
+        for each of sources - images or paths - in order. result is a
+        DecodeResult, error is None if the image was decoded, otherwise a
+        formatted traceback.
+
+        Up to ahead images - by default, the limit for the type of engine -
+        are decoded ahead of the one most recently iterated.
+        """
+        ahead = ahead or self.limits.get(type(engine), self.limit)
+        return _DecodeIterator(
+            partial(
+                self.decode, engine=engine, strategies=strategies,
+                read_greyscale=read_greyscale, timeout=timeout
+            ),
+            sources, ahead
+        )
+
+
+class _DecodeIterator(object):
+    "Asynchronous iterator returned by AsyncDecoder.decode_many"
+    def __init__(self, decode, sources, ahead):
+        if ahead < 1:
+            raise ValueError('Invalid ahead [{0}]'.format(ahead))
+        self._decode = decode
+        self._sources = iter(sources)
+        self._ahead = ahead
+        self._pending = collections.deque()
+
+    async def _result(self, source):
+        try:
+            return source, await self._decode(source), None
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return source, None, traceback.format_exc()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self._sources and len(self._pending) < self._ahead:
+            try:
+                source = next(self._sources)
+            except StopIteration:
+                self._sources = None
+            else:
+                self._pending.append(
+                    asyncio.ensure_future(self._result(source))
+                )
+
+        if self._pending:
+            try:
+                return await self._pending.popleft()
+            except asyncio.CancelledError:
+                await self.aclose()
+                raise
+        else:
+            raise StopAsyncIteration
+
+    async def aclose(self):
+        "Cancels the decoding of images that have not been iterated"
+        self._sources = None
+        pending, self._pending = list(self._pending), collections.deque()
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+
+# Used by decode_async and decode_many_async
+_DEFAULT = None
+
+
+def _default():
+    global _DEFAULT
+    if not _DEFAULT:
+        _DEFAULT = AsyncDecoder()
+    return _DEFAULT
+
+
+async def decode_async(source, engine, strategies=STRATEGIES,
+                       read_greyscale=False, timeout=None, decoder=None):
+    """Returns the DecodeResult of source, decoded by decoder - by default, an
+    AsyncDecoder that is shared by callers of this function. See
+    AsyncDecoder.decode.
+    """
+    decoder = decoder or _default()
+    return await decoder.decode(
+        source, engine, strategies, read_greyscale, timeout
+    )
+
+
+def decode_many_async(sources, engine, strategies=STRATEGIES,
+                      read_greyscale=False, timeout=None, ahead=None,
+                      decoder=None):
+    """Returns an asynchronous iterator of tuples (source, result, error),
+    decoded by decoder - by default, an AsyncDecoder that is shared by callers
+    of this function. See AsyncDecoder.decode_many.
+    """
+    decoder = decoder or _default()
+    return decoder.decode_many(
+        sources, engine, strategies, read_greyscale, timeout, ahead
+    )
@@ -0,0 +1,673 @@
+"""Decoding barcodes in batches of images
+"""
+from __future__ import print_function
+
+import itertools
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+import traceback
+
+from collections import namedtuple
+from functools import partial
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from multiprocessing import SimpleQueue
+except ImportError:
+    # Python 2
+    from multiprocessing.queues import SimpleQueue
+
+import gouda.util
+
+from gouda import reader
+from gouda.gouda_error import DeadlineExceeded, GoudaError
+from gouda.strategies.resize import resize, scale_and_sharpening
+from gouda.strategies.roi.roi import roi
+from gouda.timing import CountingEngine, Timing, clock
+from gouda.util import (debug_print, describe_strategy, read_image,
+                        read_image_data)
+
+
+# Strategies that are used if none are given
+STRATEGIES = (resize, roi)
+
+
+class DecodeResult(namedtuple('DecodeResult', ['strategy', 'barcodes'])):
+    """The result of decoding an image - a tuple (strategy, barcodes), as
+    returned by the strategy that found barcodes, or (None, []) if no barcodes
+    were found. timing is a gouda.timing.Timing or None.
+    """
+    def __new__(cls, strategy, barcodes, timing=None):
+        self = super(DecodeResult, cls).__new__(cls, strategy, barcodes)
+        self.timing = timing
+        return self
+
+    def __reduce__(self):
+        # timing is not a member of the tuple so would otherwise be lost when
+        # results are sent from worker processes
+        return self.__class__, (self.strategy, self.barcodes, self.timing)
+
+
+def decode_image(img, strategies, engine, timing=None, timeout=None,
+                 cancelled=None):
+    """Returns the DecodeResult of the first of strategies to find barcodes in
+    img. The time spent by each strategy and the calls made to the engine are
+    recorded in timing, a new Timing if not given.
+
+    If timeout is given, strategies are stopped at their next call to the
+    engine once timeout seconds have passed. The result then holds whatever
+    barcodes the stopped strategy had found and timing.timed_out is True.
+
+    If cancelled, a threading.Event, is given and is set, strategies are
+    stopped at their next call to the engine and DecodingCancelled is raised.
+    """
+    timing = timing or Timing()
+    deadline = clock() + timeout if timeout is not None else None
+    engine = CountingEngine(engine, deadline, cancelled)
+    result = None
+    for strategy in strategies:
+        calls, start = engine.calls, clock()
+        try:
+            result = strategy(img, engine)
+        except DeadlineExceeded:
+            result = None
+        timing.strategies.append((
+            describe_strategy(strategy), clock() - start, engine.calls - calls
+        ))
+        if result:
+            # Found a barcode
+            break
+        elif engine.timed_out:
+            debug_print('Timed out after [{0}] engine calls'.format(
+                engine.calls
+            ))
+            break
+
+    timing.engine_calls += engine.calls
+    timing.engine += engine.elapsed
+    timing.handoff += engine.handoff
+    timing.timed_out = engine.timed_out
+    if result:
+        strategy, barcodes = result
+        scale = scale_and_sharpening(strategy)
+        if scale:
+            timing.scale, timing.sharpening = scale
+        return DecodeResult(strategy, barcodes, timing)
+    else:
+        # No barcode was found
+        return DecodeResult(None, [], timing)
+
+
+def _read(path, read_greyscale, reduction=1):
+    "Returns a tuple (img, timing)"
+    timing = Timing()
+    start = clock()
+    img = read_image(path, read_greyscale, reduction)
+    timing.read = clock() - start
+    timing.reduction = reduction
+    return img, timing
+
+
+def _decode_read(path, img, strategies, engine, read_greyscale, timing,
+                 timeout=None, cancelled=None):
+    """Returns the result of decode_image for img, read from path at
+    timing.reduction. If no barcodes are found in a reduced image, the image
+    at path is read again at full size and decoded.
+    """
+    start = clock()
+    result = decode_image(img, strategies, engine, timing, timeout, cancelled)
+    if 1 < timing.reduction and not result.barcodes and not timing.timed_out:
+        debug_print('Reading [{0}] at full size'.format(path))
+        read = clock()
+        img = read_image(path, read_greyscale)
+        timing.read += clock() - read
+        timing.reduction = 1
+        if img is not None:
+            if timeout is not None:
+                # The time allowed is shared by both attempts
+                timeout = max(0, timeout - (clock() - start))
+            result = decode_image(
+                img, strategies, engine, timing, timeout, cancelled
+            )
+    return result
+
+
+def _cached(result):
+    "Returns a DecodeResult of a result (strategy, barcodes) from a cache"
+    strategy, barcodes = result
+    return DecodeResult(strategy, barcodes, Timing(cached=True))
+
+
+def decode_path(path, strategies, engine, read_greyscale, timeout=None,
+                cancelled=None, reduction=1):
+    """Reads the image at path and returns the result of decode_image.
+
+    If reduction is greater than 1, the image is first read and decoded at
+    1 / reduction of its size - see gouda.util.read_image - and is read and
+    decoded at full size only if no barcodes are found.
+    """
+    img, timing = _read(path, read_greyscale, reduction)
+    if img is None:
+        # Most likely not an image
+        return DecodeResult(None, [], timing)
+    else:
+        return _decode_read(
+            path, img, strategies, engine, read_greyscale, timing, timeout,
+            cancelled
+        )
+
+
+def _is_image(source):
+    "True if source is an image rather than the path to one"
+    return hasattr(source, 'shape')
+
+
+def decode_source(source, strategies, engine, read_greyscale, timeout=None,
+                  cancelled=None, reduction=1):
+    """Returns the result of decode_image, if source is an image as a numpy
+    array, or decode_path, if source is the path to an image file
+    """
+    if _is_image(source):
+        return decode_image(
+            source, strategies, engine, timeout=timeout, cancelled=cancelled
+        )
+    else:
+        return decode_path(
+            source, strategies, engine, read_greyscale, timeout, cancelled,
+            reduction
+        )
+
+
+def decode_data(data, strategies, engine, read_greyscale, timeout=None):
+    """Returns the result of decode_image for the image encoded in data - the
+    contents of an image file. Raises ValueError if data is not an image.
+    """
+    timing = Timing()
+    start = clock()
+    img = read_image_data(data, read_greyscale)
+    timing.read = clock() - start
+    if img is None:
+        raise ValueError('Not an image')
+    else:
+        return decode_image(img, strategies, engine, timing, timeout)
+
+
+def _lookup_or_read(path, read_greyscale, cache, reduction=1):
+    """Returns a tuple (path, img, timing, error, cached result). The image is
+    read only if there is no cached result. path can also be an image, which
+    is neither read nor cached.
+    """
+    if _is_image(path):
+        return path, path, Timing(), None, None
+    try:
+        cached = cache.lookup(path) if cache else None
+        if cached is None:
+            img, timing = _read(path, read_greyscale, reduction)
+        else:
+            img, timing, cached = None, None, _cached(cached)
+    except Exception:
+        return path, None, None, traceback.format_exc(), None
+    else:
+        return path, img, timing, None, cached
+
+
+def _store(cache, path, result):
+    """Stores result in cache for the file at path, unless there is no result,
+    because of an error, or the image timed out, in which case the digest
+    computed by cache.lookup is discarded
+    """
+    if cache and not _is_image(path):
+        if result is None or result.timing.timed_out:
+            cache.discard(path)
+        else:
+            cache.store(path, result)
+
+
+def decode_serially(paths, strategies, engine, read_greyscale, prefetch=0,
+                    prefetch_bytes=None, cache=None, timeout=None,
+                    reduction=1):
+    """Generator of tuples (path, result, error) for each image in paths -
+    paths of image files or images as numpy arrays.
+
+    result is a DecodeResult. error is None if the image was processed,
+    otherwise a formatted traceback.
+
+    If prefetch is greater than zero, up to that many images are read in
+    background threads while the current image is decoded - see
+    gouda.reader.prefetch_images.
+
+    If cache is given, images with cached results are not read or decoded, and
+    new results are stored in the cache - see gouda.cache.ResultCache.
+    Results of images that timed out are not stored.
+
+    timeout is the time allowed for decoding each image - see decode_image.
+    Image files are first read at 1 / reduction of their size - see
+    decode_path.
+    """
+    read = partial(
+        _lookup_or_read, read_greyscale=read_greyscale, cache=cache,
+        reduction=reduction
+    )
+    if prefetch:
+        images = reader.prefetch(
+            read, paths, depth=prefetch, max_bytes=prefetch_bytes
+        )
+    else:
+        images = (read(path) for path in paths)
+
+    for path, img, timing, error, cached in images:
+        if error:
+            _store(cache, path, None)
+            yield path, None, error
+        elif cached is not None:
+            yield path, cached, None
+        else:
+            if img is None:
+                # Most likely not an image
+                result = DecodeResult(None, [], timing)
+            else:
+                try:
+                    if _is_image(path):
+                        result = decode_image(
+                            img, strategies, engine, timing, timeout
+                        )
+                    else:
+                        result = _decode_read(
+                            path, img, strategies, engine, read_greyscale,
+                            timing, timeout
+                        )
+                except Exception:
+                    _store(cache, path, None)
+                    yield path, None, traceback.format_exc()
+                    continue
+
+            _store(cache, path, result)
+            yield path, result, None
+
+
+class ReorderBuffer(object):
+    """Holds items that arrive out of order and releases them in the order of
+    their indices
+    """
+    def __init__(self, start=0):
+        self._next = start
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def push(self, index, item):
+        if index < self._next or index in self._pending:
+            raise ValueError('Duplicate index [{0}]'.format(index))
+        self._pending[index] = item
+
+    def ready(self):
+        """Generator of items that are contiguous with those already released
+        """
+        while self._next in self._pending:
+            item = self._pending.pop(self._next)
+            self._next += 1
+            yield item
+
+
+# State of a worker process, set by _init_worker
+_WORKER = {}
+
+
+def _init_worker(engine_factory, strategies, read_greyscale, timeout,
+                 reduction, debug, started):
+    gouda.util.DEBUG_PRINT = debug
+    # An exception raised here would kill the worker, which the pool would
+    # replace, without end - the error is instead reported by _worker_error
+    try:
+        engine, error = engine_factory(), None
+    except Exception:
+        engine, error = None, traceback.format_exc()
+    _WORKER.update({
+        'engine': engine,
+        'error': error,
+        'strategies': strategies,
+        'read_greyscale': read_greyscale,
+        'timeout': timeout,
+        'reduction': reduction,
+        'started': started,
+    })
+    # Pool workers leave by os._exit, so atexit handlers are not called, but
+    # finalizers are. Engines such as StecosEngine remove their files.
+    multiprocessing.util.Finalize(None, _close_worker_engine, exitpriority=10)
+
+
+def _close_worker_engine():
+    engine = _WORKER.get('engine')
+    if hasattr(engine, 'close'):
+        debug_print('Closing engine')
+        engine.close()
+
+
+def _worker_error():
+    "The traceback of the error raised by engine_factory, or None"
+    return _WORKER['error']
+
+
+def _decode_in_worker(token, index, source):
+    # Tells the parent which image this process is decoding, so that it can
+    # be reported if the process dies. SimpleQueue writes before returning.
+    _WORKER['started'].put((os.getpid(), token, index))
+    if _WORKER['error']:
+        return index, None, _WORKER['error']
+
+    # source is not sent back - it could be a large image
+    try:
+        result = decode_source(
+            source, _WORKER['strategies'], _WORKER['engine'],
+            _WORKER['read_greyscale'], _WORKER['timeout'],
+            reduction=_WORKER['reduction']
+        )
+    except Exception:
+        return index, None, traceback.format_exc()
+    else:
+        return index, result, None
+
+
+def _decode_data_in_worker(token, data):
+    _WORKER['started'].put((os.getpid(), token, 0))
+    if _WORKER['error']:
+        raise GoudaError(_WORKER['error'])
+    return decode_data(
+        data, _WORKER['strategies'], _WORKER['engine'],
+        _WORKER['read_greyscale'], _WORKER['timeout']
+    )
+
+
+class DecoderPool(object):
+    """Decodes images in a pool of worker processes.
+
+    Each worker constructs its own engine once by calling engine_factory,
+    which must be picklable - the values returned by engine_options() are.
+    Strategies must also be picklable.
+
+    If ordered is True, results are reported in the order in which paths are
+    given, otherwise as soon as they are available. At most backlog images are
+    either being decoded or waiting to be reported.
+
+    timeout is the time allowed for decoding each image - see decode_image.
+    Image files are first read at 1 / reduction of their size - see
+    decode_path.
+
+    GoudaError is raised if engine_factory raises an exception. Images whose
+    results cannot be sent back, and images that were being decoded by a
+    worker that died - for example, within an engine's C code - are reported
+    with an error; the pool replaces workers that die.
+    """
+
+    # Seconds between checks for images that were lost
+    POLL_SECONDS = 0.5
+
+    def __init__(self, engine_factory, strategies, read_greyscale,
+                 processes=None, ordered=True, backlog=None, timeout=None,
+                 reduction=1):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.ordered = ordered
+        self.backlog = backlog or 4 * self.processes
+        if self.backlog < 1:
+            raise ValueError('Invalid backlog [{0}]'.format(self.backlog))
+
+        # Mapping from pid to the tuple (token, index) of the image that the
+        # worker most recently started to decode
+        self._running = {}
+        self._running_lock = threading.Lock()
+        self._started = SimpleQueue()
+        # Distinguishes the images of each call to imap and decode_data
+        self._tokens = itertools.count()
+        # Number of images lost with workers that died
+        self.lost = 0
+
+        debug_print('Starting [{0}] worker processes'.format(self.processes))
+        self._pool = multiprocessing.Pool(
+            self.processes, _init_worker,
+            (engine_factory, strategies, read_greyscale, timeout, reduction,
+             gouda.util.DEBUG_PRINT, self._started)
+        )
+        error = self._pool.apply(_worker_error)
+        if error:
+            self._pool.terminate()
+            self._pool.join()
+            raise GoudaError(
+                'Unable to create engine in worker process\n{0}'.format(error)
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        # The pool waits without end for images that were lost with a worker
+        # to be decoded, so cannot be closed gracefully
+        if exc_type or self.lost:
+            self._pool.terminate()
+        else:
+            self._pool.close()
+        self._pool.join()
+
+    def decode_data(self, data):
+        """Returns the result of decode_data for the image encoded in data,
+        computed by one of the worker processes. Raises GoudaError if the
+        worker died. Can be called from more than one thread.
+        """
+        token = next(self._tokens)
+        task = self._pool.apply_async(_decode_data_in_worker, (token, data))
+        while True:
+            try:
+                return task.get(self.POLL_SECONDS)
+            except multiprocessing.TimeoutError:
+                if list(self._lost(token)) and not task.ready():
+                    with self._running_lock:
+                        self.lost += 1
+                    raise GoudaError('Worker process died decoding image')
+
+    def _lost(self, token):
+        """Generator of the indices of images of token that were started by
+        workers that have since died
+        """
+        with self._running_lock:
+            while not self._started.empty():
+                pid, started_token, index = self._started.get()
+                self._running[pid] = (started_token, index)
+            alive = set(p.pid for p in self._pool._pool if p.exitcode is None)
+            for pid in [p for p in self._running if p not in alive]:
+                running_token, index = self._running[pid]
+                if running_token == token:
+                    debug_print('Worker [{0}] died'.format(pid))
+                    del self._running[pid]
+                    yield index
+
+    def _check_tasks(self, token, tasks, sources, done):
+        """Puts on done an error for each image in tasks, a mapping from index
+        to AsyncResult, that either failed without its callback being called
+        or was lost with its worker
+        """
+        for index, result in list(tasks.items()):
+            if index not in sources:
+                # Already reported
+                del tasks[index]
+            elif result.ready() and not result.successful():
+                # For example, a result that could not be pickled
+                del tasks[index]
+                try:
+                    result.get()
+                except Exception:
+                    done.put((index, None, traceback.format_exc(), False))
+        for index in list(self._lost(token)):
+            result = tasks.pop(index, None)
+            if result is not None and not result.ready():
+                self.lost += 1
+                error = 'Worker process died decoding [{0}]'.format(
+                    sources[index]
+                )
+                done.put((index, None, error, False))
+
+    def imap(self, paths, cache=None):
+        """Generator of tuples (path, result, error), as decode_serially.
+
+        paths is consumed by a separate thread, so results are reported as
+        soon as they are available even if paths blocks - for example, when
+        waiting for new files to appear.
+
+        If cache is given, images with cached results are not sent to the
+        worker processes, and new results are stored in the cache. Results of
+        images that timed out are not stored.
+        """
+        # Items are tuples (index, result, error, cached) or a _FeedEnd
+        done = queue.Queue()
+        # Limits the number of images that are being decoded or are waiting to
+        # be reported
+        slots = threading.Semaphore(self.backlog)
+        stopped = threading.Event()
+        # Mapping from index to path, of images that have not been reported
+        sources = {}
+        # Mapping from index to AsyncResult, of images sent to workers
+        tasks = {}
+        token = next(self._tokens)
+
+        def decoded(item):
+            done.put(item + (False,))
+
+        def feed():
+            count = 0
+            try:
+                for index, path in enumerate(paths):
+                    slots.acquire()
+                    if stopped.is_set():
+                        break
+                    sources[index] = path
+                    try:
+                        result = None
+                        if cache and not _is_image(path):
+                            result = cache.lookup(path)
+                    except Exception:
+                        done.put((index, None, traceback.format_exc(), True))
+                    else:
+                        if result is not None:
+                            result = _cached(result)
+                            done.put((index, result, None, True))
+                        else:
+                            tasks[index] = self._pool.apply_async(
+                                _decode_in_worker, (token, index, path),
+                                callback=decoded
+                            )
+                    count += 1
+            except Exception as e:
+                done.put(_FeedEnd(count, e))
+            else:
+                done.put(_FeedEnd(count, None))
+
+        feeder = threading.Thread(target=feed, name='DecoderPool feeder')
+        feeder.daemon = True
+        feeder.start()
+
+        buffer = ReorderBuffer()
+        reported, total = 0, None
+        try:
+            while total is None or reported < total:
+                try:
+                    item = done.get(timeout=self.POLL_SECONDS)
+                except queue.Empty:
+                    self._check_tasks(token, tasks, sources, done)
+                    continue
+                if isinstance(item, _FeedEnd):
+                    if item.error:
+                        raise item.error
+                    total = item.count
+                    continue
+
+                index, result, error, cached = item
+                path = sources.pop(index)
+                if not cached:
+                    _store(cache, path, result)
+
+                if self.ordered:
+                    buffer.push(index, (path, result, error))
+                    ready = list(buffer.ready())
+                else:
+                    ready = [(path, result, error)]
+
+                for item in ready:
+                    reported += 1
+                    slots.release()
+                    yield item
+        finally:
+            stopped.set()
+            # Wake the feeder if it is waiting for a slot
+            slots.release()
+
+
+class _FeedEnd(object):
+    "Sent by DecoderPool's feeder when it has consumed all paths"
+    def __init__(self, count, error):
+        self.count, self.error = count, error
+
+
+def decode_many(sources, engine, strategies=STRATEGIES, read_greyscale=False,
+                processes=1, ordered=True, prefetch=0, prefetch_bytes=None,
+                cache=None, timeout=None, pool=None, reduction=1):
+    """Generator of tuples (source, result, error) for each of sources -
+    paths of image files or images as numpy arrays. sources can be any
+    iterable, including one that never ends, and is consumed only as results
+    are wanted.
+
+    result is a DecodeResult. error is None if the image was processed,
+    otherwise a formatted traceback. Paths that are not images give results
+    with no barcodes.
+
+    If processes is 1, images are decoded in this process by engine, with up
+    to prefetch images being read ahead - see decode_serially. Otherwise
+    images are decoded by a DecoderPool of processes worker processes - one
+    per CPU if processes is None or 0 - that lasts as long as the generator;
+    engine must then be a picklable function that returns an engine, such as
+    the values returned by engine_options(). If ordered is False, results are
+    reported as soon as they are available rather than in the order of
+    sources. Alternatively, pool, an existing DecoderPool, is used, in which
+    case the engine, strategies and other settings are those of the pool.
+
+    If cache is given, cached results are reported for images that have
+    already been decoded - see gouda.cache.ResultCache. timeout is the time
+    allowed for decoding each image - see decode_image. Image files are first
+    read at 1 / reduction of their size - see decode_path.
+    """
+    if pool:
+        return pool.imap(sources, cache)
+    elif 1 == processes:
+        return decode_serially(
+            sources, strategies, engine, read_greyscale, prefetch,
+            prefetch_bytes, cache, timeout, reduction
+        )
+    else:
+        return _decode_in_pool(
+            sources, engine, strategies, read_greyscale, processes or None,
+            ordered, cache, timeout, reduction
+        )
+
+
+def _decode_in_pool(sources, engine_factory, strategies, read_greyscale,
+                    processes, ordered, cache, timeout, reduction):
+    "Generator of results of a DecoderPool that lasts as long as it does"
+    pool = DecoderPool(
+        engine_factory, strategies, read_greyscale, processes, ordered,
+        timeout=timeout, reduction=reduction
+    )
+    finished = False
+    try:
+        for item in pool.imap(sources, cache):
+            yield item
+        finished = True
+    finally:
+        if finished:
+            pool.__exit__(None, None, None)
+        else:
+            # Abandon images that are being decoded
+            pool.__exit__(GeneratorExit, None, None)
@@ -0,0 +1,3 @@
+"""Benchmarks of engines and strategies over a synthetic corpus of specimen
+images - see gouda.benchmarks.run
+"""
@@ -0,0 +1,218 @@
+"""A deterministic corpus of synthetic specimen images that carry labels with
+known Code 128 and Data Matrix barcodes
+"""
+import json
+
+from collections import namedtuple
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .symbols import code128_modules, datamatrix_modules
+
+
+CODE128 = 'Code 128'
+DATAMATRIX = 'Data Matrix'
+
+# Parameters of labels, chosen at random for each label
+ANGLES = (0, 2, 10, 45, 90, 180)
+CONTRASTS = (1.0, 0.6, 0.3)
+# Sizes of modules as fractions of the width of the image
+CODE128_MODULES = (0.001, 0.0015, 0.0025)
+DATAMATRIX_MODULES = (0.003, 0.005, 0.008)
+
+# Widths of images, in pixels. Images have an aspect ratio of 4:3.
+WIDTHS = (1024, 2048, 4096)
+
+
+Specimen = namedtuple('Specimen', ['name', 'img', 'labels'])
+Label = namedtuple(
+    'Label', ['symbology', 'data', 'module', 'angle', 'contrast']
+)
+
+
+def _label_image(modules, module, contrast, bar_height=None):
+    """Returns a float32 greyscale image of a paper label that carries the
+    symbol described by modules - a 1D or 2D array of bools - and a mask of the
+    label
+    """
+    if 1 == modules.ndim:
+        quiet = 10
+        modules = np.tile(modules, (bar_height, 1))
+    else:
+        quiet = 4
+    modules = np.pad(modules, quiet, 'constant', constant_values=False)
+    paper = 235.0
+    ink = paper - contrast * (paper - 20.0)
+    img = np.where(modules, ink, paper).astype(np.float32)
+    img = cv2.resize(
+        img, (img.shape[1] * module, img.shape[0] * module),
+        interpolation=cv2.INTER_NEAREST
+    )
+    return img, np.ones_like(img)
+
+
+def _rotate(img, mask, angle):
+    "Rotates img and mask by angle degrees, expanding them to fit"
+    height, width = img.shape
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width = int(np.ceil(height * sin + width * cos))
+    new_height = int(np.ceil(height * cos + width * sin))
+    matrix[0, 2] += new_width / 2.0 - width / 2.0
+    matrix[1, 2] += new_height / 2.0 - height / 2.0
+    size = (new_width, new_height)
+    return (
+        cv2.warpAffine(img, matrix, size, flags=cv2.INTER_LINEAR),
+        cv2.warpAffine(mask, matrix, size, flags=cv2.INTER_LINEAR),
+    )
+
+
+def _background(rng, width, height):
+    "A greyscale float32 image of a specimen on a tray"
+    # Uneven illumination
+    lighting = cv2.resize(
+        rng.normal(0, 8, (6, 8)).astype(np.float32), (width, height),
+        interpolation=cv2.INTER_CUBIC
+    )
+    img = np.full((height, width), 200.0, dtype=np.float32) + lighting
+
+    # The specimen - a dark ellipse in the upper part of the image
+    centre = (
+        int(width * rng.uniform(0.3, 0.7)), int(height * rng.uniform(0.2, 0.35))
+    )
+    axes = (
+        int(width * rng.uniform(0.15, 0.3)), int(height * rng.uniform(0.08, 0.15))
+    )
+    cv2.ellipse(
+        img, centre, axes, rng.uniform(0, 180), 0, 360,
+        float(rng.uniform(60, 110)), -1
+    )
+    return img
+
+
+def _paste(img, label, mask, region, rng):
+    """Pastes label, using mask, at a random position within region
+    (left, top, right, bottom) of img. Returns False if label does not fit.
+    """
+    left, top, right, bottom = region
+    height, width = label.shape
+    if width > right - left or height > bottom - top:
+        return False
+    x = left + rng.randint(0, right - left - width + 1)
+    y = top + rng.randint(0, bottom - top - height + 1)
+    target = img[y:y + height, x:x + width]
+    target[:] = mask * label + (1 - mask) * target
+    return True
+
+
+def _place_label(img, rng, region, symbology, data, module, angle, contrast):
+    """Draws a label within region, shrinking modules until it fits. Returns
+    the Label or None if it could not be fitted.
+    """
+    while module >= 1:
+        if CODE128 == symbology:
+            modules = code128_modules(data)
+            label, mask = _label_image(modules, module, contrast, 40)
+        else:
+            label, mask = _label_image(
+                datamatrix_modules(data), module, contrast
+            )
+        label, mask = _rotate(label, mask, angle)
+        if _paste(img, label, mask, region, rng):
+            return Label(symbology, data, module, angle, contrast)
+        module -= 1
+    return None
+
+
+def specimen(index, seed=0, widths=WIDTHS):
+    """Returns the Specimen at index within the corpus given by seed and
+    widths. The same image is returned for the same arguments.
+    """
+    rng = np.random.RandomState([seed, index])
+    width = widths[index % len(widths)]
+    height = width * 3 // 4
+    img = _background(rng, width, height)
+
+    # Labels lie side-by-side in the lower part of the image
+    regions = (
+        (0, int(height * 0.5), width // 2, height),
+        (width // 2, int(height * 0.5), width, height),
+    )
+    labels = []
+    for region, symbology, sizes in zip(
+            regions, (CODE128, DATAMATRIX),
+            (CODE128_MODULES, DATAMATRIX_MODULES)):
+        data = 'BM{0:09d}'.format(rng.randint(0, 10 ** 9))
+        module = max(1, int(round(width * sizes[rng.randint(len(sizes))])))
+        label = _place_label(
+            img, rng, region, symbology, data, module,
+            ANGLES[rng.randint(len(ANGLES))],
+            CONTRASTS[rng.randint(len(CONTRASTS))]
+        )
+        if label:
+            labels.append(label)
+
+    return Specimen(
+        'specimen-{0:04d}'.format(index), _capture(img, rng), labels
+    )
+
+
+def _capture(img, rng):
+    "img as it is captured by a camera"
+    # Optical blur and sensor noise
+    img = cv2.GaussianBlur(img, (0, 0), 0.6)
+    img += rng.normal(0, 3, img.shape).astype(np.float32)
+    grey = np.clip(img, 0, 255).astype(np.uint8)
+
+    # A slightly warm colour cast
+    return cv2.merge([
+        cv2.subtract(grey, 12), cv2.subtract(grey, 4), grey
+    ])
+
+
+def empty_specimen(index, seed=0, widths=WIDTHS):
+    """Returns a Specimen without labels, to measure the time that is spent
+    searching images that do not contain barcodes
+    """
+    # Seeded differently to the specimens with labels
+    rng = np.random.RandomState([seed, index, 1])
+    width = widths[index % len(widths)]
+    img = _background(rng, width, width * 3 // 4)
+    return Specimen('empty-{0:04d}'.format(index), _capture(img, rng), [])
+
+
+def specimens(count, seed=0, widths=WIDTHS):
+    """Generator of the first count Specimens of the corpus given by seed and
+    widths. Images are generated as they are iterated, so the whole corpus is
+    not held in memory.
+    """
+    for index in range(count):
+        yield specimen(index, seed, widths)
+
+
+def empty_specimens(count, seed=0, widths=WIDTHS):
+    "Generator of the first count empty Specimens of the corpus"
+    for index in range(count):
+        yield empty_specimen(index, seed, widths)
+
+
+def write_corpus(directory, count, seed=0, widths=WIDTHS):
+    """Writes the images of the corpus to directory as PNG files, together
+    with labels.json, which describes the labels in each image
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        directory.mkdir(parents=True)
+    labels = {}
+    for s in specimens(count, seed, widths):
+        path = directory / (s.name + '.png')
+        cv2.imwrite(str(path), s.img)
+        labels[path.name] = [l._asdict() for l in s.labels]
+
+    with open(str(directory / 'labels.json'), 'w') as f:
+        f.write(json.dumps(
+            {'seed': seed, 'widths': list(widths), 'labels': labels},
+            indent=2, sort_keys=True
+        ))
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""Measures the throughput and recall of engines and strategies over the
+synthetic corpus
+"""
+from __future__ import print_function
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+
+from functools import partial
+
+import cv2
+import numpy as np
+
+import gouda
+import gouda.util
+
+from gouda.batch import decode_image
+from gouda.engines.composite import MODES
+from gouda.engines.options import engine_factory, engine_options
+from gouda.gouda_error import GoudaError
+from gouda.strategies.resize import resize
+from gouda.strategies.roi.roi import roi
+from gouda.timing import clock
+from gouda.util import barcode_text
+
+from .corpus import (CODE128, DATAMATRIX, WIDTHS, empty_specimens, specimens,
+                     write_corpus)
+
+
+STRATEGIES = {
+    'resize': resize,
+    'resize-coarse': partial(resize, search='coarse'),
+    'resize-module': partial(resize, search='module'),
+    'roi': roi,
+}
+
+
+def benchmark(engine, strategy, corpus):
+    """Decodes each Specimen in corpus using strategy and engine and returns
+    a dict of measurements. Only the time spent decoding is measured.
+    Specimens without labels are also measured on their own, because the time
+    taken to give up on an image that has no barcodes can be much greater than
+    the time taken to decode one that has.
+    """
+    seconds, images, calls, unexpected, decoded = 0.0, 0, 0, 0, 0
+    empty, empty_seconds = 0, 0.0
+    labels = dict((s, 0) for s in (CODE128, DATAMATRIX))
+    found = dict((s, 0) for s in (CODE128, DATAMATRIX))
+    for specimen in corpus:
+        start = clock()
+        result = decode_image(specimen.img, [strategy], engine)
+        elapsed = clock() - start
+        seconds += elapsed
+        images += 1
+        if not specimen.labels:
+            empty += 1
+            empty_seconds += elapsed
+        calls += result.timing.engine_calls
+
+        values = set(barcode_text(b.data) for b in result.barcodes)
+        expected = set(label.data for label in specimen.labels)
+        unexpected += len(values - expected)
+        if values & expected:
+            decoded += 1
+        for label in specimen.labels:
+            labels[label.symbology] += 1
+            if label.data in values:
+                found[label.symbology] += 1
+
+    recall = dict(
+        (s, float(found[s]) / labels[s] if labels[s] else None) for s in labels
+    )
+    recall['all'] = (
+        float(sum(found.values())) / sum(labels.values())
+        if sum(labels.values()) else None
+    )
+    return {
+        'images': images,
+        'seconds': seconds,
+        'images_per_second': images / seconds if seconds else None,
+        'engine_calls_per_image': float(calls) / images if images else None,
+        # Images without labels
+        'empty_images': empty,
+        'seconds_per_empty_image': empty_seconds / empty if empty else None,
+        # Images in which at least one label was found
+        'decoded': decoded,
+        'engine_calls_per_decode': (
+            float(calls) / decoded if decoded else None
+        ),
+        'labels': labels,
+        'found': found,
+        'recall': recall,
+        'unexpected': unexpected,
+    }
+
+
+def run(engines, strategies, count, seed=0, widths=WIDTHS, empty=0):
+    """Returns a report of benchmark for each of engines - a dict mapping
+    names to functions that return an engine - and each of strategies - a
+    dict mapping names to strategies - over count specimens followed by empty
+    specimens without labels
+    """
+    results = []
+    for engine_name in sorted(engines):
+        engine = engines[engine_name]()
+        for strategy_name in sorted(strategies):
+            gouda.util.debug_print('Benchmarking [{0}] [{1}]'.format(
+                engine_name, strategy_name
+            ))
+            result = benchmark(
+                engine, strategies[strategy_name],
+                itertools.chain(
+                    specimens(count, seed, widths),
+                    empty_specimens(empty, seed, widths)
+                )
+            )
+            result.update({'engine': engine_name, 'strategy': strategy_name})
+            results.append(result)
+
+    return {
+        'versions': {
+            'gouda': gouda.__version__,
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+        },
+        'platform': sys.platform,
+        'corpus': {
+            'count': count, 'empty': empty, 'seed': seed,
+            'widths': list(widths)
+        },
+        'results': results,
+    }
+
+
+def print_table(report, file=None):
+    "Writes a table of the results in report"
+    file = file if file else sys.stdout
+    line = ('{0:<16} {1:<14} {2:>10} {3:>12} {4:>13} {5:>9} {6:>9} {7:>9} '
+            '{8:>9}')
+    print(line.format(
+        'Engine', 'Strategy', 'Images/s', 'Calls/image', 'Calls/decode',
+        'Code 128', 'DM', 'All', 'Empty s'
+    ), file=file)
+
+    def formatted(value, format):
+        return '-' if value is None else format.format(value)
+
+    for r in report['results']:
+        print(line.format(
+            r['engine'], r['strategy'],
+            formatted(r['images_per_second'], '{0:.2f}'),
+            formatted(r['engine_calls_per_image'], '{0:.1f}'),
+            formatted(r['engine_calls_per_decode'], '{0:.1f}'),
+            formatted(r['recall'][CODE128], '{0:.2f}'),
+            formatted(r['recall'][DATAMATRIX], '{0:.2f}'),
+            formatted(r['recall']['all'], '{0:.2f}'),
+            formatted(r['seconds_per_empty_image'], '{0:.3f}'),
+        ), file=file)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description=('Measures the throughput and recall of engines and '
+                     'strategies over a synthetic corpus of specimen images')
+    )
+    parser.add_argument('--debug', '-d', action='store_true')
+    parser.add_argument(
+        '--engine', action='append', metavar='ENGINE',
+        help=('Engine to benchmark - one engine or two or more joined by '
+              '+; can be given more than once. Default: all.')
+    )
+    parser.add_argument(
+        '--combine', choices=MODES, default='all',
+        help='How engines joined by + are combined'
+    )
+    parser.add_argument(
+        '--strategy', action='append', choices=sorted(STRATEGIES.keys()),
+        help='Strategy to benchmark; can be given more than once. Default: all.'
+    )
+    parser.add_argument(
+        '--count', type=int, default=12,
+        help='Number of images in the corpus'
+    )
+    parser.add_argument(
+        '--empty', type=int, default=4,
+        help=('Number of images without barcodes, used to measure the time '
+              'spent on images in which nothing is found')
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--widths', default=','.join(str(w) for w in WIDTHS),
+        help='Comma-separated widths of images, in pixels'
+    )
+    parser.add_argument(
+        '--output', '-o', metavar='PATH',
+        help='Write the report to PATH as JSON'
+    )
+    parser.add_argument(
+        '--write-corpus', metavar='DIRECTORY',
+        help=('Write the images of the corpus to DIRECTORY, together with a '
+              'description of their labels, and exit')
+    )
+    parser.add_argument('-v', '--version', action='version',
+                        version='%(prog)s ' + gouda.__version__)
+
+    args = parser.parse_args(args)
+
+    gouda.util.DEBUG_PRINT = args.debug
+
+    try:
+        widths = [int(w) for w in args.widths.split(',')]
+    except ValueError:
+        parser.error('Invalid --widths [{0}]'.format(args.widths))
+    if args.count < 1:
+        parser.error('--count must be at least 1')
+    elif args.empty < 0:
+        parser.error('--empty must not be negative')
+
+    if args.write_corpus:
+        write_corpus(args.write_corpus, args.count, args.seed, widths)
+        return
+
+    options = engine_options()
+    if args.engine:
+        try:
+            options = dict(
+                (e, engine_factory(e, options, args.combine))
+                for e in args.engine
+            )
+        except ValueError as e:
+            parser.error(str(e))
+    elif not options:
+        raise GoudaError('No engines are available')
+
+    strategies = STRATEGIES
+    if args.strategy:
+        strategies = dict((s, STRATEGIES[s]) for s in args.strategy)
+
+    report = run(
+        options, strategies, args.count, args.seed, widths, args.empty
+    )
+    print_table(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(report, indent=2, sort_keys=True))
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,265 @@
+"""Encoders of the barcodes that are drawn in synthetic images - Code 128 and
+square, single-region ECC 200 Data Matrix
+"""
+import numpy as np
+
+
+# Widths of the alternating bars and spaces of each Code 128 symbol value
+_CODE128_PATTERNS = (
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213',
+    '122312', '132212', '221213', '221312', '231212', '112232', '122132',
+    '122231', '113222', '123122', '123221', '223211', '221132', '221231',
+    '213212', '223112', '312131', '311222', '321122', '321221', '312212',
+    '322112', '322211', '212123', '212321', '232121', '111323', '131123',
+    '131321', '112313', '132113', '132311', '211313', '231113', '231311',
+    '112133', '112331', '132131', '113123', '113321', '133121', '313121',
+    '211331', '231131', '213113', '213311', '213131', '311123', '311321',
+    '331121', '312113', '312311', '332111', '314111', '221411', '431111',
+    '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114',
+    '413111', '241112', '134111', '111242', '121142', '121241', '114212',
+    '124112', '124211', '411212', '421112', '421211', '212141', '214121',
+    '412121', '111143', '111341', '131141', '114113', '114311', '411113',
+    '411311', '113141', '114131', '311141', '411131', '211412', '211214',
+    '211232', '2331112',
+)
+
+_CODE128_CODE_C = 99
+_CODE128_START_B = 104
+_CODE128_START_C = 105
+_CODE128_STOP = 106
+
+
+def code128_values(text):
+    """Returns a list of the Code 128 symbol values, including start, check
+    and stop, that encode text - printable ASCII. Code set B is used, switching
+    to code set C for a trailing run of four or more digits.
+    """
+    if not text or any(not 32 <= ord(c) < 127 for c in text):
+        raise ValueError('Invalid text [{0}]'.format(text))
+
+    # Length of the trailing run of digits, rounded down to an even number
+    digits = len(text) - len(text.rstrip('0123456789'))
+    digits -= digits % 2
+    if digits < 4:
+        digits = 0
+    head, tail = text[:len(text) - digits], text[len(text) - digits:]
+
+    if head:
+        values = [_CODE128_START_B] + [ord(c) - 32 for c in head]
+        if tail:
+            values.append(_CODE128_CODE_C)
+    else:
+        values = [_CODE128_START_C]
+    values += [int(tail[i:i + 2]) for i in range(0, len(tail), 2)]
+
+    check = (values[0] + sum(i * v for i, v in enumerate(values[1:], 1))) % 103
+    return values + [check, _CODE128_STOP]
+
+
+def code128_modules(text):
+    """Returns a 1D array of bools, True for dark modules, of the Code 128
+    symbol that encodes text, without quiet zones
+    """
+    modules = []
+    for value in code128_values(text):
+        for index, width in enumerate(_CODE128_PATTERNS[value]):
+            # Patterns start with a bar
+            modules.extend([0 == index % 2] * int(width))
+    return np.array(modules, dtype=bool)
+
+
+# Sizes of square, single-region ECC 200 symbols - (size in modules including
+# the finder pattern, number of data codewords, number of error correction
+# codewords)
+_DATAMATRIX_SIZES = (
+    (10, 3, 5), (12, 5, 7), (14, 8, 10), (16, 12, 12), (18, 18, 14),
+    (20, 22, 18), (22, 30, 20), (24, 36, 24), (26, 44, 28),
+)
+
+
+def _datamatrix_data(text):
+    "ASCII encodation of text - digit pairs are encoded in a single codeword"
+    codewords, i = [], 0
+    while i < len(text):
+        if text[i:i + 2].isdigit() and 2 == len(text[i:i + 2]):
+            codewords.append(130 + int(text[i:i + 2]))
+            i += 2
+        else:
+            if ord(text[i]) > 127:
+                raise ValueError('Invalid text [{0}]'.format(text))
+            codewords.append(ord(text[i]) + 1)
+            i += 1
+    return codewords
+
+
+def _gf256_tables():
+    # Galois field of 256 elements with the prime modulus polynomial 301
+    exp, log = [0] * 255, [0] * 256
+    value = 1
+    for power in range(255):
+        exp[power], log[value] = value, power
+        value <<= 1
+        if value & 0x100:
+            value ^= 301
+    return exp, log
+
+
+_GF_EXP, _GF_LOG = _gf256_tables()
+
+
+def _gf_multiply(a, b):
+    if a and b:
+        return _GF_EXP[(_GF_LOG[a] + _GF_LOG[b]) % 255]
+    else:
+        return 0
+
+
+def _reed_solomon(data, n):
+    "Returns the n Reed-Solomon error correction codewords of data"
+    # Coefficients of the generator polynomial (x - 2)(x - 2^2)...(x - 2^n),
+    # highest power first
+    generator = [1]
+    for power in range(1, n + 1):
+        root = _GF_EXP[power]
+        generator = [
+            c ^ _gf_multiply(root, p)
+            for c, p in zip(generator + [0], [0] + generator)
+        ]
+
+    remainder = [0] * n
+    for codeword in data:
+        factor = codeword ^ remainder[0]
+        remainder = remainder[1:] + [0]
+        remainder = [
+            r ^ _gf_multiply(factor, g)
+            for r, g in zip(remainder, generator[1:])
+        ]
+    return remainder
+
+
+def _datamatrix_place(nrow, ncol, codewords):
+    """Returns a nrow x ncol list of lists of the bits of codewords, placed
+    following the algorithm in ISO/IEC 16022 annex F
+    """
+    array = [[None] * ncol for _ in range(nrow)]
+
+    def module(row, col, index, bit):
+        if row < 0:
+            row += nrow
+            col += 4 - ((nrow + 4) % 8)
+        if col < 0:
+            col += ncol
+            row += 4 - ((ncol + 4) % 8)
+        # Bit 1 is the most significant
+        array[row][col] = bool((codewords[index] >> (8 - bit)) & 1)
+
+    def utah(row, col, index):
+        positions = (
+            (row - 2, col - 2), (row - 2, col - 1), (row - 1, col - 2),
+            (row - 1, col - 1), (row - 1, col), (row, col - 2),
+            (row, col - 1), (row, col),
+        )
+        for bit, (r, c) in enumerate(positions, 1):
+            module(r, c, index, bit)
+
+    def corner(positions, index):
+        for bit, (r, c) in enumerate(positions, 1):
+            module(r, c, index, bit)
+
+    corner1 = (
+        (nrow - 1, 0), (nrow - 1, 1), (nrow - 1, 2), (0, ncol - 2),
+        (0, ncol - 1), (1, ncol - 1), (2, ncol - 1), (3, ncol - 1),
+    )
+    corner2 = (
+        (nrow - 3, 0), (nrow - 2, 0), (nrow - 1, 0), (0, ncol - 4),
+        (0, ncol - 3), (0, ncol - 2), (0, ncol - 1), (1, ncol - 1),
+    )
+    corner3 = (
+        (nrow - 3, 0), (nrow - 2, 0), (nrow - 1, 0), (0, ncol - 2),
+        (0, ncol - 1), (1, ncol - 1), (2, ncol - 1), (3, ncol - 1),
+    )
+    corner4 = (
+        (nrow - 1, 0), (nrow - 1, ncol - 1), (0, ncol - 3), (0, ncol - 2),
+        (0, ncol - 1), (1, ncol - 3), (1, ncol - 2), (1, ncol - 1),
+    )
+
+    index, row, col = 0, 4, 0
+    while True:
+        if row == nrow and 0 == col:
+            corner(corner1, index)
+            index += 1
+        if row == nrow - 2 and 0 == col and ncol % 4:
+            corner(corner2, index)
+            index += 1
+        if row == nrow - 2 and 0 == col and 4 == ncol % 8:
+            corner(corner3, index)
+            index += 1
+        if row == nrow + 4 and 2 == col and 0 == ncol % 8:
+            corner(corner4, index)
+            index += 1
+
+        # Sweep upwards and to the right
+        while True:
+            if row < nrow and col >= 0 and array[row][col] is None:
+                utah(row, col, index)
+                index += 1
+            row -= 2
+            col += 2
+            if not (row >= 0 and col < ncol):
+                break
+        row += 1
+        col += 3
+
+        # Sweep downwards and to the left
+        while True:
+            if row >= 0 and col < ncol and array[row][col] is None:
+                utah(row, col, index)
+                index += 1
+            row += 2
+            col -= 2
+            if not (row < nrow and col >= 0):
+                break
+        row += 3
+        col += 1
+
+        if not (row < nrow or col < ncol):
+            break
+
+    # Fill the fixed pattern in the lower right corner, if not used
+    if array[nrow - 1][ncol - 1] is None:
+        array[nrow - 1][ncol - 1] = array[nrow - 2][ncol - 2] = True
+        array[nrow - 1][ncol - 2] = array[nrow - 2][ncol - 1] = False
+    return array
+
+
+def datamatrix_modules(text):
+    """Returns a square 2D array of bools, True for dark modules, of the
+    smallest square, single-region ECC 200 Data Matrix symbol that encodes
+    text - ASCII - without a quiet zone
+    """
+    data = _datamatrix_data(text)
+    for size, n_data, n_error in _DATAMATRIX_SIZES:
+        if len(data) <= n_data:
+            break
+    else:
+        raise ValueError('Text too long [{0}]'.format(text))
+
+    # Pad
+    if len(data) < n_data:
+        data.append(129)
+    while len(data) < n_data:
+        pad = 129 + (149 * (len(data) + 1)) % 253 + 1
+        data.append(pad - 254 if pad > 254 else pad)
+
+    codewords = data + _reed_solomon(data, n_error)
+    region = _datamatrix_place(size - 2, size - 2, codewords)
+
+    modules = np.zeros((size, size), dtype=bool)
+    modules[1:-1, 1:-1] = region
+    # Finder pattern - solid left and bottom edges, alternating top and right
+    modules[:, 0] = True
+    modules[-1, :] = True
+    modules[0, ::2] = True
+    modules[1::2, -1] = True
+    return modules
@@ -0,0 +1,232 @@
+"""A persistent cache of the results of decoding images
+"""
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from functools import partial
+
+import gouda
+
+from gouda.barcode import Barcode
+from gouda.util import debug_print, describe_strategy
+
+
+def cache_key(engine, strategies, read_greyscale, reduction=1):
+    """Returns a str that identifies the engine, strategies and other settings
+    that produced a result. engine is the name of an engine, as given by
+    engine_options(). Results are cached separately for each key.
+    """
+    key = [
+        gouda.__version__, engine, [describe_strategy(s) for s in strategies],
+        bool(read_greyscale)
+    ]
+    if 1 != reduction:
+        # Keys of images read at full size are as they were before images
+        # could be reduced
+        key.append(reduction)
+    return json.dumps(key)
+
+
+def file_digest(path, chunk_size=1024*1024):
+    "Returns the SHA-1 digest of the contents of path"
+    digest = hashlib.sha1()
+    with open(str(path), 'rb') as f:
+        for chunk in iter(partial(f.read, chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_barcodes(barcodes):
+    res = []
+    for b in barcodes:
+        if isinstance(b.data, bytes):
+            res.append([b.type, base64.b64encode(b.data).decode('ascii'), True])
+        else:
+            res.append([b.type, b.data, False])
+    return json.dumps(res)
+
+
+def _decode_barcodes(value):
+    return [
+        Barcode(type, base64.b64decode(data) if is_bytes else data)
+        for type, data, is_bytes in json.loads(value)
+    ]
+
+
+class ResultCache(object):
+    """Results of decoding images, stored in an SQLite database at path.
+
+    Results are addressed by the digest of the file's contents together with
+    key - see cache_key. The size and modification time of each file are
+    recorded so that files that are unchanged since they were last seen are
+    not read again to compute their digests.
+
+    If max_entries is given, the least recently used results are evicted
+    to keep the number of results at or below max_entries.
+
+    Methods can be called from more than one thread.
+    """
+
+    # Changes are committed after this many writes, and when closed
+    COMMIT_INTERVAL = 100
+
+    # At most this many digests of files that have been looked up are kept
+    # until their results are stored
+    MAX_PENDING = 10000
+
+    def __init__(self, path, key, max_entries=None):
+        if max_entries is not None and max_entries < 1:
+            raise ValueError('Invalid max_entries [{0}]'.format(max_entries))
+
+        debug_print('Opening result cache [{0}]'.format(path))
+        self.path, self.key, self.max_entries = path, key, max_entries
+        self._lock = threading.Lock()
+        # Digests of files that have been looked up but not yet stored or
+        # discarded, oldest first
+        self._digests = OrderedDict()
+        self._writes = 0
+        self._db = sqlite3.connect(
+            str(path), timeout=60, check_same_thread=False
+        )
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                digest TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                digest TEXT NOT NULL,
+                key TEXT NOT NULL,
+                strategy TEXT,
+                barcodes TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (digest, key)
+            );
+            CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._db:
+                self._evict()
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def _written(self):
+        self._writes += 1
+        if 0 == self._writes % self.COMMIT_INTERVAL:
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        if self.max_entries:
+            cursor = self._db.execute('''
+                DELETE FROM results WHERE rowid NOT IN (
+                    SELECT rowid FROM results ORDER BY last_used DESC LIMIT ?
+                )''', (self.max_entries,)
+            )
+            if cursor.rowcount:
+                debug_print('Evicted [{0}] cached results'.format(
+                    cursor.rowcount
+                ))
+                self._db.execute('''
+                    DELETE FROM files WHERE digest NOT IN (
+                        SELECT digest FROM results
+                    )'''
+                )
+
+    def _digest(self, path):
+        "Returns the digest of path, computing it only if path has changed"
+        path = os.path.abspath(str(path))
+        stat = os.stat(path)
+        row = self._db.execute(
+            'SELECT size, mtime, digest FROM files WHERE path=?', (path,)
+        ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+        else:
+            # Compute the digest without holding the lock
+            self._lock.release()
+            try:
+                digest = file_digest(path)
+            finally:
+                self._lock.acquire()
+            self._db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                (path, stat.st_size, stat.st_mtime, digest)
+            )
+            self._written()
+            return digest
+
+    def lookup(self, path):
+        """Returns the cached result (strategy, barcodes) for the file at path
+        or None if there is no cached result
+        """
+        with self._lock:
+            try:
+                digest = self._digest(path)
+            except EnvironmentError:
+                # Most likely the file does not exist
+                return None
+
+            row = self._db.execute(
+                'SELECT strategy, barcodes FROM results WHERE digest=? AND key=?',
+                (digest, self.key)
+            ).fetchone()
+            if row:
+                debug_print('Cached result for [{0}]'.format(path))
+                self._db.execute(
+                    'UPDATE results SET last_used=? WHERE digest=? AND key=?',
+                    (time.time(), digest, self.key)
+                )
+                self._written()
+                return row[0], _decode_barcodes(row[1])
+            else:
+                self._digests.pop(str(path), None)
+                self._digests[str(path)] = digest
+                while len(self._digests) > self.MAX_PENDING:
+                    self._digests.popitem(last=False)
+                return None
+
+    def discard(self, path):
+        """Forgets the digest computed by lookup for the file at path, the
+        result of which will not be stored
+        """
+        with self._lock:
+            self._digests.pop(str(path), None)
+
+    def store(self, path, result):
+        """Stores result (strategy, barcodes) for the file at path. The digest
+        computed by lookup is used, if there was one, so the file need not
+        exist when this method is called.
+        """
+        with self._lock:
+            digest = self._digests.pop(str(path), None)
+            if not digest:
+                try:
+                    digest = self._digest(path)
+                except EnvironmentError:
+                    debug_print('Unable to cache result for [{0}]'.format(path))
+                    return
+
+            strategy, barcodes = result
+            self._db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                (digest, self.key, strategy, _encode_barcodes(barcodes),
+                 time.time())
+            )
+            self._written()
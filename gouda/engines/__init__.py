@@ -4,6 +4,7 @@
 # Code 39 or Data Matrix
 
 from .accusoft import AccusoftEngine
+from .composite import CompositeEngine
 from .datasymbol import DataSymbolEngine
 from .dtk import DTKEngine
 from .libdmtx import LibDMTXEngine
@@ -0,0 +1,111 @@
+import threading
+
+from gouda.timing import clock
+from gouda.util import debug_print
+
+
+# Ways in which a CompositeEngine combines its engines
+MODES = ('all', 'first', 'cascade')
+
+# Separates the names of engines in the description of a CompositeEngine, for
+# example 'zbar+libdmtx'
+SEPARATOR = '+'
+
+
+class CompositeEngine(object):
+    """Decode using more than one engine, so that each image that a strategy
+    prepares is given to every engine in a single pass over the image.
+
+    mode is one of MODES:
+        'all' - every engine is called and the barcodes found by all of them
+            are returned, without duplicates
+        'first' - engines are called in order until one of them finds at least
+            one barcode
+        'cascade' - as 'first' but engines are called in order of the mean
+            time that each has so far taken to decode an image, cheapest first,
+            so that more expensive engines are called only when cheaper ones
+            find nothing. Engines that have not yet been called keep their
+            place in the given order.
+
+    region_hint is True if any of the engines has a true region_hint - see
+    the roi strategy. A region is passed to those engines; the others are
+    given only that region of the image.
+    """
+    def __init__(self, engines, mode='all'):
+        if not engines:
+            raise ValueError('No engines')
+        elif mode not in MODES:
+            raise ValueError('Invalid mode [{0}]'.format(mode))
+
+        self.engines = list(engines)
+        self.mode = mode
+        # Number of calls to, and seconds spent in, each engine
+        self.calls = [0] * len(self.engines)
+        self.seconds = [0.0] * len(self.engines)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def available(cls):
+        return True
+
+    @property
+    def region_hint(self):
+        return any(getattr(e, 'region_hint', False) for e in self.engines)
+
+    def close(self):
+        "Closes the engines that have close methods"
+        for engine in self.engines:
+            if hasattr(engine, 'close'):
+                engine.close()
+
+    def _cost(self, index):
+        "Mean seconds per call to engine index; zero if it has not been called"
+        with self._lock:
+            calls, seconds = self.calls[index], self.seconds[index]
+        return seconds / calls if calls else 0.0
+
+    def order(self):
+        "Indices of engines in the order in which they will be called"
+        indices = range(len(self.engines))
+        if 'cascade' == self.mode:
+            # sorted is stable so engines of equal cost keep their order
+            return sorted(indices, key=self._cost)
+        else:
+            return list(indices)
+
+    def _call(self, index, img, region=None):
+        engine = self.engines[index]
+        start = clock()
+        try:
+            if region is None:
+                return engine(img)
+            elif getattr(engine, 'region_hint', False):
+                return engine(img, region=region)
+            else:
+                left, top, right, bottom = region
+                return engine(img[top:bottom, left:right])
+        finally:
+            elapsed = clock() - start
+            with self._lock:
+                self.calls[index] += 1
+                self.seconds[index] += elapsed
+
+    def __call__(self, img, region=None):
+        barcodes = []
+        for index in self.order():
+            found = self._call(index, img, region)
+            if 'all' == self.mode:
+                barcodes.extend(b for b in found if b not in barcodes)
+            elif found:
+                debug_print('[{0}] found barcodes'.format(
+                    type(self.engines[index]).__name__
+                ))
+                return found
+        return barcodes
+
+
+def composite(factories, mode='all'):
+    """Returns a CompositeEngine of the engines returned by each of factories.
+    Used with functools.partial to give factories that can be pickled.
+    """
+    return CompositeEngine([factory() for factory in factories], mode)
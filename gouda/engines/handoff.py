@@ -0,0 +1,147 @@
+"""Handing images to engines that run in other processes
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+
+from contextlib import contextmanager
+
+import cv2
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from gouda.timing import clock, record_handoff
+from gouda.util import debug_print
+
+
+# Formats in which images can be handed over, cheapest first. None are
+# compressed, so the cost of each is little more than that of copying pixels.
+FORMATS = ('.pgm', '.bmp', '.tiff', '.png')
+
+_PARAMS = {
+    # Not available before OpenCV 3.4
+    '.tiff': [getattr(cv2, 'IMWRITE_TIFF_COMPRESSION', None), 1],
+    '.png': [cv2.IMWRITE_PNG_COMPRESSION, 0],
+}
+
+
+def encode(img, format, greyscale=True):
+    """Returns bytes of img in format, one of FORMATS, without compression.
+    If greyscale, colour images are converted to greyscale, which is all that
+    engines decode and is a third of the size.
+    """
+    if format not in FORMATS:
+        raise ValueError('Invalid format [{0}]'.format(format))
+    elif 3 == len(img.shape) and (greyscale or '.pgm' == format):
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    params = _PARAMS.get(format, [])
+    if params and params[0] is None:
+        params = []
+    retval, buffer = cv2.imencode(format, img, params)
+    if not retval:
+        raise ValueError('Unable to encode image as [{0}]'.format(format))
+    return buffer.tobytes()
+
+
+# Directories of ImageHandoffs that have not been closed
+_DIRECTORIES = set()
+
+
+@atexit.register
+def _remove_directories():
+    "Removes the directories of ImageHandoffs that were not closed"
+    for directory in list(_DIRECTORIES):
+        shutil.rmtree(directory, True)
+
+
+def shared_memory_directory():
+    """A directory in memory - /dev/shm - if there is one, otherwise the
+    directory for temporary files
+    """
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    else:
+        return tempfile.gettempdir()
+
+
+class ImageHandoff(object):
+    """Writes images to a ring of files, so that they can be read by other
+    processes.
+
+    The format is the first of FORMATS that is in formats, those that the
+    other process can read. Files are in a new directory within directory,
+    by default shared_memory_directory(). Up to slots files can be in use at
+    once; further calls to file wait for one to be released. Files are
+    removed once they are released, so that images do not stay in memory.
+    count and seconds are the number of images and the time spent handing
+    them over.
+
+    close removes the directory. Directories that have not been closed are
+    removed when the process exits, other than by os._exit - see
+    gouda.batch.DecoderPool, which closes the engines of worker processes.
+    """
+    def __init__(self, formats, slots=2, directory=None, greyscale=True):
+        formats = [f for f in FORMATS if f in formats]
+        if not formats:
+            raise ValueError('No supported formats')
+        elif slots < 1:
+            raise ValueError('Invalid slots [{0}]'.format(slots))
+
+        self.format = formats[0]
+        self.greyscale = greyscale
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self.directory = tempfile.mkdtemp(
+            prefix='gouda-', dir=directory or shared_memory_directory()
+        )
+        _DIRECTORIES.add(self.directory)
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(os.path.join(
+                self.directory, '{0}{1}'.format(slot, self.format)
+            ))
+
+    def close(self):
+        "Removes the directory"
+        _DIRECTORIES.discard(self.directory)
+        shutil.rmtree(self.directory, True)
+
+    def __del__(self):
+        if getattr(self, 'directory', None):
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @contextmanager
+    def file(self, img):
+        "Context manager that writes img to a file and gives its path"
+        path = self._free.get()
+        try:
+            start = clock()
+            debug_print('Writing [{0}]'.format(path))
+            with open(path, 'wb') as f:
+                f.write(encode(img, self.format, self.greyscale))
+            elapsed = clock() - start
+            with self._lock:
+                self.count += 1
+                self.seconds += elapsed
+            record_handoff(elapsed)
+            yield path
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                # Not written, or removed by close
+                pass
+            self._free.put(path)
@@ -1,41 +1,159 @@
-import subprocess
-import tempfile
-
 from PIL import Image
 
-from gouda import config
 from gouda.barcode import Barcode
 from gouda.gouda_error import GoudaError
 from gouda.util import debug_print
 
 try:
     from pylibdmtx import pylibdmtx
+    from pylibdmtx.wrapper import DmtxSymbolSize
 except ImportError:
     pylibdmtx = None
 
 
+# Names of the shapes of barcode that libdmtx can be told to expect, in
+# addition to sizes such as '12x12' and '8x18'
+SHAPES = {
+    'auto': 'DmtxSymbolShapeAuto',
+    'square': 'DmtxSymbolSquareAuto',
+    'rectangle': 'DmtxSymbolRectAuto',
+}
+
 
 class LibDMTXEngine(object):
     """Decode Data Matrix barcodes using the libdmtx decoder via pylibdmtx
+
+    libdmtx gives up on an image after timeout_ms milliseconds, or never if
+    timeout_ms is None. Most of the time spent on an image that does not
+    contain a barcode is spent waiting for the timeout, so if ms_per_megapixel
+    is given, the timeout is instead that many milliseconds for each million
+    pixels searched, at least MINIMUM_TIMEOUT_MS and at most timeout_ms. Small
+    images, such as those reduced by the resize strategy or cropped by the roi
+    strategy, are then given up on sooner.
+
+    Options that limit libdmtx's search - see the dmtxread man page:
+        shrink - images are reduced by this factor before they are searched;
+            larger values are quicker but miss small barcodes
+        gap_size - the gap, in pixels, between the lines that are scanned for
+            edges
+        min_edge, max_edge - the shortest and longest edges, in pixels, of
+            barcodes
+        threshold - the minimum strength of edges, from 1 to 100
+        expected_size - the size of barcode to look for, such as '12x12', or
+            one of the keys of SHAPES
+    libdmtx's defaults are used for options that are None.
+
+    If called with region, a tuple (left, top, right, bottom), only that part
+    of the image, together with margin pixels around it, is searched - see
+    the roi strategy.
     """
 
-    def __init__(self, timeout_ms=300, max_count=None):
+    # Engines that accept a region are given one by the roi strategy
+    region_hint = True
+
+    MINIMUM_TIMEOUT_MS = 20
+
+    def __init__(self, timeout_ms=300, max_count=None, shrink=None,
+                 gap_size=None, min_edge=None, max_edge=None, threshold=None,
+                 expected_size=None, ms_per_megapixel=None, margin=16):
         if not self.available():
             raise GoudaError('libdmtx unavailable')
 
+        if timeout_ms is not None and timeout_ms <= 0:
+            raise ValueError('Invalid timeout_ms [{0}]'.format(timeout_ms))
+        elif ms_per_megapixel is not None and ms_per_megapixel <= 0:
+            raise ValueError('Invalid ms_per_megapixel [{0}]'.format(
+                ms_per_megapixel
+            ))
+        elif shrink is not None and shrink < 1:
+            raise ValueError('Invalid shrink [{0}]'.format(shrink))
+        elif gap_size is not None and gap_size < 1:
+            raise ValueError('Invalid gap_size [{0}]'.format(gap_size))
+        elif threshold is not None and not 1 <= threshold <= 100:
+            raise ValueError('Invalid threshold [{0}]'.format(threshold))
+        elif margin < 0:
+            raise ValueError('Invalid margin [{0}]'.format(margin))
+        for name, edge in (('min_edge', min_edge), ('max_edge', max_edge)):
+            if edge is not None and edge < 1:
+                raise ValueError('Invalid {0} [{1}]'.format(name, edge))
+        if min_edge is not None and max_edge is not None and min_edge > max_edge:
+            raise ValueError('Invalid min_edge [{0}] and max_edge [{1}]'.format(
+                min_edge, max_edge
+            ))
+
         self.timeout_ms = timeout_ms
         self.max_count = max_count
+        self.ms_per_megapixel = ms_per_megapixel
+        self.margin = margin
+        self.expected_size = expected_size
+        # Keyword arguments to pylibdmtx.decode other than timeout
+        options = {
+            'max_count': max_count,
+            'shrink': shrink,
+            'gap_size': gap_size,
+            'min_edge': min_edge,
+            'max_edge': max_edge,
+            'threshold': threshold,
+            'shape': self._shape(expected_size),
+        }
+        self.options = dict((k, v) for k, v in options.items() if v is not None)
 
     @classmethod
     def available(cls):
         return pylibdmtx is not None
 
+    @staticmethod
+    def _shape(expected_size):
+        "libdmtx's value for expected_size"
+        if expected_size is None:
+            return None
+        name = SHAPES.get(expected_size, 'DmtxSymbol{0}'.format(expected_size))
+        try:
+            return int(getattr(DmtxSymbolSize, name))
+        except AttributeError:
+            raise ValueError('Invalid expected_size [{0}]'.format(
+                expected_size
+            ))
+
+    def timeout(self, width, height):
+        "The timeout, in milliseconds, for an image of width x height pixels"
+        if self.ms_per_megapixel is None:
+            return self.timeout_ms
+        timeout = max(
+            self.MINIMUM_TIMEOUT_MS,
+            int(round(self.ms_per_megapixel * width * height / 1e6))
+        )
+        if self.timeout_ms is not None:
+            timeout = min(timeout, self.timeout_ms)
+        return timeout
+
     def decode_file(self, path):
         return self(Image.open(str(path)))
 
-    def __call__(self, img):
+    def __call__(self, img, region=None):
+        if isinstance(img, Image.Image):
+            width, height = img.size
+        else:
+            height, width = img.shape[:2]
+
+        if region is not None:
+            left, top, right, bottom = region
+            left, top = max(0, left - self.margin), max(0, top - self.margin)
+            right = min(width, right + self.margin)
+            bottom = min(height, bottom + self.margin)
+            if left >= right or top >= bottom:
+                raise ValueError('Invalid region [{0}]'.format(region))
+            debug_print('libdmtx searching [{0}]'.format(
+                (left, top, right, bottom)
+            ))
+            if isinstance(img, Image.Image):
+                img = img.crop((left, top, right, bottom))
+            else:
+                img = img[top:bottom, left:right]
+            width, height = right - left, bottom - top
+
         res = pylibdmtx.decode(
-            img, timeout=self.timeout_ms, max_count=self.max_count
+            img, timeout=self.timeout(width, height), **self.options
         )
 
         return [Barcode('Data Matrix', r.data) for r in res]
@@ -3,6 +3,7 @@ from functools import partial
 from gouda.engines import (AccusoftEngine, DataSymbolEngine, DTKEngine,
                            InliteEngine, LibDMTXEngine, StecosEngine,
                            SoftekEngine, ZbarEngine, ZxingEngine)
+from gouda.engines.composite import SEPARATOR, composite
 
 
 def engine_options():
@@ -17,6 +18,16 @@ def engine_options():
 
     options = {k: v for k, v in options.items() if v.available()}
 
+    if LibDMTXEngine.available():
+        options.update({
+            'libdmtx-adaptive': partial(LibDMTXEngine, ms_per_megapixel=100),
+        })
+
+    if ZbarEngine.available():
+        options.update({
+            'zbar-1d': partial(ZbarEngine, symbologies=('CODE128', 'CODE39')),
+        })
+
     if AccusoftEngine.available():
         options.update({
             'accusoft-1d': partial(AccusoftEngine, datamatrix=False),
@@ -56,3 +67,25 @@ def engine_options():
         })
 
     return options
+
+
+def engine_factory(name, options=None, mode='all'):
+    """Returns a function that returns the engine described by name - either
+    one of the keys of options or two or more keys joined by SEPARATOR, such
+    as 'zbar+libdmtx', which describes a CompositeEngine that combines its
+    engines according to mode. The function can be pickled.
+
+    options defaults to engine_options(). Raises ValueError if name does not
+    describe available engines.
+    """
+    options = engine_options() if options is None else options
+    names = name.split(SEPARATOR)
+    unknown = [n for n in names if n not in options]
+    if unknown:
+        raise ValueError('Unavailable engines {0}'.format(unknown))
+    elif len(names) != len(set(names)):
+        raise ValueError('Duplicated engines [{0}]'.format(name))
+    elif 1 == len(names):
+        return options[name]
+    else:
+        return partial(composite, [options[n] for n in names], mode)
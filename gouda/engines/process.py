@@ -0,0 +1,310 @@
+"""Engines that decode by running other programs
+"""
+import re
+import subprocess
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from gouda.barcode import Barcode
+from gouda.engines.handoff import ImageHandoff
+from gouda.gouda_error import GoudaError
+from gouda.parallel import imap
+from gouda.timing import clock
+from gouda.util import debug_print
+
+
+class ProcessCounters(object):
+    """Counts of the processes run by an engine and the calls made to them.
+
+    spawns - processes started
+    calls - calls that returned a result
+    timeouts - calls that were stopped because they took too long
+    failures - calls to processes that exited or could not be run
+    seconds - time spent in calls, including those that failed
+    """
+    def __init__(self):
+        self.spawns = self.calls = self.timeouts = self.failures = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'ProcessCounters({0!r})'.format(self.as_dict())
+
+    def add(self, **counts):
+        "Adds each of counts to the counter of the same name"
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def latency(self):
+        "Mean seconds per call, or None if no calls were made"
+        attempts = self.calls + self.timeouts + self.failures
+        return self.seconds / attempts if attempts else None
+
+    def as_dict(self):
+        return {
+            'spawns': self.spawns,
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'failures': self.failures,
+            'seconds': self.seconds,
+            'latency': self.latency,
+        }
+
+
+def _kill(process):
+    "Kills process, which might already have exited"
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+class _Watchdog(object):
+    "Kills process if it is still running after timeout seconds"
+    def __init__(self, process, timeout):
+        self.fired = False
+        self._process = process
+        self._timer = None
+        if timeout is not None:
+            self._timer = threading.Timer(timeout, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self):
+        self.fired = True
+        _kill(self._process)
+
+    def cancel(self):
+        if self._timer:
+            self._timer.cancel()
+
+
+# Lines of the form Type:Value. Values can contain colons.
+TYPE_VALUE = re.compile(r'^\s*(?P<type>[^:]+?)\s*:\s?(?P<data>.*?)\s*$')
+
+
+def parse_lines(output, pattern=TYPE_VALUE):
+    """Returns a list of Barcodes, one for each line of output - bytes or str
+    - that matches pattern, which must have groups named type and data. Blank
+    lines and lines that do not match are ignored. Types are str and data
+    are bytes.
+    """
+    if isinstance(output, bytes):
+        output = output.decode('utf8', 'replace')
+    barcodes = []
+    for line in output.splitlines():
+        match = pattern.match(line)
+        if match:
+            barcodes.append(Barcode(
+                match.group('type'), match.group('data').encode('utf8')
+            ))
+        elif line.strip():
+            debug_print('Ignoring line [{0}]'.format(line))
+    return barcodes
+
+
+class CommandEngine(object):
+    """Base for engines that run a command-line program to decode image
+    files.
+
+    Subclasses give the arguments that decode a file in arguments and can
+    parse the program's output in parse. Images given to the engine are
+    handed to the program as files in one of FORMATS - see ImageHandoff.
+
+    The program is run once for each file. None of the programs that are run
+    by engines reports which file each barcode was found in, so files are not
+    given to runs of the program in batches. Up to processes runs are made at
+    once, whether by decode_files or by calls from more than one thread. A
+    run that takes longer than timeout seconds is killed and made again, up
+    to RETRIES times, after which GoudaError is raised. If STDERR_IS_ERROR
+    and the program writes to stderr, GoudaError is raised.
+    """
+
+    FORMATS = ('.tiff',)
+    RETRIES = 1
+    STDERR_IS_ERROR = False
+
+    def __init__(self, timeout=60, processes=1):
+        if timeout is not None and timeout <= 0:
+            raise ValueError('Invalid timeout [{0}]'.format(timeout))
+        elif processes < 1:
+            raise ValueError('Invalid processes [{0}]'.format(processes))
+        self.timeout = timeout
+        self.processes = processes
+        self.counters = ProcessCounters()
+        self.image_handoff = ImageHandoff(self.FORMATS, slots=processes)
+        self._slots = threading.Semaphore(processes)
+
+    def close(self):
+        "Removes the files in which images are handed over"
+        self.image_handoff.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def arguments(self, path):
+        "The program and arguments that decode path"
+        raise NotImplementedError()
+
+    def parse(self, stdout, path):
+        "Returns a list of Barcodes found in path from the program's stdout"
+        return parse_lines(stdout)
+
+    def _run(self, path):
+        "Runs the program once and returns its stdout"
+        args = self.arguments(path)
+        with self._slots:
+            for attempt in range(1 + self.RETRIES):
+                start = clock()
+                try:
+                    process = subprocess.Popen(
+                        args, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                    )
+                except OSError as e:
+                    self.counters.add(failures=1)
+                    raise GoudaError('Unable to run [{0}]: {1}'.format(
+                        args[0], e
+                    ))
+                self.counters.add(spawns=1)
+                watchdog = _Watchdog(process, self.timeout)
+                try:
+                    stdout, stderr = process.communicate()
+                finally:
+                    watchdog.cancel()
+                elapsed = clock() - start
+                if watchdog.fired:
+                    debug_print('[{0}] timed out'.format(args[0]))
+                    self.counters.add(timeouts=1, seconds=elapsed)
+                else:
+                    self.counters.add(calls=1, seconds=elapsed)
+                    break
+            else:
+                raise GoudaError('[{0}] timed out [{1}] times'.format(
+                    args[0], 1 + self.RETRIES
+                ))
+
+        if self.STDERR_IS_ERROR and stderr:
+            raise GoudaError('[{0}] error [{1!r}]'.format(args[0], stderr))
+        return stdout
+
+    def decode_files(self, paths):
+        """Returns a list of lists of Barcodes, one for each of paths, running
+        up to processes runs of the program at once
+        """
+        paths = [str(p) for p in paths]
+        threads = max(1, min(self.processes, len(paths)))
+        results = imap(self.decode_file, paths, threads)
+        return [barcodes for path, barcodes in results]
+
+    def decode_file(self, path):
+        path = str(path)
+        return self.parse(self._run(path), path)
+
+    def __call__(self, img):
+        with self.image_handoff.file(img) as path:
+            return self.decode_file(path)
+
+
+class WorkerPool(object):
+    """A pool of up to processes long-lived processes, each started by
+    running command and restarted if it exits.
+
+    call gives a process to a function that exchanges data with it over its
+    stdin and stdout. If the process exits, or if the function takes longer
+    than timeout seconds, in which case the process is killed, the process is
+    restarted and the function called again, up to retries times.
+    """
+    def __init__(self, command, processes=1, timeout=None, retries=1):
+        if processes < 1:
+            raise ValueError('Invalid processes [{0}]'.format(processes))
+        self.command = command
+        self.timeout = timeout
+        self.retries = retries
+        self.counters = ProcessCounters()
+        # A slot holds a process or None if one has yet to be started
+        self._slots = queue.Queue()
+        for _ in range(processes):
+            self._slots.put(None)
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def running(self):
+        "The processes that are running"
+        with self._lock:
+            return list(self._running)
+
+    def _start(self):
+        debug_print('Starting [{0}]'.format(self.command[0]))
+        try:
+            process = subprocess.Popen(
+                self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+            )
+        except OSError as e:
+            self.counters.add(failures=1)
+            raise GoudaError('Unable to run [{0}]: {1}'.format(
+                self.command[0], e
+            ))
+        self.counters.add(spawns=1)
+        with self._lock:
+            self._running.add(process)
+        return process
+
+    def _stop(self, process):
+        with self._lock:
+            self._running.discard(process)
+        try:
+            process.stdin.close()
+        except (IOError, OSError):
+            pass
+        _kill(process)
+        process.wait()
+        process.stdout.close()
+
+    def call(self, function):
+        "Returns function(process)"
+        process = self._slots.get()
+        try:
+            if process and process not in self.running():
+                # Stopped by close
+                process = None
+            for attempt in range(1 + self.retries):
+                if not process:
+                    process = self._start()
+                start = clock()
+                watchdog = _Watchdog(process, self.timeout)
+                try:
+                    result = function(process)
+                except (EOFError, IOError, OSError) as e:
+                    debug_print('[{0}] failed [{1}]'.format(
+                        self.command[0], e
+                    ))
+                    self.counters.add(
+                        seconds=clock() - start,
+                        **{'timeouts' if watchdog.fired else 'failures': 1}
+                    )
+                    self._stop(process)
+                    process = None
+                else:
+                    self.counters.add(calls=1, seconds=clock() - start)
+                    return result
+                finally:
+                    watchdog.cancel()
+            raise GoudaError('[{0}] failed [{1}] times'.format(
+                self.command[0], 1 + self.retries
+            ))
+        finally:
+            self._slots.put(process)
+
+    def close(self):
+        "Stops the processes that are running"
+        for process in self.running():
+            self._stop(process)
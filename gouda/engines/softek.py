@@ -1,5 +1,4 @@
 import os
-import subprocess
 import sys
 import tempfile
 
@@ -13,6 +12,7 @@ except ImportError:
 
 from gouda import config
 from gouda.barcode import Barcode
+from gouda.engines.process import CommandEngine
 from gouda.gouda_error import GoudaError
 from gouda.util import debug_print, is_clsid_registered
 
@@ -196,53 +196,42 @@ class Win32SoftekEngine(object):
             os.unlink(img_temp.name)
 
 
-class POSIXSoftekEngine(object):
-    """ Interface to Softek's bardecode library """
+class POSIXSoftekEngine(CommandEngine):
+    """ Interface to Softek's bardecode library
+
+    bardecode prints a line of the form Type:Value for each barcode. See
+    CommandEngine for timeout and processes.
+    """
 
     BARDECODE = getattr(config, 'SOFTEK_BARDECODE', None)
 
-    def __init__(self, datamatrix):
+    # Formats of image files that bardecode reads
+    FORMATS = ('.tiff',)
+
+    def __init__(self, datamatrix, timeout=60, processes=1):
         if not self.available():
             raise GoudaError('Softek unavailable')
         else:
+            super(POSIXSoftekEngine, self).__init__(timeout, processes)
             self.datamatrix = datamatrix
 
     @classmethod
     def available(cls):
         return cls.BARDECODE is not None and cls.BARDECODE.is_file()
 
-    def decode_file(self, path):
-        args = [
+    def arguments(self, path):
+        # TODO LH Coordinates?
+        if self.datamatrix:
+            types = ['--ReadDataMatrix=1']
+        else:
+            types = ['--ReadCode128=1', '--ReadCode39=1']
+        return [
             str(self.BARDECODE),
             '-m',
             '-K',
             LICENSE_KEY,
             '-b',
-            ('--ReadDataMatrix=1' if self.datamatrix else
-             '--ReadCode128=1 --ReadCode39=1'),
-            str(path),
-        ]
-        softek = subprocess.Popen(
-            args, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-
-        stdoutdata, stderrdata = softek.communicate()
-        if stdoutdata:
-            # TODO LH Coordinates?
-            # Lines are printed in the form Type:Value
-            # TODO LH regexp
-            res = [l.split(':') for l in stdoutdata.strip().split('\n')]
-            return [Barcode(r[0], r[1]) for r in res]
-        else:
-            return []
-
-    def __call__(self, img):
-        with tempfile.NamedTemporaryFile(suffix='.tiff') as img_temp:
-            debug_print(
-                'Writing temp file [{0}] for Softek'.format(img_temp.name)
-            )
-            cv2.imwrite(img_temp.name, img)
-            return self.decode_file(img_temp.name)
+        ] + types + [path]
 
 
 SoftekEngine = Win32SoftekEngine if 'win32' == sys.platform else POSIXSoftekEngine
@@ -1,25 +1,28 @@
-import subprocess
-import tempfile
-
-import cv2
-
 from gouda import config
-from gouda.barcode import Barcode
+from gouda.engines.process import CommandEngine
 from gouda.gouda_error import GoudaError
-from gouda.util import debug_print
 
 
-class StecosEngine(object):
+class StecosEngine(CommandEngine):
     """Decode barcodes using the Stecos decoder
+
+    The decoder prints a line of the form Type:Value for each barcode. See
+    CommandEngine for timeout and processes.
     """
 
     DMREAD = getattr(config, 'STECOS_DMREAD', None)
     READBAR = getattr(config, 'STECOS_READBAR', None)
 
-    def __init__(self, datamatrix):
+    # Formats of image files that the decoders read
+    FORMATS = ('.tiff',)
+
+    STDERR_IS_ERROR = True
+
+    def __init__(self, datamatrix, timeout=60, processes=1):
         if not self.available():
             raise GoudaError('Stecos unavailable')
         else:
+            super(StecosEngine, self).__init__(timeout, processes)
             self.command = self.DMREAD if datamatrix else self.READBAR
             self.datamatrix = datamatrix
 
@@ -30,31 +33,6 @@ class StecosEngine(object):
             cls.READBAR.is_file()
         )
 
-    def decode_file(self, path):
-        dmtx = [
-            str(self.command),
-            str(path),
-        ]
-        dmtxread = subprocess.Popen(
-            dmtx, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-        stdoutdata, stderrdata = dmtxread.communicate()
-        if stderrdata:
-            raise ValueError(stderrdata)
-        elif stdoutdata:
-            # TODO LH Coordinates?
-            # Lines are printed in the form Type:Value
-            # TODO LH regexp
-            res = [l.split(':') for l in stdoutdata.strip().split('\n')]
-            return [Barcode(r[0], r[1]) for r in res]
-        else:
-            return []
-
-    def __call__(self, img):
-        # Decode data matrix barcodes in img using dmtxread
-        with tempfile.NamedTemporaryFile(suffix='.tiff') as img_temp:
-            debug_print(
-                'Writing temp file [{0}] for stecos'.format(img_temp.name)
-            )
-            cv2.imwrite(img_temp.name, img)
-            return self.decode_file(img_temp.name)
+    def arguments(self, path):
+        # TODO LH Coordinates?
+        return [str(self.command), path]
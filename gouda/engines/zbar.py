@@ -1,34 +1,157 @@
 # This file is not called zbar.py to avoid collision with the zbar package
 
+import threading
+
+from ctypes import c_void_p, string_at
+
+import cv2
+import numpy as np
+
 from gouda.barcode import Barcode
 from gouda.gouda_error import GoudaError
 from gouda.util import debug_print
 
-from PIL import Image
-
 try:
     from pyzbar import pyzbar
+    from pyzbar.wrapper import (
+        ZBarConfig, ZBarSymbol, zbar_image_create, zbar_image_destroy,
+        zbar_image_first_symbol, zbar_image_scanner_create,
+        zbar_image_scanner_destroy, zbar_image_scanner_set_config,
+        zbar_image_set_data, zbar_image_set_format, zbar_image_set_size,
+        zbar_scan_image, zbar_symbol_get_data, zbar_symbol_get_data_length,
+        zbar_symbol_next
+    )
 except ImportError:
     pyzbar = None
 
 
+# zbar's fourcc for 8-bit greyscale images
+_Y800 = 0x30303859
+
+
 class ZbarEngine(object):
     """Decode using the zbar library
 
     http://sourceforge.net/projects/zbar/
     https://pypi.python.org/pypi/pyzbar
+
+    A scanner is configured once and used for each image. Greyscale images
+    are given to zbar without being copied; colour images are converted to
+    greyscale. Calls from more than one thread are made one at a time - use a
+    PerThreadEngine to scan images at once.
+
+    symbologies - names of the zbar symbologies to decode, such as 'CODE128'
+        and 'CODE39'; all are decoded if None. Decoding fewer is quicker.
+    density - zbar scans every density'th row and column of pixels; either an
+        int or a tuple (x, y). Larger values are quicker but might miss small
+        barcodes. zbar's default is 1.
     """
-    def __init__(self):
+    def __init__(self, symbologies=None, density=None):
         if not self.available():
             raise GoudaError('zbar unavailable')
 
+        if symbologies is not None:
+            unknown = set(symbologies).difference(ZBarSymbol.__members__)
+            if unknown or not symbologies:
+                raise ValueError('Invalid symbologies [{0}]'.format(
+                    sorted(unknown or symbologies)
+                ))
+        if density is not None:
+            x_density, y_density = (
+                density if isinstance(density, tuple) else (density, density)
+            )
+            if x_density < 0 or y_density < 0 or not (x_density or y_density):
+                raise ValueError('Invalid density [{0}]'.format(density))
+
+        self.symbologies = symbologies
+        self.density = density
+        self._lock = threading.Lock()
+        self._scanner = zbar_image_scanner_create()
+        if not self._scanner:
+            raise GoudaError('Could not create zbar scanner')
+
+        if symbologies is not None:
+            # Symbology 0 configures all symbologies
+            self._configure(0, ZBarConfig.CFG_ENABLE, 0)
+            for name in symbologies:
+                self._configure(ZBarSymbol[name], ZBarConfig.CFG_ENABLE, 1)
+        if density is not None:
+            self._configure(0, ZBarConfig.CFG_X_DENSITY, x_density)
+            self._configure(0, ZBarConfig.CFG_Y_DENSITY, y_density)
+
     @classmethod
     def available(cls):
         return pyzbar is not None
 
+    def _configure(self, symbology, config, value):
+        if zbar_image_scanner_set_config(self._scanner, symbology, config,
+                                         value):
+            raise GoudaError('Could not configure zbar [{0}] [{1}]'.format(
+                config, value
+            ))
+
+    def close(self):
+        "Destroys the scanner"
+        with self._lock:
+            if self._scanner:
+                zbar_image_scanner_destroy(self._scanner)
+                self._scanner = None
+
+    def __del__(self):
+        if getattr(self, '_scanner', None):
+            self.close()
+
     def decode_file(self, path):
-        return self(Image.open(str(path)))
+        img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise GoudaError('Unable to read [{0}]'.format(path))
+        else:
+            return self(img)
 
     def __call__(self, img):
-        # Decode barcodes in img using pyzbar
-        return [Barcode(r.type, r.data) for r in pyzbar.decode(img)]
+        # Decode barcodes in img using zbar
+        if 3 == len(img.shape):
+            debug_print('Convert grey')
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        # A copy is made only if img is not contiguous 8-bit pixels - crops of
+        # larger images, for example
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        height, width = img.shape
+        if not img.size:
+            return []
+
+        with self._lock:
+            if not self._scanner:
+                raise GoudaError('zbar engine has been closed')
+            image = zbar_image_create()
+            if not image:
+                raise GoudaError('Could not create zbar image')
+            try:
+                zbar_image_set_format(image, _Y800)
+                zbar_image_set_size(image, width, height)
+                # zbar reads the pixels held by img, which outlives image
+                zbar_image_set_data(
+                    image, img.ctypes.data_as(c_void_p), img.size, None
+                )
+                if zbar_scan_image(self._scanner, image) < 0:
+                    raise GoudaError('zbar could not scan image')
+                return list(self._barcodes(image))
+            finally:
+                zbar_image_destroy(image)
+
+    @staticmethod
+    def _barcodes(image):
+        "Generator of Barcodes found in image"
+        symbol = zbar_image_first_symbol(image)
+        while symbol:
+            data = string_at(
+                zbar_symbol_get_data(symbol),
+                zbar_symbol_get_data_length(symbol)
+            )
+            try:
+                type = ZBarSymbol(symbol.contents.type).name
+            except ValueError:
+                # A symbology that pyzbar does not know about
+                type = str(symbol.contents.type)
+            yield Barcode(type, data)
+            symbol = zbar_symbol_next(symbol)
@@ -1,64 +1,137 @@
+import collections
 import os
-import subprocess
-import tempfile
+import struct
 
 import cv2
+import numpy as np
 
 from gouda.barcode import Barcode
+from gouda.engines.process import WorkerPool
 from gouda.java import java
 from gouda.gouda_error import GoudaError
-from gouda.util import debug_print
+from gouda.timing import clock, record_handoff
 
 
-# TODO LH Support all types of barcode that zxing does
+# A barcode found by zxing: the name of its format, its text, as bytes, and a
+# list of (x, y) points that locate it in the image
+ZxingResult = collections.namedtuple('ZxingResult', ['type', 'data', 'points'])
+
 
 class ZxingEngine(object):
-    """Decode Data Matrix barcodes using the zxing java library
+    """Decode barcodes using the zxing java library
 
     https://github.com/zxing/zxing
+
+    Images are decoded by long-lived java processes - zxing_server - that are
+    started when first needed and given raw greyscale pixels over a pipe, so
+    that a JVM is not started for each image. Up to processes images are
+    decoded at once, when the engine is called from more than one thread. A
+    process is restarted if it exits, or if it takes longer than timeout
+    seconds, in which case it is killed. counters holds the ProcessCounters.
+    formats are the names of the zxing BarcodeFormats to decode; all formats
+    are decoded if formats is empty.
     """
 
     JARS = ['zxing/core-3.1.0.jar',
-            'zxing/javase-3.1.0.jar',
-            'decode_data_matrix/decode_data_matrix.jar']
+            'zxing_server/zxing_server.jar']
     JARS = [java.JAR_PATH / p for p in JARS]
 
-    def __init__(self):
+    # Names used by other engines for the formats that zxing decodes
+    TYPES = {'DATA_MATRIX': 'Data Matrix'}
+
+    # The process is restarted at most this many times for each image
+    RETRIES = 1
+
+    def __init__(self, formats=('DATA_MATRIX',), timeout=60, processes=1):
         if not self.available():
             raise GoudaError('zxing unavailable')
+        self.formats = list(formats)
+        self.workers = WorkerPool(
+            self.command(), processes, timeout, self.RETRIES
+        )
+        self.counters = self.workers.counters
 
     @classmethod
     def available(cls):
         return java.available() and all([p.is_file() for p in cls.JARS])
 
+    def command(self):
+        "The command that starts the process"
+        return [str(java.JAVA),
+                '-cp', os.pathsep.join(map(str, self.JARS)),
+                'zxing_server'] + self.formats
+
+    def close(self):
+        "Stops the processes"
+        self.workers.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _read(process, count):
+        "Returns count bytes from process; raises EOFError if it exited"
+        data = process.stdout.read(count)
+        if len(data) != count:
+            raise EOFError('zxing process exited')
+        return data
+
+    def _read_int(self, process):
+        return struct.unpack('>i', self._read(process, 4))[0]
+
+    def _read_bytes(self, process):
+        return self._read(process, self._read_int(process))
+
+    def _exchange(self, process, img):
+        "Writes img to process and returns the list of ZxingResults"
+        start = clock()
+        height, width = img.shape
+        process.stdin.write(struct.pack('>ii', width, height))
+        process.stdin.write(img.tobytes())
+        process.stdin.flush()
+        record_handoff(clock() - start)
+
+        count = self._read_int(process)
+        if count < 0:
+            raise GoudaError('zxing error [{0}]'.format(
+                self._read_bytes(process).decode('utf8', 'replace')
+            ))
+
+        results = []
+        for _ in range(count):
+            type = self._read_bytes(process).decode('utf8')
+            data = self._read_bytes(process)
+            points = self._read_int(process)
+            points = struct.unpack(
+                '>{0}f'.format(2 * points), self._read(process, 8 * points)
+            )
+            results.append(ZxingResult(
+                self.TYPES.get(type, type), data,
+                list(zip(points[::2], points[1::2]))
+            ))
+        return results
+
+    def results(self, img):
+        """Returns a list of ZxingResults for each barcode found in img - all
+        of the barcodes that zxing finds, with their locations
+        """
+        if 3 == len(img.shape):
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        if not img.size:
+            return []
+
+        return self.workers.call(lambda process: self._exchange(process, img))
+
     def decode_file(self, path):
-        if not self.available():
-            raise GoudaError('zxing unavailable')
+        img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise GoudaError('Unable to read [{0}]'.format(path))
         else:
-            args = [str(java.JAVA),
-                    '-cp', os.pathsep.join(map(str, self.JARS)),
-                    'decode_data_matrix',
-                    str(path)]
-            dmtxread = subprocess.Popen(args,
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE)
-            stdoutdata, stderrdata = dmtxread.communicate()
-            if stderrdata:
-                raise GoudaError('zxing error [{0}]'.format(repr(stderrdata)))
-            else:
-                # TODO Coordinates?
-                stdoutdata = [l for l in stdoutdata.strip().split('\n') if l]
-                return [Barcode('Data Matrix', l) for l in stdoutdata]
+            return self(img)
 
     def __call__(self, img):
-        img_temp = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        try:
-            debug_print(
-                'Writing temp file [{0}] for zxing'.format(img_temp.name)
-            )
-            cv2.imwrite(img_temp.name, img)
-            return self.decode_file(img_temp.name)
-        finally:
-            # TODO LH Logic here?
-            img_temp.close()
-            os.unlink(img_temp.name)
+        return [Barcode(r.type, r.data) for r in self.results(img)]
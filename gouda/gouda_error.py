@@ -1,2 +1,15 @@
 class GoudaError(Exception):
     pass
+
+
+class DeadlineExceeded(GoudaError):
+    """Raised when an engine is called after the time allowed for decoding an
+    image has passed
+    """
+    pass
+
+
+class DecodingCancelled(GoudaError):
+    """Raised when an engine is called after decoding an image was cancelled
+    """
+    pass
@@ -0,0 +1,2 @@
+javac -cp ..\zxing\core-3.1.0.jar -Xlint:unchecked zxing_server.java
+jar cvf zxing_server.jar *class
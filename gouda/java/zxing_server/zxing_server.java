@@ -0,0 +1,129 @@
+// A long-lived process that decodes barcodes in greyscale images using zxing.
+//
+// Images are read from stdin and results are written to stdout, until stdin
+// is closed. All integers and floats are big-endian, as written by
+// DataOutputStream.
+//
+// Request:
+//     int width, int height, width * height bytes of 8-bit greyscale pixels,
+//     row by row
+//
+// Response, if the image was decoded (possibly finding no barcodes):
+//     int number of results, then for each result
+//         int length, bytes of the name of the format, in UTF-8
+//         int length, bytes of the text, in UTF-8
+//         int number of points, then for each point float x, float y
+//
+// Response, if the image could not be decoded:
+//     int -1, int length, bytes of the error message, in UTF-8
+//
+// Arguments are the names of the BarcodeFormats to decode. All formats are
+// decoded if no arguments are given.
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.IOException;
+import java.nio.charset.Charset;
+import java.util.ArrayList;
+import java.util.EnumMap;
+import java.util.List;
+import java.util.Map;
+
+import com.google.zxing.BarcodeFormat;
+import com.google.zxing.BinaryBitmap;
+import com.google.zxing.DecodeHintType;
+import com.google.zxing.LuminanceSource;
+import com.google.zxing.MultiFormatReader;
+import com.google.zxing.NotFoundException;
+import com.google.zxing.PlanarYUVLuminanceSource;
+import com.google.zxing.Result;
+import com.google.zxing.ResultPoint;
+import com.google.zxing.common.HybridBinarizer;
+import com.google.zxing.multi.GenericMultipleBarcodeReader;
+
+public class zxing_server {
+
+    private static final Charset UTF8 = Charset.forName("UTF-8");
+
+    public static void main(String[] args) throws IOException {
+        Map<DecodeHintType, Object> hints =
+            new EnumMap<DecodeHintType, Object>(DecodeHintType.class);
+        hints.put(DecodeHintType.TRY_HARDER, Boolean.TRUE);
+        if(0 < args.length) {
+            List<BarcodeFormat> formats = new ArrayList<BarcodeFormat>();
+            for(String format : args) {
+                formats.add(BarcodeFormat.valueOf(format));
+            }
+            hints.put(DecodeHintType.POSSIBLE_FORMATS, formats);
+        }
+
+        DataInputStream in = new DataInputStream(
+            new BufferedInputStream(System.in));
+        DataOutputStream out = new DataOutputStream(
+            new BufferedOutputStream(System.out));
+        GenericMultipleBarcodeReader reader = new GenericMultipleBarcodeReader(
+            new MultiFormatReader());
+
+        while(true) {
+            int width;
+            try {
+                width = in.readInt();
+            } catch(EOFException e) {
+                // stdin closed
+                break;
+            }
+            int height = in.readInt();
+            byte[] pixels = new byte[width * height];
+            in.readFully(pixels);
+
+            Result[] results;
+            try {
+                results = decode(reader, pixels, width, height, hints);
+            } catch(RuntimeException e) {
+                out.writeInt(-1);
+                writeBytes(out, String.valueOf(e).getBytes(UTF8));
+                out.flush();
+                continue;
+            }
+
+            out.writeInt(results.length);
+            for(Result result : results) {
+                String format = result.getBarcodeFormat().toString();
+                writeBytes(out, format.getBytes(UTF8));
+                writeBytes(out, result.getText().getBytes(UTF8));
+                ResultPoint[] points = result.getResultPoints();
+                if(null == points) {
+                    points = new ResultPoint[0];
+                }
+                out.writeInt(points.length);
+                for(ResultPoint point : points) {
+                    out.writeFloat(null == point ? Float.NaN : point.getX());
+                    out.writeFloat(null == point ? Float.NaN : point.getY());
+                }
+            }
+            out.flush();
+        }
+    }
+
+    private static Result[] decode(GenericMultipleBarcodeReader reader,
+                                   byte[] pixels, int width, int height,
+                                   Map<DecodeHintType, Object> hints) {
+        // The luminance plane of a YUV image is a greyscale image
+        LuminanceSource source = new PlanarYUVLuminanceSource(
+            pixels, width, height, 0, 0, width, height, false);
+        try {
+            return reader.decodeMultiple(
+                new BinaryBitmap(new HybridBinarizer(source)), hints);
+        } catch(NotFoundException e) {
+            return new Result[0];
+        }
+    }
+
+    private static void writeBytes(DataOutputStream out, byte[] bytes)
+        throws IOException {
+        out.writeInt(bytes.length);
+        out.write(bytes);
+    }
+}
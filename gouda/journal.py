@@ -0,0 +1,89 @@
+"""A record of the images processed by a batch, so that it can be resumed
+"""
+import io
+import json
+import os
+import time
+
+from gouda.util import debug_print
+
+
+def _key(path):
+    return os.path.abspath(str(path))
+
+
+class Journal(object):
+    """Records the paths of images that have been processed in a file at path.
+
+    If resume is True, paths recorded by a previous run are read and the
+    journal is appended to, otherwise the journal is started afresh.
+
+    Each path is written as a line of JSON and flushed, so that it survives the
+    process being killed. To prevent each path from waiting on the disk, the
+    journal is synced only after sync_interval paths or sync_seconds seconds,
+    whichever comes first, so at most that many paths are lost should the
+    machine fail.
+    """
+    def __init__(self, path, resume=False, sync_interval=100, sync_seconds=5.0):
+        self.path = path
+        self.sync_interval, self.sync_seconds = sync_interval, sync_seconds
+        self._paths = set()
+
+        if resume and os.path.isfile(str(path)):
+            self._read()
+            self._file = io.open(str(path), 'ab')
+            if self._truncated:
+                # Terminate a line that was being written when the previous
+                # run stopped
+                self._file.write(b'\n')
+        else:
+            self._file = io.open(str(path), 'wb')
+
+        self._unsynced = 0
+        self._synced_at = time.time()
+
+    def _read(self):
+        self._truncated = False
+        with io.open(str(self.path), 'rb') as f:
+            for line in f:
+                self._truncated = not line.endswith(b'\n')
+                try:
+                    self._paths.add(json.loads(line.decode('utf8')))
+                except ValueError:
+                    # A previous run stopped while writing this line
+                    debug_print('Ignoring incomplete line [{0!r}]'.format(line))
+        debug_print('Read [{0}] paths from journal [{1}]'.format(
+            len(self._paths), self.path
+        ))
+
+    def __contains__(self, path):
+        return _key(path) in self._paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def record(self, path):
+        "Records that path has been processed"
+        key = _key(path)
+        self._paths.add(key)
+        self._file.write(json.dumps(key).encode('utf8') + b'\n')
+        self._file.flush()
+        self._unsynced += 1
+        if (self._unsynced >= self.sync_interval or
+                time.time() - self._synced_at >= self.sync_seconds):
+            self.sync()
+
+    def sync(self):
+        "Forces recorded paths to disk"
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._synced_at = time.time()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
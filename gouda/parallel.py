@@ -0,0 +1,132 @@
+"""Calling engines from more than one thread
+"""
+import collections
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class PerThreadEngine(object):
+    """An engine that delegates to an instance of an engine for each thread
+    that calls it, constructed by calling factory on the thread's first call.
+
+    factory can be any function that returns an engine, such as the values
+    returned by engine_options(). close closes the engines that have close
+    methods.
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self._local = threading.local()
+        self._engines = []
+        self._lock = threading.Lock()
+
+    def _engine(self):
+        "The engine of the calling thread"
+        engine = getattr(self._local, 'engine', None)
+        if engine is None:
+            engine = self._local.engine = self.factory()
+            with self._lock:
+                self._engines.append(engine)
+        return engine
+
+    def close(self):
+        "Closes the engines of all threads"
+        with self._lock:
+            engines, self._engines = self._engines, []
+        for engine in engines:
+            if hasattr(engine, 'close'):
+                engine.close()
+
+    @property
+    def region_hint(self):
+        "True if the engine accepts a region - see the roi strategy"
+        return getattr(self._engine(), 'region_hint', False)
+
+    def __call__(self, img, **kwargs):
+        return self._engine()(img, **kwargs)
+
+
+# Mapping from number of threads to ThreadPoolExecutor
+_EXECUTORS = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+
+def executor(threads):
+    """A ThreadPoolExecutor of threads threads, shared by all callers. Threads
+    last as long as the process, so a PerThreadEngine constructs at most one
+    engine for each of them.
+    """
+    with _EXECUTORS_LOCK:
+        if threads not in _EXECUTORS:
+            _EXECUTORS[threads] = ThreadPoolExecutor(threads)
+        return _EXECUTORS[threads]
+
+
+def imap(function, items, threads, until=None):
+    """Generator of tuples (item, function(item)) for each of items, in order.
+
+    Up to threads items are evaluated concurrently, by threads of executor.
+    Once function returns a value for which until returns True, items that
+    have not been started are not evaluated, other than those before it.
+    Exceptions raised by function are raised once the items before it have
+    been yielded. Items that have not been started are cancelled when the
+    generator is closed.
+    """
+    if threads < 1:
+        raise ValueError('Invalid threads [{0}]'.format(threads))
+    elif 1 == threads:
+        for item in items:
+            result = function(item)
+            yield item, result
+            if until and until(result):
+                return
+        return
+
+    stopped = threading.Event()
+
+    def done(future):
+        if (future.cancelled() or future.exception() or
+                (until and until(future.result()))):
+            stopped.set()
+
+    pool = executor(threads)
+    items = iter(items)
+    pending = collections.deque()
+    try:
+        while True:
+            while len(pending) < threads and not stopped.is_set():
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                future = pool.submit(function, item)
+                future.add_done_callback(done)
+                pending.append((item, future))
+
+            if not pending:
+                break
+
+            item, future = pending.popleft()
+            result = future.result()
+            yield item, result
+            if until and until(result):
+                break
+    finally:
+        for item, future in pending:
+            future.cancel()
+        # Calls that are under way cannot be interrupted
+        wait([future for item, future in pending])
+
+
+def first(function, items, threads):
+    """Returns a tuple (item, function(item)) for the first of items, in order,
+    for which function returns a true value, or None. See imap.
+    """
+    results = imap(function, items, threads, until=bool)
+    try:
+        for item, result in results:
+            if result:
+                return item, result
+        return None
+    finally:
+        results.close()
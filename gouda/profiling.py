@@ -0,0 +1,238 @@
+"""Profiling runs of decode_barcodes
+"""
+from __future__ import print_function
+
+import cProfile
+import os
+import pstats
+import re
+import sys
+
+from collections import defaultdict
+
+from gouda.timing import clock
+
+
+def _builtin(name):
+    "Returns a function that matches the pstats key of the builtin name"
+    # cProfile's names of builtins differ between versions of Python and
+    # OpenCV - '<built-in function resize>', '<built-in method cv2.resize>',
+    # '<resize>'
+    pattern = re.compile(r'[<. ]{0}>$'.format(re.escape(name)))
+    return lambda key: '~' == key[0] and pattern.search(key[2])
+
+
+# The directory that contains gouda's modules
+_PACKAGE = os.path.dirname(os.path.realpath(__file__))
+
+# Mapping from filenames in pstats keys to normalised paths
+_PATHS = {}
+
+
+def _path(filename):
+    "filename, as given in a pstats key, normalised for comparison"
+    if filename not in _PATHS:
+        _PATHS[filename] = os.path.normcase(os.path.realpath(filename))
+    return _PATHS[filename]
+
+
+def _source(module):
+    """The normalised path of the source of module, a '/'-separated path
+    within the gouda package, such as 'strategies/roi/decode'
+    """
+    return _path(os.path.join(_PACKAGE, *module.split('/')) + '.py')
+
+
+def _function(module, name):
+    """Returns a function that matches the pstats key of the function name
+    in module - see _source
+    """
+    source = _source(module)
+    return lambda key: name == key[2] and source == _path(key[0])
+
+
+# The directory that contains gouda's engines
+_ENGINES = _path(os.path.join(_PACKAGE, 'engines'))
+
+
+def _is_engine_call(key):
+    filename, line, name = key
+    return (
+        '__call__' == name and '~' != filename and
+        _ENGINES == os.path.dirname(_path(filename))
+    )
+
+
+def _label(key):
+    "A short label for the function given by a pstats key"
+    filename, line, name = key
+    if '~' == filename:
+        # A builtin - strip the surrounding angle brackets
+        return name[1:-1] if name.startswith('<') else name
+    else:
+        return '{0}:{1}'.format(
+            os.path.splitext(os.path.basename(filename))[0], name
+        )
+
+
+def _callees(stats):
+    "Returns a dict {caller key: {callee key: (calls, cumulative seconds)}}"
+    callees = defaultdict(dict)
+    for key, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees[caller][key] = (edge[1], edge[3])
+    return callees
+
+
+def _total(stats, match):
+    "Returns (calls, cumulative seconds) of functions that match"
+    calls, seconds = 0, 0.0
+    for key, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if match(key):
+            calls += nc
+            seconds += ct
+    return calls, seconds
+
+
+def summarise(stats):
+    """Returns a list of tuples (stage, calls, seconds) of the time spent in
+    the stages of decoding barcodes, as recorded by stats, a pstats.Stats.
+    Seconds are cumulative, so stages that call each other overlap.
+    """
+    rows = [
+        ('cv2.imread',) + _total(stats, _builtin('imread')),
+        ('resize: _unsharpmask',) + _total(
+            stats, _function('strategies/resize', '_unsharpmask')
+        ),
+        ('cv2.resize',) + _total(stats, _builtin('resize')),
+    ]
+
+    callees = _callees(stats)
+
+    # Operations within Detector._compute_candidates, slowest first
+    detector = _function('strategies/roi/detect', '_compute_candidates')
+    rows.append(('Detector._compute_candidates',) + _total(stats, detector))
+    stages = defaultdict(lambda: [0, 0.0])
+    for caller in (k for k in callees if detector(k)):
+        for callee, (calls, seconds) in callees[caller].items():
+            stages[_label(callee)][0] += calls
+            stages[_label(callee)][1] += seconds
+    rows.extend(
+        ('  ' + label, calls, seconds)
+        for label, (calls, seconds) in sorted(
+            stages.items(), key=lambda item: item[1][1], reverse=True
+        )
+    )
+
+    # Decoder._compute_barcodes, less the time spent in the engine
+    calls, seconds = _total(
+        stats, _function('strategies/roi/decode', '_compute_barcodes')
+    )
+    decode_candidate = _function('strategies/roi/decode', '_decode_candidate')
+    for caller in (k for k in callees if decode_candidate(k)):
+        seconds -= sum(
+            s for callee, (c, s) in callees[caller].items()
+            if '__call__' == callee[2]
+        )
+    rows.append(('Decoder preprocessing', calls, seconds))
+
+    # Each engine
+    for key in sorted(k for k in stats.stats if _is_engine_call(k)):
+        cc, nc, tt, ct, callers = stats.stats[key]
+        rows.append(('{0}.__call__'.format(_label(key).split(':')[0]), nc, ct))
+
+    return rows
+
+
+def collapsed_stacks(stats, max_depth=64):
+    """Generator of lines 'frame;frame;frame microseconds' - the 'collapsed'
+    or 'folded' format read by flame graph tools - from stats.
+
+    cProfile records calls between pairs of functions rather than whole stacks,
+    so the time spent in a function is attributed to each of the stacks that
+    lead to it in proportion to the time that it spent when called by each of
+    its callers.
+    """
+    callees = _callees(stats)
+    totals = defaultdict(float)
+
+    def visit(key, seconds, stack, keys):
+        cc, nc, tt, ct, callers = stats.stats[key]
+        stack = stack + [_label(key).replace(';', ':')]
+        keys = keys | set([key])
+        if ct > 0:
+            totals[';'.join(stack)] += seconds * tt / ct
+            if len(stack) < max_depth:
+                for callee, (calls, callee_seconds) in callees[key].items():
+                    share = seconds * callee_seconds / ct
+                    # Recursive calls are attributed to the outermost call.
+                    # Shares of less than a microsecond are not reported.
+                    if callee not in keys and share >= 1e-6:
+                        visit(callee, share, stack, keys)
+
+    for key, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if not callers:
+            visit(key, ct, [], frozenset())
+
+    for stack in sorted(totals):
+        microseconds = int(round(totals[stack] * 1e6))
+        if microseconds:
+            yield '{0} {1}'.format(stack, microseconds)
+
+
+class Profiler(object):
+    """Profiles, using cProfile, code that is run between calls to enable()
+    and disable() or within it as a context manager. Only the thread that
+    enabled profiling is profiled.
+    """
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self.elapsed = 0.0
+        self._start = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.disable()
+
+    def enable(self):
+        self._start = clock()
+        self._profile.enable()
+
+    def disable(self):
+        self._profile.disable()
+        self.elapsed += clock() - self._start
+
+    def stats(self):
+        return pstats.Stats(self._profile)
+
+    def print_summary(self, file=None):
+        "Writes a table of the time spent in each stage of decoding"
+        file = file if file else sys.stderr
+        rows = summarise(self.stats())
+        width = max([len('Stage')] + [len(r[0]) for r in rows])
+        line = '{0:<{width}}  {1:>9}  {2:>10}  {3:>6}'
+        print(line.format('Stage', 'Calls', 'Seconds', '%', width=width),
+              file=file)
+        for stage, calls, seconds in rows:
+            percent = 100.0 * seconds / self.elapsed if self.elapsed else 0.0
+            print(line.format(
+                stage, calls, '{0:.3f}'.format(seconds),
+                '{0:.1f}'.format(percent), width=width
+            ), file=file)
+        print(line.format(
+            'Total', '', '{0:.3f}'.format(self.elapsed), '100.0', width=width
+        ), file=file)
+
+    def dump(self, path):
+        """Writes the profile to path - in the collapsed stack format if path
+        ends with '.collapsed' or '.folded', otherwise as pstats
+        """
+        if str(path).endswith(('.collapsed', '.folded')):
+            with open(str(path), 'w') as f:
+                for line in collapsed_stacks(self.stats()):
+                    f.write(line + '\n')
+        else:
+            self._profile.dump_stats(str(path))
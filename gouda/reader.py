@@ -0,0 +1,95 @@
+"""Reading sequences of images, optionally ahead of them being decoded
+"""
+import collections
+import traceback
+
+from functools import partial
+
+from concurrent.futures import ThreadPoolExecutor
+
+from gouda.util import read_image
+
+
+def _read(path, read_greyscale):
+    try:
+        return path, read_image(path, read_greyscale), None
+    except Exception:
+        return path, None, traceback.format_exc()
+
+
+def _nbytes(item):
+    # Memory occupied by the image in a tuple (path, img, ...)
+    img = item[1]
+    return img.nbytes if img is not None else 0
+
+
+def read_images(paths, read_greyscale):
+    """Generator of tuples (path, img, error) for each path in paths.
+
+    img is None if path could not be read - most likely it is not an image.
+    error is None if reading did not raise, otherwise a formatted traceback.
+    """
+    for path in paths:
+        yield _read(path, read_greyscale)
+
+
+def prefetch(function, items, depth=4, max_bytes=None, threads=None,
+             nbytes=_nbytes):
+    """Generator of function(item) for each of items, computed by a pool of
+    threads up to depth items ahead of the one most recently yielded. Results
+    are yielded in the order of items. items can be any iterable and is
+    consumed lazily.
+
+    If max_bytes is given, computing ahead pauses while the results that are
+    waiting to be yielded, together with an estimate of those still being
+    computed, would occupy more than max_bytes, as reported by nbytes. At least
+    one item is always computed ahead.
+    """
+    if depth < 1:
+        raise ValueError('Invalid depth [{0}]'.format(depth))
+
+    items = iter(items)
+    pending = collections.deque()
+    # Size of the most recent result - used to estimate the size of results
+    # that are still being computed
+    typical = 0
+
+    def buffered():
+        return sum(
+            nbytes(future.result()) if future.done() else typical
+            for future in pending
+        )
+
+    executor = ThreadPoolExecutor(max_workers=threads or depth)
+    try:
+        while True:
+            while len(pending) < depth and (
+                    not pending or not max_bytes or buffered() < max_bytes):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                else:
+                    pending.append(executor.submit(function, item))
+
+            if not pending:
+                break
+
+            result = pending.popleft().result()
+            typical = nbytes(result)
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
+
+
+def prefetch_images(paths, read_greyscale, depth=4, max_bytes=None,
+                    threads=None):
+    """As read_images but reads up to depth images ahead of the one most
+    recently yielded, using a pool of threads - see prefetch.
+    """
+    return prefetch(
+        partial(_read, read_greyscale=read_greyscale), paths, depth, max_bytes,
+        threads
+    )
@@ -3,6 +3,8 @@ from __future__ import print_function
 
 import argparse
 import csv
+import json
+import multiprocessing
 import re
 import shutil
 import sys
@@ -16,44 +18,67 @@ from functools import partial
 import gouda
 import gouda.util
 
-from gouda.engines.options import engine_options
+from gouda.batch import decode_many
+from gouda.cache import ResultCache, cache_key
+from gouda.engines.composite import MODES, SEPARATOR
+from gouda.engines.options import engine_factory, engine_options
 from gouda.gouda_error import GoudaError
-from gouda.util import expand_wildcard, read_image
+from gouda.journal import Journal
+from gouda.parallel import PerThreadEngine
+from gouda.profiling import Profiler
+from gouda.util import REDUCTIONS, barcode_text, expand_wildcard
+from gouda.walk import IMAGE_EXTENSIONS, FileFilter, walk
+from gouda.watch import Watcher
 from gouda.strategies.roi.roi import roi
-from gouda.strategies.resize import resize
+from gouda.strategies.resize import SEARCHES, resize
 
 
-def decode(paths, strategies, engine, visitors, read_greyscale):
-    """Finds and decodes barcodes in images given in pathss
+def decode(paths, strategies, engine, visitors, read_greyscale, processes=1,
+           ordered=True, prefetch=0, prefetch_bytes=None, cache=None,
+           journal=None, file_filter=None, watcher=None, timeout=None,
+           reduction=1):
+    """Finds and decodes barcodes in images given in paths, reporting results
+    to visitors
+
+    Directories are walked and files within them are selected by file_filter
+    - see gouda.walk.walk. If watcher is given, images are instead taken from
+    it as they appear, and paths and file_filter are not used - see
+    gouda.watch.Watcher.
+
+    Images are decoded by gouda.batch.decode_many - see it for engine,
+    processes, ordered, prefetch, prefetch_bytes, cache, timeout and
+    reduction.
+
+    If journal is given, images recorded in it are skipped and images are
+    recorded once they have been reported by visitors - see
+    gouda.journal.Journal.
     """
-    for p in sorted(paths):
-        if p.is_dir():
-            # Descend into directory
-            decode(p.iterdir(), strategies, engine, visitors, read_greyscale)
+    files = iter(watcher) if watcher else walk(paths, file_filter)
+    if journal:
+        files = (p for p in files if p not in journal)
+    results = decode_many(
+        files, engine, strategies, read_greyscale, processes, ordered,
+        prefetch, prefetch_bytes, cache, timeout, reduction=reduction
+    )
+
+    for p, result, error in results:
+        if error:
+            print('Error processing [{0}]'.format(p))
+            sys.stderr.write(error)
         else:
-            # Process file
             try:
-                img = read_image(p, read_greyscale)
-                if img is None:
-                    # Most likely not an image
-                    for visitor in visitors:
-                        visitor.result(p, [None, []])
-                else:
-                    # Read barcodes
-                    for strategy in strategies:
-                        result = strategy(img, engine)
-                        if result:
-                            # Found a barcode
-                            break
-                    else:
-                        # No barcode was found
-                        result = [None, []]
-
-                    for visitor in visitors:
-                        visitor.result(p, result)
+                for visitor in visitors:
+                    visitor.result(p, result)
             except Exception:
                 print('Error processing [{0}]'.format(p))
                 traceback.print_exc()
+            else:
+                if journal:
+                    journal.record(p)
+
+        if watcher:
+            # Report each image as soon as it has been decoded
+            sys.stdout.flush()
 
 
 class BasicReportVisitor(object):
@@ -83,7 +108,8 @@ class CSVReportVisitor(object):
         self.w = csv.writer(file if file else sys.stdout, lineterminator='\n')
         self.w.writerow([
             'OS', 'Engine', 'Directory', 'File', 'Image.conversion',
-            'Elapsed', 'N.found', 'Types', 'Values', 'Strategy'
+            'Elapsed', 'N.found', 'Types', 'Values', 'Strategy', 'Read.time',
+            'Decode.time', 'Engine.calls', 'Timed.out'
         ])
         self.engine = engine
         self.image_conversion = 'Greyscale' if greyscale else 'Unchanged'
@@ -92,11 +118,16 @@ class CSVReportVisitor(object):
     def result(self, path, result):
         strategy, barcodes = result
         types = '|'.join(b.type for b in barcodes)
-        # data could be either str or bytes
-        values = '|'.join(
-            b.data.decode() if hasattr(b.data, 'decode') else b.data
-            for b in barcodes
-        )
+        values = '|'.join(barcode_text(b.data) for b in barcodes)
+        # Results from the cache were neither read nor decoded
+        timing = getattr(result, 'timing', None)
+        if timing and not timing.cached:
+            timings = [
+                timing.read, timing.decode, timing.engine_calls,
+                timing.timed_out
+            ]
+        else:
+            timings = [None, None, None, None]
 
         self.w.writerow([sys.platform,
                          self.engine,
@@ -107,26 +138,58 @@ class CSVReportVisitor(object):
                          len(barcodes),
                          types,
                          values,
-                         strategy])
+                         strategy] + timings)
+
+
+class JSONLinesReportVisitor(object):
+    """Writes a JSON object per file, one per line, that includes the time
+    spent on each stage of decoding - see gouda.timing.Timing
+    """
+    def __init__(self, engine, greyscale, file=None):
+        self.file = file if file else sys.stdout
+        self.engine = engine
+        self.image_conversion = 'Greyscale' if greyscale else 'Unchanged'
+
+    def result(self, path, result):
+        strategy, barcodes = result
+        timing = getattr(result, 'timing', None)
+        self.file.write(json.dumps({
+            'path': str(path),
+            'engine': self.engine,
+            'image_conversion': self.image_conversion,
+            'strategy': strategy,
+            'barcodes': [
+                {'type': b.type, 'data': barcode_text(b.data)} for b in barcodes
+            ],
+            'timing': timing.as_dict() if timing else None,
+        }, sort_keys=True))
+        self.file.write('\n')
 
 
 class RenameVisitor(object):
     """Renames files based on their barcodes
+
+    If journal is given, renamed and copied files are recorded in it, so that
+    they are not processed again if the run is resumed. If watcher is given,
+    renamed and copied files are given to its ignore method, so that they are
+    not processed again as new files - see gouda.watch.Watcher.
     """
-    def __init__(self, avoid_collisions):
+    def __init__(self, avoid_collisions, journal=None, watcher=None):
         self.avoid_collisions = avoid_collisions
+        self.journal = journal
+        self.watcher = watcher
         # Mapping from path to iterator of integer suffixes, used to avoid
         # collisions - see self._destination
         self.suffix = defaultdict(partial(count, start=1))
 
-    def _destination(self, path):
+    def _destination(self, path, source):
         """Returns path possibly with a suffix appended to the name to avoid
-        collisions with existing files, iff self.avoid_collisions is True,
-        otherwise path is returned unaltered.
+        collisions with existing files other than source, iff
+        self.avoid_collisions is True, otherwise path is returned unaltered.
         """
         destination = path
         if self.avoid_collisions:
-            while destination.is_file():
+            while destination != source and destination.is_file():
                 fname = '{0}-{1}{2}'.format(
                     path.stem,
                     next(self.suffix[path.name]),
@@ -136,6 +199,13 @@ class RenameVisitor(object):
 
         return destination
 
+    def _created(self, path):
+        "Records path, a file created by renaming or copying"
+        if self.journal:
+            self.journal.record(path)
+        if self.watcher:
+            self.watcher.ignore(path)
+
     def result(self, path, result):
         strategy, barcodes = result
         print(path)
@@ -154,8 +224,8 @@ class RenameVisitor(object):
             first_destination = None
             for value in values:
                 dest = path.with_name('{0}{1}'.format(value, path.suffix))
-                dest = self._destination(dest)
                 source = first_destination if first_destination else path
+                dest = self._destination(dest, source)
                 rename = not bool(first_destination)
                 if source == dest:
                     print('  Already correctly named')
@@ -165,9 +235,11 @@ class RenameVisitor(object):
                 elif rename:
                     path.rename(dest)
                     print('  Renamed to [{0}]'.format(dest))
+                    self._created(dest)
                 else:
                     shutil.copy2(str(source), str(dest))
                     print('  Copied to [{0}]'.format(dest))
+                    self._created(dest)
                 if not first_destination:
                     first_destination = dest
 
@@ -184,7 +256,7 @@ def main(args):
     parser.add_argument('--debug', '-d', action='store_true')
     parser.add_argument(
         '--action', '-a',
-        choices=['basic', 'terse', 'csv', 'rename'], default='basic'
+        choices=['basic', 'terse', 'csv', 'jsonl', 'rename'], default='basic'
     )
     parser.add_argument('--greyscale', '-g', action='store_true')
     parser.add_argument(
@@ -192,11 +264,139 @@ def main(args):
         help=('If the action is "rename", appends a suffix to renamed files to '
               'prevent collisions')
     )
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=1,
+        help='Number of worker processes used to decode images; 0 for one per CPU'
+    )
+    parser.add_argument(
+        '--reduce', type=int, default=1, choices=REDUCTIONS, metavar='N',
+        help=('First read and decode images at 1/N of their size, which is '
+              'much faster for large JPEG images, and read them at full size '
+              'only if no barcodes are found; N is one of {0}'.format(
+                  ', '.join(str(r) for r in REDUCTIONS)
+              ))
+    )
+    parser.add_argument(
+        '--threads', '-t', type=int, default=1, metavar='N',
+        help=('Number of threads, each with its own engine, used to try '
+              'scales and candidate regions of each image concurrently')
+    )
+    parser.add_argument(
+        '--unordered', action='store_true',
+        help=('If --jobs is not 1, report each image as soon as it has been '
+              'decoded, rather than in the order in which images were found')
+    )
+    parser.add_argument(
+        '--prefetch', type=int, default=0, metavar='N',
+        help=('If --jobs is 1, read up to N images in background threads '
+              'while the current image is decoded')
+    )
+    parser.add_argument(
+        '--prefetch-memory', type=float, metavar='MB',
+        help='Limit the memory used by prefetched images to about MB megabytes'
+    )
+    parser.add_argument(
+        '--cache', metavar='PATH',
+        help=('SQLite database of results of decoding images; images that '
+              'are unchanged since they were last decoded by the same engine '
+              'are not decoded again')
+    )
+    parser.add_argument(
+        '--cache-size', type=int, default=1000000, metavar='N',
+        help='Maximum number of results held in the cache'
+    )
+    parser.add_argument(
+        '--journal', metavar='PATH',
+        help=('Record each image in PATH once it has been processed, so that '
+              'an interrupted run can be resumed')
+    )
+    parser.add_argument(
+        '--resume', action='store_true',
+        help=('Skip images that are recorded in the journal, rather than '
+              'starting a new journal')
+    )
+    parser.add_argument(
+        '--extensions', default=','.join(sorted(IMAGE_EXTENSIONS)),
+        help=('Comma-separated extensions of files to decode within '
+              'directories; an empty string for all files')
+    )
+    parser.add_argument(
+        '--check-magic', action='store_true',
+        help=('Decode files within directories only if their contents start '
+              'like those of an image')
+    )
+    parser.add_argument(
+        '--include', action='append', metavar='GLOB',
+        help=('Decode only files within directories that match GLOB; can be '
+              'given more than once')
+    )
+    parser.add_argument(
+        '--exclude', action='append', metavar='GLOB',
+        help=('Skip files and directories that match GLOB; can be given more '
+              'than once')
+    )
+    parser.add_argument(
+        '--watch', action='store_true',
+        help=('Watch the directories given as images and decode new files as '
+              'they appear, until interrupted')
+    )
+    parser.add_argument(
+        '--settle', type=float, default=2.0, metavar='SECONDS',
+        help=('If watching, decode files once their sizes and modification '
+              'times have not changed for SECONDS')
+    )
+    parser.add_argument(
+        '--poll', action='store_true',
+        help=('If watching, poll directories rather than using inotify. '
+              'Directories on network file systems are always polled.')
+    )
+    parser.add_argument(
+        '--poll-interval', type=float, default=5.0, metavar='SECONDS',
+        help='If polling, the interval between scans of directories'
+    )
+    parser.add_argument(
+        '--search', choices=SEARCHES, default='sweep',
+        help=('Order in which the resize strategy tries scales: from 100%% '
+              'down, widely-spaced scales first or scales closest to an '
+              'estimate of the size of barcode modules first')
+    )
+    parser.add_argument(
+        '--expected', type=int, metavar='N',
+        help=('Stop decoding candidate regions of an image once N different '
+              'barcodes have been found in it')
+    )
+    parser.add_argument(
+        '--combine', choices=MODES, default='all',
+        help=('How engines joined by {0} are combined: every engine is '
+              'called, engines are called in order until one finds barcodes '
+              'or engines are called in that way but cheapest '
+              'first'.format(SEPARATOR))
+    )
+    parser.add_argument(
+        '--timeout', type=float, metavar='SECONDS',
+        help=('Stop decoding an image once SECONDS have been spent on it, '
+              'reporting any barcodes found by then')
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help=('Profile the run and write a summary of the time spent in each '
+              'stage of decoding to stderr')
+    )
+    parser.add_argument(
+        '--profile-output', metavar='PATH',
+        help=('If profiling, write the profile to PATH - as collapsed stacks '
+              'for flame graphs if PATH ends with .collapsed or .folded, '
+              'otherwise as pstats')
+    )
 
     options = engine_options()
     if not options:
         raise GoudaError('No engines are available')
-    parser.add_argument('engine', choices=sorted(options.keys()))
+    parser.add_argument(
+        'engine',
+        help=('One of {0}, or two or more joined by {1}, such as '
+              'zbar{1}libdmtx'.format(', '.join(sorted(options)), SEPARATOR))
+    )
 
     parser.add_argument('image', nargs='+', help='path to an image or directory')
     parser.add_argument('-v', '--version', action='version',
@@ -206,21 +406,127 @@ def main(args):
 
     gouda.util.DEBUG_PRINT = args.debug
 
-    engine = options[args.engine]()
+    if args.jobs < 0:
+        parser.error('--jobs must not be negative')
+    elif args.prefetch < 0:
+        parser.error('--prefetch must not be negative')
+    elif args.threads < 1:
+        parser.error('--threads must be at least 1')
+    elif args.timeout is not None and args.timeout <= 0:
+        parser.error('--timeout must be greater than zero')
+    elif args.expected is not None and args.expected < 1:
+        parser.error('--expected must be at least 1')
+    elif args.resume and not args.journal:
+        parser.error('--resume requires --journal')
+    elif args.watch and args.prefetch:
+        parser.error('--prefetch cannot be used with --watch')
+    elif args.profile and 1 != args.jobs:
+        # Only the main process's main thread is profiled
+        parser.error('--profile cannot be used with --jobs other than 1')
+    elif args.profile and args.prefetch:
+        parser.error('--profile cannot be used with --prefetch')
+    elif args.profile and 1 != args.threads:
+        parser.error('--profile cannot be used with --threads other than 1')
+    elif args.profile_output and not args.profile:
+        parser.error('--profile-output requires --profile')
+
+    try:
+        factory = engine_factory(args.engine, options, args.combine)
+    except ValueError as e:
+        parser.error(str(e))
+    engine_name = args.engine
+    if SEPARATOR in args.engine and 'all' != args.combine:
+        engine_name = '{0} ({1})'.format(args.engine, args.combine)
+
+    journal = Journal(args.journal, args.resume) if args.journal else None
+
+    strategies = [resize, roi]
+    if 'sweep' != args.search:
+        strategies[0] = partial(resize, search=args.search)
+    if args.expected:
+        strategies[1] = partial(roi, expected=args.expected)
+    paths = expand_wildcard(args.image)
+    extensions = [
+        e if e.startswith('.') else '.' + e
+        for e in args.extensions.split(',') if e
+    ]
+    file_filter = FileFilter(
+        extensions or None, args.check_magic, args.include, args.exclude
+    )
+
+    watcher = None
+    if args.watch:
+        try:
+            watcher = Watcher(
+                paths, file_filter, settle=args.settle,
+                interval=args.poll_interval, polling=args.poll or None
+            )
+        except ValueError as e:
+            parser.error(str(e))
 
     if 'csv' == args.action:
-        visitor = CSVReportVisitor(args.engine, args.greyscale)
+        visitor = CSVReportVisitor(engine_name, args.greyscale)
+    elif 'jsonl' == args.action:
+        visitor = JSONLinesReportVisitor(engine_name, args.greyscale)
     elif 'terse' == args.action:
         visitor = TerseReportVisitor()
     elif 'rename' == args.action:
-        visitor = RenameVisitor(args.avoid_collisions)
+        visitor = RenameVisitor(args.avoid_collisions, journal, watcher)
     else:
         visitor = BasicReportVisitor()
 
-    strategies = [resize, roi]
-    decode(expand_wildcard(args.image), strategies, engine, [visitor],
-           args.greyscale)
+    cache = None
+    if args.cache:
+        cache = ResultCache(
+            args.cache,
+            cache_key(engine_name, strategies, args.greyscale, args.reduce),
+            max_entries=args.cache_size
+        )
+
+    if args.threads > 1:
+        # Results do not depend on the number of threads, so threads is not
+        # part of the cache key
+        strategies = [partial(s, threads=args.threads) for s in strategies]
+        factory = partial(PerThreadEngine, factory)
+
+    profiler = Profiler() if args.profile else None
+    try:
+        if 1 == args.jobs:
+            engine = factory()
+        else:
+            # Each worker process constructs its own engine
+            engine = factory
+        prefetch_bytes = None
+        if args.prefetch_memory:
+            prefetch_bytes = int(args.prefetch_memory * 1024 * 1024)
+        if profiler:
+            profiler.enable()
+        try:
+            decode(paths, strategies, engine, [visitor], args.greyscale,
+                   processes=args.jobs, ordered=not args.unordered,
+                   prefetch=args.prefetch, prefetch_bytes=prefetch_bytes,
+                   cache=cache, journal=journal, file_filter=file_filter,
+                   watcher=watcher, timeout=args.timeout,
+                   reduction=args.reduce)
+        finally:
+            if profiler:
+                profiler.disable()
+    except KeyboardInterrupt:
+        if not watcher:
+            raise
+    finally:
+        if cache:
+            cache.close()
+        if journal:
+            journal.close()
+
+    if profiler:
+        profiler.print_summary()
+        if args.profile_output:
+            profiler.dump(args.profile_output)
 
 
 if __name__ == '__main__':
+    # Required for worker processes in frozen Windows builds
+    multiprocessing.freeze_support()
     main(sys.argv[1:])
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import sys
+
+import gouda
+import gouda.util
+
+from gouda.batch import DecoderPool
+from gouda.engines.composite import MODES, SEPARATOR
+from gouda.engines.options import engine_factory, engine_options
+from gouda.gouda_error import GoudaError
+from gouda.server import DecodingServer
+from gouda.strategies.roi.roi import roi
+from gouda.strategies.resize import resize
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description=('Serves requests over HTTP to find and decode barcodes '
+                     'on images')
+    )
+    parser.add_argument('--debug', '-d', action='store_true')
+    parser.add_argument('--greyscale', '-g', action='store_true')
+    parser.add_argument(
+        '--host', default='127.0.0.1',
+        help='Address on which to listen; by default, only local connections'
+    )
+    parser.add_argument('--port', '-p', type=int, default=8080)
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=0,
+        help='Number of worker processes, each with an engine; 0 for one per CPU'
+    )
+    parser.add_argument(
+        '--max-pending', type=int, metavar='N',
+        help=('Refuse requests while N images are being decoded or waiting to '
+              'be decoded; default twice --jobs')
+    )
+    parser.add_argument(
+        '--max-size', type=float, default=100, metavar='MB',
+        help='Refuse images larger than MB megabytes'
+    )
+    parser.add_argument(
+        '--root', metavar='DIRECTORY',
+        help=('Accept requests to decode image files on the server within '
+              'DIRECTORY; by default, only images sent in requests are decoded')
+    )
+    parser.add_argument(
+        '--timeout', type=float, metavar='SECONDS',
+        help=('Stop decoding an image once SECONDS have been spent on it, '
+              'reporting any barcodes found by then')
+    )
+
+    options = engine_options()
+    if not options:
+        raise GoudaError('No engines are available')
+    parser.add_argument(
+        'engine',
+        help=('One of {0}, or two or more joined by {1}, such as '
+              'zbar{1}libdmtx'.format(', '.join(sorted(options)), SEPARATOR))
+    )
+    parser.add_argument(
+        '--combine', choices=MODES, default='all',
+        help='How engines joined by {0} are combined'.format(SEPARATOR)
+    )
+    parser.add_argument('-v', '--version', action='version',
+                        version='%(prog)s ' + gouda.__version__)
+
+    args = parser.parse_args(args)
+
+    gouda.util.DEBUG_PRINT = args.debug
+
+    if args.jobs < 0:
+        parser.error('--jobs must not be negative')
+    elif args.max_pending is not None and args.max_pending < 1:
+        parser.error('--max-pending must be at least 1')
+    elif args.timeout is not None and args.timeout <= 0:
+        parser.error('--timeout must be greater than zero')
+
+    try:
+        factory = engine_factory(args.engine, options, args.combine)
+    except ValueError as e:
+        parser.error(str(e))
+
+    pool = DecoderPool(
+        factory, [resize, roi], args.greyscale,
+        processes=args.jobs or None, timeout=args.timeout
+    )
+    with pool:
+        server = DecodingServer(
+            (args.host, args.port), pool, args.engine,
+            max_pending=args.max_pending, root=args.root,
+            max_bytes=int(args.max_size * 1024 * 1024)
+        )
+        print('Serving [{0}] on [{1}:{2}]'.format(
+            args.engine, *server.server_address[:2]
+        ))
+        sys.stdout.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == '__main__':
+    # Required for worker processes in frozen Windows builds
+    multiprocessing.freeze_support()
+    main(sys.argv[1:])
@@ -0,0 +1,214 @@
+"""An HTTP service that decodes barcodes in images using a pool of engines
+"""
+import json
+import os
+import threading
+import traceback
+
+from contextlib import contextmanager
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+import gouda
+
+from gouda.gouda_error import GoudaError
+from gouda.timing import clock
+from gouda.util import barcode_text, debug_print
+
+
+def result_json(result, elapsed):
+    "A dict of a DecodeResult, suitable for serializing as JSON"
+    return {
+        'strategy': result.strategy,
+        'barcodes': [
+            {'type': b.type, 'data': barcode_text(b.data)} for b in result.barcodes
+        ],
+        'timing': result.timing.as_dict() if result.timing else None,
+        'elapsed': elapsed,
+    }
+
+
+class _RequestError(Exception):
+    "Reported to the client with status"
+    def __init__(self, status, message, headers=None):
+        super(_RequestError, self).__init__(message)
+        self.status, self.headers = status, headers or {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'gouda/' + gouda.__version__
+
+    def log_message(self, format, *args):
+        debug_print('{0} - {1}'.format(self.address_string(), format % args))
+
+    def _reply(self, status, body, headers=None):
+        content = json.dumps(body, sort_keys=True).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _handle(self, function):
+        "Replies with the result of function and returns the status"
+        try:
+            self._reply(200, function())
+            return 200
+        except _RequestError as e:
+            self._reply(e.status, {'error': str(e)}, e.headers)
+            return e.status
+        except Exception:
+            traceback.print_exc()
+            self._reply(500, {'error': 'Internal error'})
+            return 500
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if '/health' == url.path:
+            self._handle(self.server.status)
+        elif '/decode' == url.path:
+            paths = parse_qs(url.query).get('path')
+            if paths:
+                self._handle(lambda: self.server.decode_path(paths[0]))
+            else:
+                self._reply(400, {'error': 'No path given'})
+        else:
+            self._reply(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if '/decode' != urlparse(self.path).path:
+            self._reply(404, {'error': 'Not found'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = 0
+        if length < 1:
+            self._reply(411, {'error': 'Content-Length required'})
+        elif length > self.server.max_bytes:
+            # Do not read the image; close the connection rather than leave
+            # the body to be read as the next request
+            self.close_connection = True
+            self._reply(413, {'error': 'Image too large'})
+        else:
+            status = self._handle(
+                lambda: self.server.decode_stream(self.rfile, length)
+            )
+            if 200 != status:
+                # The body might not have been read, in which case it must
+                # not be read as the next request
+                self.close_connection = True
+
+
+class DecodingServer(ThreadingMixIn, HTTPServer):
+    """Serves requests to decode barcodes in images at address, a tuple
+    (host, port), using pool, a gouda.batch.DecoderPool, the worker processes
+    of which hold engines that are constructed when the pool starts.
+
+        POST /decode - decodes the image in the body of the request
+        GET /decode?path=PATH - decodes the image file at PATH, which must be
+            within root on the server. Paths are refused if root is None.
+        GET /health - reports the engine and the number of pending requests
+
+    Responses are JSON objects. Barcodes are reported together with the time
+    spent decoding. Requests are handled concurrently. At most max_pending
+    requests are decoded or wait for a worker process; further requests are
+    refused with status 503 so that clients can back off and retry. Requests
+    for images that kill a worker process are answered with status 500.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, pool, engine, max_pending=None, root=None,
+                 max_bytes=100 * 1024 * 1024):
+        max_pending = max_pending or 2 * pool.processes
+        if max_pending < 1:
+            raise ValueError('Invalid max_pending [{0}]'.format(max_pending))
+        HTTPServer.__init__(self, address, _Handler)
+        self.pool, self.engine = pool, engine
+        self.max_pending, self.max_bytes = max_pending, max_bytes
+        self.root = os.path.realpath(str(root)) if root else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def status(self):
+        with self._lock:
+            pending = self._pending
+        return {
+            'engine': self.engine,
+            'processes': self.pool.processes,
+            'pending': pending,
+            'max_pending': self.max_pending,
+            'version': gouda.__version__,
+        }
+
+    @contextmanager
+    def _slot(self):
+        "Holds one of the max_pending slots, or raises if none is free"
+        if not self._slots.acquire(False):
+            raise _RequestError(503, 'Busy', {'Retry-After': '1'})
+        with self._lock:
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+
+    def _decode(self, data):
+        start = clock()
+        try:
+            result = self.pool.decode_data(data)
+        except ValueError as e:
+            raise _RequestError(400, str(e))
+        except GoudaError as e:
+            raise _RequestError(500, str(e))
+        return result_json(result, clock() - start)
+
+    def decode_data(self, data):
+        "Returns a dict of the result of decoding the image encoded in data"
+        with self._slot():
+            return self._decode(data)
+
+    def decode_stream(self, stream, length):
+        """Returns a dict of the result of decoding the image encoded in the
+        next length bytes of stream. The bytes are read once a slot is held,
+        so that the bodies of requests that are refused are not buffered.
+        """
+        with self._slot():
+            data = stream.read(length)
+            if len(data) != length:
+                raise _RequestError(400, 'Incomplete request body')
+            return self._decode(data)
+
+    def decode_path(self, path):
+        """Returns a dict of the result of decoding the image file at path,
+        which must be within root
+        """
+        path = os.path.realpath(path)
+        if not self.root:
+            raise _RequestError(403, 'Paths are not accepted')
+        elif not path.startswith(self.root.rstrip(os.sep) + os.sep):
+            raise _RequestError(403, 'Path is not within root')
+
+        with self._slot():
+            try:
+                size = os.path.getsize(path)
+            except EnvironmentError:
+                raise _RequestError(404, 'No such file')
+            if size > self.max_bytes:
+                raise _RequestError(413, 'Image too large')
+            with open(path, 'rb') as f:
+                data = f.read()
+            return self._decode(data)
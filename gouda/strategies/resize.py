@@ -1,48 +1,230 @@
+import re
+import threading
+
 import cv2
 import numpy as np
 
+from gouda.parallel import first
 from gouda.util import debug_print
 
 
-def _unsharpmask(img):
-    img = np.array(img, copy=True)
-    blur = cv2.GaussianBlur(img, (0, 0), 10)
-    return cv2.addWeighted(img, 3, blur, -2, 0)
+_MESSAGE = re.compile(
+    r'^resize: scaling factor \[([0-9.]+)\] sharpening \[([0-9]+)\]$'
+)
+
+
+# Fractions of the original size at which images are given to the engine
+FACTORS = tuple(round(x * 0.01, 2) for x in range(100, 0, -5))
+
+
+def _blur(img, sigma):
+    # A large blur removes the detail that is lost by reducing the image, so
+    # is computed on a reduced copy, which is much faster
+    shrink = int(sigma / 4)
+    height, width = img.shape[:2]
+    if shrink > 1 and min(height, width) >= 4 * shrink:
+        small = cv2.resize(
+            img, None, fx=1.0 / shrink, fy=1.0 / shrink,
+            interpolation=cv2.INTER_AREA
+        )
+        small = cv2.GaussianBlur(small, (0, 0), sigma / shrink)
+        return cv2.resize(small, (width, height))
+    else:
+        return cv2.GaussianBlur(img, (0, 0), sigma)
+
+
+def _unsharpmask(img, sigma=10):
+    return cv2.addWeighted(img, 3, _blur(img, sigma), -2, 0)
+
+
+class _Pyramid(object):
+    """An image and copies of it reduced by successive factors of two,
+    computed as they are first needed. Methods can be called from more than
+    one thread.
+
+    Each copy is derived from the one before by area interpolation or, if
+    unsharpened is given, by sharpening the copy of the same size in
+    unsharpened, at its own scale.
+    """
+    def __init__(self, img, unsharpened=None):
+        self._levels = [] if unsharpened else [img]
+        self._unsharpened = unsharpened
+        self._lock = threading.Lock()
+
+    def sharpened(self):
+        return _Pyramid(None, self)
+
+    def level(self, index):
+        "The image reduced by a factor of 2 ** index"
+        with self._lock:
+            while len(self._levels) <= index:
+                level = len(self._levels)
+                if self._unsharpened:
+                    self._levels.append(_unsharpmask(
+                        self._unsharpened.level(level), 10.0 / 2 ** level
+                    ))
+                else:
+                    self._levels.append(cv2.resize(
+                        self._levels[-1], None, fx=0.5, fy=0.5,
+                        interpolation=cv2.INTER_AREA
+                    ))
+            return self._levels[index]
+
+    def resized(self, dsize, factor):
+        """The image at factor of its original size, which is dsize, resized
+        from the smallest copy that is at least that large
+        """
+        index = 0
+        while 2.0 ** -(index + 1) >= factor:
+            index += 1
+        img = self.level(index)
+        if (img.shape[1], img.shape[0]) == dsize:
+            return img
+        else:
+            return cv2.resize(img, dsize)
+
+
+def scale_and_sharpening(msg):
+    """Returns a tuple (scaling factor, sharpening) parsed from msg, as
+    returned by resize, or None if msg was not returned by resize
+    """
+    match = _MESSAGE.match(msg or '')
+    if match:
+        return float(match.group(1)), int(match.group(2))
+    else:
+        return None
+
+
+def _coarse_to_fine(factors):
+    """factors reordered so that every fourth is tried first, then those
+    halfway between them, then the rest
+    """
+    order = []
+    for step in (4, 2, 1):
+        order.extend(f for f in factors[::step] if f not in order)
+    return order
 
 
+def module_size(img, step=4, threshold=24):
+    """Estimates the size, in pixels, of the modules of barcodes in img - the
+    most common distance between edges along every step'th row and column -
+    or returns None if img has too few edges.
 
-def resize(img, engine, minimum_pixels=10):
-    # Entire image at different fractions of original size
+    Edges are changes in grey level greater than threshold between adjacent
+    pixels.
+    """
+    # Only the sampled rows and columns are converted to greyscale
+    rows, columns = img[::step], np.ascontiguousarray(img[:, ::step])
+    if 3 == img.ndim:
+        rows = cv2.cvtColor(rows, cv2.COLOR_BGR2GRAY)
+        columns = cv2.cvtColor(columns, cv2.COLOR_BGR2GRAY)
 
+    distances = []
+    for lines in (rows, columns.T):
+        edges = np.abs(np.diff(lines.astype(np.int16), axis=1)) > threshold
+        # The first pixel of each edge - edges can be more than one pixel wide
+        starts = edges.copy()
+        starts[:, 1:] &= ~edges[:, :-1]
+        line, position = np.nonzero(starts)
+        # Distances between consecutive edges along the same line
+        distances.append(np.diff(position)[0 == np.diff(line)])
+
+    distances = np.concatenate(distances)
+    distances = distances[(distances >= 2) & (distances <= 64)]
+    if len(distances) < 50:
+        return None
+    else:
+        return int(np.argmax(np.bincount(distances)))
+
+
+# Size of modules, in pixels, at which the 'module' search starts
+MODULE_PIXELS = 3
+
+
+def _by_module_size(factors, img):
+    """factors ordered by how close they bring the estimated module size of
+    img to MODULE_PIXELS
+    """
+    module = module_size(img)
+    debug_print('Estimated module size [{0}]'.format(module))
+    if module:
+        return sorted(
+            factors, key=lambda f: abs(np.log(f * module / MODULE_PIXELS))
+        )
+    else:
+        return factors
+
+
+# Orders in which resize tries scaling factors
+SEARCHES = ('sweep', 'coarse', 'module')
+
+
+def resize(img, engine, minimum_pixels=10, search='sweep', threads=1):
+    """Gives the engine the entire image at different fractions of its
+    original size, stopping when the engine finds barcodes.
+
+    search is the order in which fractions are tried:
+        sweep - 100%, 95%, 90% ... 5%
+        coarse - 100%, 80% ... 20%, then 90%, 70% ... 10%, then the rest
+        module - closest first to the fraction at which the modules of
+            barcodes, as estimated by module_size, are MODULE_PIXELS wide
+
+    All fractions are tried, in the same order, for each level of sharpening.
+
+    If threads is greater than one, up to that many fractions are resized and
+    given to the engine concurrently, so the engine must be safe to call from
+    more than one thread - see gouda.parallel.PerThreadEngine. Fractions that
+    have not been started when the engine finds barcodes are not tried, and
+    the first fraction, in order, at which barcodes are found is reported, as
+    when threads is one.
+    """
     # Minimum number of pixel along each edge.
     if minimum_pixels < 3:
         raise ValueError('Invalid value for minimum_pixels: [{0}]'.format(
             minimum_pixels
         ))
+    elif search not in SEARCHES:
+        raise ValueError('Invalid search [{0}]'.format(search))
+
+    height, width = img.shape[:2]
 
+    # Resize only if resized height and width are at least the minimum.
+    # cv2.resize raises an error if either dimension is zero.
+    factors = [
+        f for f in FACTORS if 1 == f or min(
+            int(round(width * f)), int(round(height * f))
+        ) >= minimum_pixels
+    ]
+    if 'coarse' == search:
+        factors = _coarse_to_fine(factors)
+    elif 'module' == search:
+        factors = _by_module_size(factors, img)
+
+    # Images are resized from a pyramid of reduced copies rather than from
+    # the original, and are sharpened at the scale of each copy
     # TODO LH try more sharpening, equalisation, other stuff?
-    for sharpening in (0, 1, 2):
-        if sharpening > 0:
-            img = _unsharpmask(img)
-        height, width = img.shape[1], img.shape[0]
-        for factor in [round(x * 0.01, 2) for x in range(100, 0, -5)]:
-            msg = 'resize: scaling factor [{0}] sharpening [{1}]'
-            msg = msg.format(factor, sharpening)
-            debug_print(msg)
-            if 1 == factor:
-                resized = img
-            else:
-                # Resize from the original image, only if resized height and
-                # width are greater than the minimum.
-                # cv2.resize raises an error if either dimension is zero.
-                dsize = (int(round(height * factor)), int(round(width * factor)))
-                if dsize[0] >= minimum_pixels and dsize[1] >= minimum_pixels:
-                    resized = cv2.resize(img, dsize)
-                else:
-                    # No point in continuing to shrink
-                    break
-            barcodes = engine(resized)
-            if barcodes:
-                return msg, barcodes
+    pyramids = [_Pyramid(img)]
+    for sharpening in (1, 2):
+        pyramids.append(pyramids[-1].sharpened())
+
+    def attempt(scale):
+        factor, sharpening = scale
+        debug_print('resize: scaling factor [{0}] sharpening [{1}]'.format(
+            factor, sharpening
+        ))
+        pyramid = pyramids[sharpening]
+        if 1 == factor:
+            resized = pyramid.level(0)
+        else:
+            dsize = (int(round(width * factor)), int(round(height * factor)))
+            resized = pyramid.resized(dsize, factor)
+        return engine(resized)
 
-    return None
+    scales = ((f, s) for s in range(len(pyramids)) for f in factors)
+    result = first(attempt, scales, threads)
+    if result:
+        (factor, sharpening), barcodes = result
+        msg = 'resize: scaling factor [{0}] sharpening [{1}]'
+        return msg.format(factor, sharpening), barcodes
+    else:
+        return None
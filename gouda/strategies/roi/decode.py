@@ -4,20 +4,43 @@ import cv2
 import numpy as np
 
 from gouda.barcode import Barcode
+from gouda.gouda_error import DeadlineExceeded
+from gouda.parallel import imap
 from gouda.util import debug_print
 
 
 class Decoder(object):
     """ Decodes barcodes within rectangular regions of an image
+
+    Candidates are decoded in the order given - the roi strategy gives them
+    in decreasing order of Detector.scores. If expected is given, candidates
+    are no longer decoded once barcodes with at least that many different
+    values have been found.
+
+    If threads is greater than one, up to that many candidates are decoded
+    concurrently, so the engine must be safe to call from more than one
+    thread. Barcodes are reported in the order of candidates.
+
+    Engines are given each candidate cropped from the image. Engines that have
+    a true region_hint, such as LibDMTXEngine, are instead given the candidate
+    together with up to CONTEXT pixels around it, and the region, relative to
+    that crop, in which the candidate lies, so that they can choose how much
+    of the surrounding image to search.
     """
 
-    # TODO Stop after n barcodes?
+    # Pixels around candidates given to engines that have a region_hint
+    CONTEXT = 32
 
-    def __init__(self, img, candidates, engine, expected=None):
+    def __init__(self, img, candidates, engine, expected=None, threads=1):
+        if expected is not None and expected < 1:
+            raise ValueError('Invalid expected [{0}]'.format(expected))
         self._img = img
         self._candidates = candidates
         self._barcodes = None
         self._engine = engine
+        self._expected = expected
+        self._threads = threads
+        self._region_hint = getattr(engine, 'region_hint', False)
 
     def __iter__(self):
         """ Iterate Barcode objects
@@ -34,29 +57,69 @@ class Decoder(object):
             img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
         res = []
-        for rect in self._candidates:
-            left, top, right, bottom = rect.coordinates
-            crop = img[top:bottom, left:right]
-
-            # Unsharp mask
-            blur = cv2.GaussianBlur(crop, (0, 0), 10)
-            crop = cv2.addWeighted(crop, 1.5, blur, -0.5, 0)
-
-            # Equalisation/contrast sometimes causes libdtmx to fail, sometimes
-            # causes it to succeed.
-            decoded = self._engine(crop)
-            if not decoded:
-                debug_print('Applying contrast to candidate crop')
-                # Contrast
-                # http://stackoverflow.com/questions/10549245/how-can-i-adjust-contrast-in-opencv-in-c
-                bigmask = cv2.compare(crop, np.uint8([0x80]), cv2.CMP_GE)
-                smallmask = cv2.bitwise_not(bigmask)
-                big = cv2.add(crop, 0x10, mask=bigmask)
-                small = cv2.subtract(crop, 0x5a, mask=smallmask)
-                crop = cv2.add(big, small)
-                decoded = self._engine(crop)
-
-            for b in decoded:
-                res.append(Barcode(b.type, b.data))
-
+        try:
+            self._decode_candidates(img, res)
+        except DeadlineExceeded:
+            # Report the barcodes found in candidates that were decoded in
+            # time
+            debug_print('Deadline exceeded after [{0}] barcodes'.format(
+                len(res)
+            ))
         return res
+
+    def _decode_candidates(self, img, res):
+        "Appends barcodes found in candidates to res"
+        decoded = imap(
+            lambda rect: self._decode_candidate(img, rect), self._candidates,
+            self._threads
+        )
+        values = set()
+        try:
+            for rect, barcodes in decoded:
+                res.extend(barcodes)
+                values.update(b.data for b in barcodes)
+                if self._expected and len(values) >= self._expected:
+                    debug_print('Found [{0}] expected barcodes'.format(
+                        self._expected
+                    ))
+                    break
+        finally:
+            # Candidates that have not been started are not decoded
+            decoded.close()
+
+    def _decode_candidate(self, img, rect):
+        "Returns a list of barcodes found in rect"
+        left, top, right, bottom = rect.coordinates
+        kwargs = {}
+        if self._region_hint:
+            height, width = img.shape[:2]
+            context_left = max(0, left - self.CONTEXT)
+            context_top = max(0, top - self.CONTEXT)
+            kwargs['region'] = (
+                left - context_left, top - context_top,
+                right - context_left, bottom - context_top
+            )
+            left, top = context_left, context_top
+            right = min(width, right + self.CONTEXT)
+            bottom = min(height, bottom + self.CONTEXT)
+        crop = img[top:bottom, left:right]
+
+        # Unsharp mask
+        blur = cv2.GaussianBlur(crop, (0, 0), 10)
+        crop = cv2.addWeighted(crop, 1.5, blur, -0.5, 0)
+
+        # Equalisation/contrast sometimes causes libdtmx to fail, sometimes
+        # causes it to succeed.
+        decoded = self._engine(crop, **kwargs)
+        if not decoded:
+            debug_print('Applying contrast to candidate crop')
+            # Contrast
+            # http://stackoverflow.com/questions/10549245/how-can-i-adjust-contrast-in-opencv-in-c
+            bigmask = cv2.compare(crop, np.uint8([0x80]), cv2.CMP_GE)
+            smallmask = cv2.bitwise_not(bigmask)
+            big = cv2.add(crop, 0x10, mask=bigmask)
+            small = cv2.subtract(crop, 0x5a, mask=smallmask)
+            crop = cv2.add(big, small)
+            decoded = self._engine(crop, **kwargs)
+
+        return [Barcode(b.type, b.data) for b in decoded]
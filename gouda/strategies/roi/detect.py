@@ -3,7 +3,7 @@ from __future__ import print_function
 import cv2
 import numpy as np
 
-from .rect import Rect
+from .rect import RectSet
 from gouda.util import debug_print
 
 # debug_print = print
@@ -23,6 +23,7 @@ class Detector(object):
         self._img = img
         self._candidates = None
         self._working_images = None
+        self._integrals = None
         self.structuring_kernel = structuring_kernel
 
     @property
@@ -35,9 +36,46 @@ class Detector(object):
             self._working_images, self._candidates = self._compute_candidates()
         return self._candidates
 
+    # Candidates more elongated than this are more likely to be lines of text
+    # or the edges of labels than barcodes
+    MAX_ASPECT = 8
+
+    def scores(self, rects):
+        """A cheap estimate, between 0 and 1, of how likely each of rects -
+        some of candidates - is to contain a barcode: the product of the
+        density of strong gradients within the rect, the proportion of the
+        rect that is filled by the region that was detected and a penalty for
+        very elongated rects. Computed for all rects at once from sums over the
+        working images, so costs little more than a few lookups for each rect.
+        """
+        if self._integrals is None:
+            self.candidates    # Computes the working images if required
+            self._integrals = (
+                cv2.integral(self._working_images['thresh']),
+                cv2.integral(self._working_images['closing']),
+            )
+
+        rects = rects if isinstance(rects, RectSet) else RectSet(rects)
+        left, top, right, bottom = rects.coordinates.T
+        areas = np.maximum(rects.areas, 1) * 0xff
+
+        def density(integral):
+            return (
+                integral[bottom, right] - integral[top, right] -
+                integral[bottom, left] + integral[top, left]
+            ) / areas.astype(np.float64)
+
+        thresh, closing = self._integrals
+        penalty = np.minimum(1.0, self.MAX_ASPECT / rects.aspects)
+        return density(thresh) * density(closing) * penalty
+
+    def score(self, rect):
+        "The score of a single rect - see scores"
+        return float(self.scores([rect])[0])
+
     def _compute_candidates(self):
         """ Returns a tuple ({'image_name':image,},
-                             [(x,y,width,height),],
+                             RectSet([(x,y,width,height),]),
                             )
         """
         # Based on http://stackoverflow.com/questions/9013703/how-to-find-the-location-of-red-region-in-an-image-using-matlab/9014569#9014569
@@ -106,9 +144,5 @@ class Detector(object):
             }
 
 
-        candidates = [cv2.boundingRect(c) for c in contours]
-
-        candidates = [
-            Rect(x, y, width, height) for x, y, width, height in candidates
-        ]
+        candidates = RectSet([cv2.boundingRect(c) for c in contours])
         return (working_images, candidates)
@@ -1,5 +1,7 @@
 from gouda.util import debug_print
 
+from .rect import RectSet
+
 
 class AreaFilter(object):
     """ Filters rects by their areas
@@ -12,19 +14,13 @@ class AreaFilter(object):
         self.min_area, self.max_area = min_area, max_area
 
     def filter(self, rects):
+        "Returns a RectSet of those of rects whose areas are within limits"
+        rects = rects if isinstance(rects, RectSet) else RectSet(rects)
         debug_print('[{0}] rectangles'.format(len(rects)))
-        for index, r in enumerate(rects):
-            debug_print(index, r)
 
-        if self.min_area:
-            rects = [r for r in rects if r.area >= self.min_area]
-        if self.max_area:
-            rects = [r for r in rects if r.area <= self.max_area]
+        rects = rects.filter_area(self.min_area, self.max_area)
 
         debug_print(
             '[{0}] rectangles after filtering by area'.format(len(rects))
         )
-        for index, r in enumerate(rects):
-            debug_print(index, r)
-
         return rects
@@ -2,6 +2,8 @@ from __future__ import division
 
 import collections
 
+import numpy as np
+
 
 # Simple representations of Points and rectangles
 Point = collections.namedtuple('Point', ['x', 'y'])
@@ -46,3 +48,152 @@ class Rect(collections.namedtuple('Rect', ['left', 'top', 'width', 'height'])):
 
     def __ne__(self, other):
         return not self == other
+
+
+def _intersections(box, coordinates):
+    """Areas of intersection of box - (left, top, right, bottom) - with each
+    of coordinates, an array of shape (n, 4)
+    """
+    left, top, right, bottom = box
+    width = np.minimum(right, coordinates[:, 2])
+    width -= np.maximum(left, coordinates[:, 0])
+    height = np.minimum(bottom, coordinates[:, 3])
+    height -= np.maximum(top, coordinates[:, 1])
+    return np.maximum(width, 0) * np.maximum(height, 0)
+
+
+class RectSet(object):
+    """An immutable collection of rects held as an array of shape (n, 4) of
+    (left, top, width, height), so that collections of thousands of rects can
+    be filtered, suppressed and merged without a Python loop over each rect.
+
+    Iterating gives Rects. Indexing with an integer gives a Rect; indexing
+    with a slice, an array of indices or a boolean mask gives a RectSet.
+    """
+    def __init__(self, rects=()):
+        array = np.array(
+            [tuple(r) for r in rects] if not isinstance(rects, np.ndarray)
+            else rects,
+            dtype=np.int64
+        )
+        self.array = array.reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        return (Rect(*(int(v) for v in row)) for row in self.array)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Rect(*(int(v) for v in self.array[index]))
+        else:
+            return RectSet(self.array[index])
+
+    def __repr__(self):
+        return 'RectSet({0!r})'.format(list(self))
+
+    @property
+    def widths(self):
+        return self.array[:, 2]
+
+    @property
+    def heights(self):
+        return self.array[:, 3]
+
+    @property
+    def areas(self):
+        "The product of width and height of each rect"
+        return self.widths * self.heights
+
+    @property
+    def aspects(self):
+        "The ratio of the longer side to the shorter side of each rect"
+        longer = np.maximum(self.widths, self.heights).astype(np.float64)
+        shorter = np.minimum(self.widths, self.heights)
+        return np.where(
+            shorter > 0, longer / np.maximum(shorter, 1), np.inf
+        )
+
+    @property
+    def coordinates(self):
+        "An array of shape (n, 4) of (left, top, right, bottom)"
+        coordinates = self.array.copy()
+        coordinates[:, 2:] += self.array[:, :2]
+        return coordinates
+
+    def filter_area(self, min_area=None, max_area=None):
+        "Rects whose areas are within the given limits"
+        keep = np.ones(len(self), dtype=bool)
+        if min_area:
+            keep &= self.areas >= min_area
+        if max_area:
+            keep &= self.areas <= max_area
+        return self[keep]
+
+    def filter_aspect(self, max_aspect):
+        "Rects whose longer side is no more than max_aspect of their shorter"
+        return self[self.aspects <= max_aspect]
+
+    def suppress(self, scores, threshold=0.5):
+        """Non-maximum suppression: rects in decreasing order of scores,
+        without any rect whose intersection over union with a rect of a higher
+        score is greater than threshold
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        if len(scores) != len(self):
+            raise ValueError('Expected [{0}] scores, got [{1}]'.format(
+                len(self), len(scores)
+            ))
+
+        # A stable sort so that rects of equal score keep their order
+        order = np.argsort(-scores, kind='mergesort')
+        coordinates, areas = self.coordinates[order], self.areas[order]
+        suppressed = np.zeros(len(self), dtype=bool)
+        keep = []
+        for index in range(len(order)):
+            if not suppressed[index]:
+                keep.append(index)
+                intersections = _intersections(coordinates[index], coordinates)
+                unions = areas[index] + areas - intersections
+                suppressed |= intersections > threshold * unions
+        return self[order[keep]]
+
+    def merge(self, threshold=0.8):
+        """Rects in which each group of overlapping rects is replaced by their
+        bounding rect. Rects overlap if the area of their intersection is
+        more than threshold of the area of the smaller of them, so a rect
+        nested within another always overlaps it. The bounding rect of each
+        group takes the place of the first rect in the group.
+        """
+        coordinates, areas = self.coordinates, self.areas
+        merged = np.zeros(len(self), dtype=bool)
+        result = []
+        for index in range(len(self)):
+            if merged[index]:
+                continue
+            # Grow the group until no more rects overlap its bounding rect
+            group = np.zeros(len(self), dtype=bool)
+            group[index] = True
+            bounds = coordinates[index].copy()
+            while True:
+                intersections = _intersections(bounds, coordinates)
+                smaller = np.minimum(
+                    areas, (bounds[2] - bounds[0]) * (bounds[3] - bounds[1])
+                )
+                overlaps = ~merged & ~group & (
+                    intersections > threshold * smaller
+                )
+                if not overlaps.any():
+                    break
+                group |= overlaps
+                members = coordinates[group]
+                bounds = np.concatenate([
+                    members[:, :2].min(axis=0), members[:, 2:].max(axis=0)
+                ])
+            merged |= group
+            result.append((
+                bounds[0], bounds[1], bounds[2] - bounds[0],
+                bounds[3] - bounds[1]
+            ))
+        return RectSet(np.array(result, dtype=np.int64))
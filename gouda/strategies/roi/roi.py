@@ -7,8 +7,12 @@ from .filter import AreaFilter
 
 from pprint import pprint
 
-def roi(img, engine):
-    # Regions of the image that might contain barcodes
+def roi(img, engine, threads=1, expected=None):
+    # Regions of the image that might contain barcodes, decoded in order of
+    # how likely they are to contain a barcode. If expected is given, regions
+    # are no longer decoded once that many different barcodes have been found.
+    # If threads is greater than one, up to that many regions are decoded
+    # concurrently - see Decoder.
 
     # Detect candidate rectangles
     detector = Detector(img)
@@ -16,8 +20,17 @@ def roi(img, engine):
     # Filter candidate rectangles by area
     filtered = AreaFilter().filter(detector.candidates)
 
+    # Replace overlapping and nested rectangles by their bounding rectangles
+    filtered = filtered.merge()
+
+    # Most promising candidates first, without those that largely overlap a
+    # more promising candidate
+    filtered = filtered.suppress(detector.scores(filtered))
+
     # Decode barcodes
-    barcodes = list(Decoder(detector.resized, filtered, engine))
+    barcodes = list(Decoder(
+        detector.resized, filtered, engine, expected=expected, threads=threads
+    ))
 
     # Remove duplicate barcodes
     res = {}
@@ -0,0 +1,175 @@
+import sys
+import threading
+import time
+import unittest
+
+from pathlib import Path
+
+import numpy as np
+
+import gouda
+
+from gouda.barcode import Barcode
+from gouda.strategies.resize import resize
+
+from .test_batch import ShapeEngine, shape_strategy
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from gouda.aio import AsyncDecoder
+
+
+TESTDATA = Path(__file__).parent.joinpath('test_data')
+
+
+class SlowEngine(object):
+    "An engine that never finds barcodes, slowly"
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+        self.concurrent = self.max_concurrent = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, img):
+        with self._lock:
+            self.calls += 1
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            time.sleep(self.delay)
+            return []
+        finally:
+            with self._lock:
+                self.concurrent -= 1
+
+
+class FailingEngine(object):
+    def __call__(self, img):
+        raise ValueError('Failed')
+
+
+def _collect(loop, iterator):
+    "Returns a list of the items of an asynchronous iterator"
+    results = []
+    while True:
+        try:
+            results.append(loop.run_until_complete(iterator.__anext__()))
+        except StopAsyncIteration:
+            return results
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'Requires Python 3.5 or later')
+class TestAsyncDecoder(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.decoder = AsyncDecoder(max_workers=4)
+
+    def tearDown(self):
+        self.decoder.close()
+        self.loop.close()
+
+    def test_decode_path(self):
+        path = TESTDATA.joinpath('code128.png')
+        result = self.loop.run_until_complete(
+            self.decoder.decode(path, ShapeEngine(), [shape_strategy])
+        )
+        self.assertEqual(
+            ('shape', [Barcode(type='Shape', data='100x300')]), result
+        )
+        self.assertLess(0, result.timing.read)
+
+    def test_decode_image(self):
+        img = np.zeros((20, 30), dtype=np.uint8)
+        result = self.loop.run_until_complete(
+            self.decoder.decode(img, ShapeEngine(), [shape_strategy])
+        )
+        self.assertEqual(
+            ('shape', [Barcode(type='Shape', data='20x30')]), result
+        )
+        self.assertIsNone(result.timing.read)
+
+    def test_decode_async(self):
+        "The function in the gouda package uses the given decoder"
+        path = TESTDATA.joinpath('code128.png')
+        result = self.loop.run_until_complete(gouda.decode_async(
+            path, ShapeEngine(), [shape_strategy], decoder=self.decoder
+        ))
+        self.assertEqual('shape', result.strategy)
+
+    def test_limit(self):
+        "At most limit images are decoded at once by engines of a type"
+        decoder = AsyncDecoder(max_workers=4, limits={SlowEngine: 1})
+        engine = SlowEngine(0.01)
+        img = np.zeros((20, 20), dtype=np.uint8)
+        with decoder:
+            self.loop.run_until_complete(asyncio.wait([
+                self.loop.create_task(decoder.decode(img, engine, [resize]))
+                for _ in range(4)
+            ]))
+        self.assertEqual(1, engine.max_concurrent)
+        self.assertLess(4, engine.calls)
+
+    def test_cancel(self):
+        "Cancelling stops the resize strategy at its next call to the engine"
+        engine = SlowEngine()
+        task = self.loop.create_task(self.decoder.decode(
+            TESTDATA.joinpath('code128.png'), engine, [resize]
+        ))
+        self.loop.run_until_complete(asyncio.sleep(0.12))
+        task.cancel()
+        self.loop.run_until_complete(asyncio.wait([task]))
+        self.assertTrue(task.cancelled())
+        calls = engine.calls
+        self.assertLessEqual(1, calls)
+        time.sleep(0.2)
+        self.assertEqual(calls, engine.calls)
+        # resize without cancellation makes 57 calls on this image
+        self.assertGreater(10, calls)
+
+    def test_decode_many(self):
+        paths = [
+            TESTDATA.joinpath('code128.png'),
+            TESTDATA.joinpath('missing.png'),
+            np.zeros((20, 30), dtype=np.uint8),
+        ]
+        results = _collect(self.loop, gouda.decode_many_async(
+            paths, ShapeEngine(), [shape_strategy], read_greyscale=True,
+            ahead=2, decoder=self.decoder
+        ))
+        self.assertEqual(3, len(results))
+        self.assertEqual(paths[:2], [source for source, r, e in results[:2]])
+        self.assertEqual(
+            ['100x300', None, '20x30'],
+            [r.barcodes[0].data if r.barcodes else None for s, r, e in results]
+        )
+        self.assertEqual([None, None, None], [e for s, r, e in results])
+
+    def test_decode_many_error(self):
+        "Errors are reported and do not stop iteration"
+        paths = [TESTDATA.joinpath('code128.png')] * 2
+        results = _collect(
+            self.loop, self.decoder.decode_many(paths, FailingEngine(), [resize])
+        )
+        self.assertEqual([None, None], [r for s, r, e in results])
+        self.assertIn('ValueError: Failed', results[0][2])
+
+    def test_decode_many_aclose(self):
+        "aclose cancels images that have not been iterated"
+        engine = SlowEngine()
+        paths = [TESTDATA.joinpath('code128.png')] * 4
+        iterator = self.decoder.decode_many(paths, engine, [resize], ahead=4)
+        first = self.loop.create_task(iterator.__anext__())
+        self.loop.run_until_complete(asyncio.sleep(0.12))
+        first.cancel()
+        self.loop.run_until_complete(asyncio.wait([first]))
+        calls = engine.calls
+        time.sleep(0.2)
+        self.assertEqual(calls, engine.calls)
+        self.assertRaises(
+            StopAsyncIteration, self.loop.run_until_complete,
+            iterator.__anext__()
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
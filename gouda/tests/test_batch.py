@@ -0,0 +1,236 @@
+import itertools
+import os
+import threading
+import unittest
+
+from pathlib import Path
+
+import numpy as np
+
+import gouda
+
+from gouda.barcode import Barcode
+from gouda.batch import (DecoderPool, ReorderBuffer, decode_many,
+                         decode_path, decode_serially)
+from gouda.gouda_error import GoudaError
+from gouda.strategies.resize import resize
+from gouda.util import read_image
+
+
+TESTDATA = Path(__file__).parent / 'test_data'
+
+PATHS = sorted(TESTDATA.iterdir()) + [TESTDATA / 'missing.png']
+
+
+class ShapeEngine(object):
+    """An engine that 'decodes' the shape of the image
+    """
+    def __call__(self, img):
+        return [Barcode('Shape', '{0}x{1}'.format(*img.shape[:2]))]
+
+
+class DyingEngine(object):
+    "Kills the process that calls it, as a crash in C code would"
+    def __call__(self, img):
+        os._exit(1)
+
+
+class UnpicklableEngine(object):
+    "Finds barcodes that cannot be sent back from a worker process"
+    def __call__(self, img):
+        return [Barcode('Lock', threading.Lock())]
+
+
+def failing_factory():
+    raise ValueError('No engine')
+
+
+def shape_strategy(img, engine):
+    return 'shape', engine(img)
+
+
+class TestReorderBuffer(unittest.TestCase):
+    def test_reorder(self):
+        buffer = ReorderBuffer()
+        buffer.push(2, 'c')
+        buffer.push(1, 'b')
+        self.assertEqual([], list(buffer.ready()))
+        self.assertEqual(2, len(buffer))
+        buffer.push(0, 'a')
+        self.assertEqual(['a', 'b', 'c'], list(buffer.ready()))
+        self.assertEqual(0, len(buffer))
+
+    def test_duplicate(self):
+        buffer = ReorderBuffer()
+        buffer.push(0, 'a')
+        self.assertRaises(ValueError, buffer.push, 0, 'a')
+        list(buffer.ready())
+        self.assertRaises(ValueError, buffer.push, 0, 'a')
+
+
+class TestDecoderPool(unittest.TestCase):
+    def _check(self, results):
+        results = dict((path, (result, error)) for path, result, error in results)
+        self.assertEqual(sorted(PATHS), sorted(results.keys()))
+        self.assertEqual(
+            (('shape', [Barcode('Shape', '100x300')]), None),
+            results[TESTDATA / 'code128.png']
+        )
+        # Not an image
+        self.assertEqual(((None, []), None), results[TESTDATA / 'missing.png'])
+
+    def test_serial(self):
+        results = list(
+            decode_serially(PATHS, [shape_strategy], ShapeEngine(), False)
+        )
+        self.assertEqual(PATHS, [path for path, result, error in results])
+        self._check(results)
+
+    def test_ordered(self):
+        with DecoderPool(ShapeEngine, [shape_strategy], False, processes=2) as pool:
+            results = list(pool.imap(PATHS))
+        self.assertEqual(PATHS, [path for path, result, error in results])
+        self._check(results)
+
+    def test_unordered(self):
+        pool = DecoderPool(
+            ShapeEngine, [shape_strategy], False, processes=2, ordered=False,
+            backlog=1
+        )
+        with pool:
+            self._check(pool.imap(PATHS))
+
+    def test_worker_died(self):
+        paths = PATHS[:2]
+        with DecoderPool(DyingEngine, [shape_strategy], False, 1) as pool:
+            results = list(pool.imap(paths))
+        self.assertEqual(paths, [path for path, result, error in results])
+        for path, result, error in results:
+            self.assertIsNone(result)
+            self.assertIn('Worker process died', error)
+
+        with DecoderPool(DyingEngine, [shape_strategy], False, 1) as pool:
+            data = PATHS[0].read_bytes()
+            self.assertRaises(GoudaError, pool.decode_data, data)
+            self.assertEqual(1, pool.lost)
+
+    def test_unpicklable_result(self):
+        paths = PATHS[:1]
+        with DecoderPool(UnpicklableEngine, [shape_strategy], False, 1) as pool:
+            [(path, result, error)] = list(pool.imap(paths))
+        self.assertIsNone(result)
+        self.assertTrue(error)
+
+    def test_failing_factory(self):
+        self.assertRaises(
+            GoudaError, DecoderPool, failing_factory, [shape_strategy], False, 1
+        )
+
+
+def _images():
+    "Generator of images of increasing width, without end"
+    for width in itertools.count(1):
+        yield np.zeros((10, width), dtype=np.uint8)
+
+
+class TestDecodeMany(unittest.TestCase):
+    SOURCES = [
+        TESTDATA / 'code128.png',
+        np.zeros((20, 30), dtype=np.uint8),
+        TESTDATA / 'missing.png',
+    ]
+
+    def _check(self, results):
+        self.assertEqual(3, len(results))
+        self.assertEqual(TESTDATA / 'code128.png', results[0][0])
+        self.assertIs(self.SOURCES[1], results[1][0])
+        self.assertEqual(
+            [[Barcode('Shape', '100x300')], [Barcode('Shape', '20x30')], []],
+            [result.barcodes for source, result, error in results]
+        )
+        self.assertEqual([None, None, None], [e for s, r, e in results])
+
+    def test_serial(self):
+        self._check(list(
+            gouda.decode_many(self.SOURCES, ShapeEngine(), [shape_strategy])
+        ))
+
+    def test_prefetch(self):
+        self._check(list(decode_many(
+            self.SOURCES, ShapeEngine(), [shape_strategy], prefetch=2
+        )))
+
+    def test_processes(self):
+        self._check(list(decode_many(
+            self.SOURCES, ShapeEngine, [shape_strategy], processes=2
+        )))
+
+    def test_pool(self):
+        with DecoderPool(ShapeEngine, [shape_strategy], False, 1) as pool:
+            self._check(list(decode_many(self.SOURCES, None, pool=pool)))
+
+    def test_endless(self):
+        "Sources are consumed lazily"
+        for processes in (1, 2):
+            results = decode_many(
+                _images(), ShapeEngine if 2 == processes else ShapeEngine(),
+                [shape_strategy], processes=processes
+            )
+            self.assertEqual(
+                ['10x1', '10x2', '10x3'],
+                [r.barcodes[0].data for s, r, e in itertools.islice(results, 3)]
+            )
+            results.close()
+
+
+class LargeEngine(object):
+    "An engine that finds a barcode only in images at least width wide"
+    def __init__(self, width):
+        self.width = width
+
+    def __call__(self, img):
+        return [Barcode('Large', 'x')] if img.shape[1] >= self.width else []
+
+
+class TestReduction(unittest.TestCase):
+    PATH = TESTDATA / 'code128.png'
+
+    def test_read_image(self):
+        self.assertEqual((50, 150, 3), read_image(self.PATH, False, 2).shape)
+        self.assertEqual((25, 75), read_image(self.PATH, True, 4).shape)
+        self.assertRaises(ValueError, read_image, self.PATH, False, 3)
+
+    def test_reduced(self):
+        "Barcodes are found in the reduced image"
+        result = decode_path(
+            self.PATH, [shape_strategy], ShapeEngine(), False, reduction=2
+        )
+        self.assertEqual([Barcode('Shape', '50x150')], result.barcodes)
+        self.assertEqual(2, result.timing.reduction)
+        self.assertEqual(2, result.timing.as_dict()['reduction'])
+
+    def test_full_size(self):
+        "The image is read at full size if no barcodes are found"
+        result = decode_path(
+            self.PATH, [resize], LargeEngine(300), False, reduction=2
+        )
+        self.assertEqual([Barcode('Large', 'x')], result.barcodes)
+        timing = result.timing
+        self.assertEqual(1, timing.reduction)
+        self.assertEqual(1.0, timing.scale)
+        # 17 scales of the reduced image at 3 levels of sharpening, then one
+        # of the full-size image
+        self.assertEqual(52, timing.engine_calls)
+        self.assertEqual(2, len(timing.strategies))
+
+    def test_decode_many(self):
+        for processes in (1, 2):
+            [(path, result, error)] = decode_many(
+                [self.PATH], ShapeEngine() if 1 == processes else ShapeEngine,
+                [shape_strategy], processes=processes, reduction=4
+            )
+            self.assertEqual(4, result.timing.reduction)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import json
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+
+import numpy as np
+
+from gouda.benchmarks.corpus import (CODE128, DATAMATRIX, empty_specimen,
+                                     empty_specimens, specimen, specimens,
+                                     write_corpus)
+from gouda.benchmarks.run import benchmark, run
+from gouda.benchmarks.symbols import (code128_modules, code128_values,
+                                      datamatrix_modules)
+from gouda.engines import LibDMTXEngine, ZbarEngine
+from gouda.strategies.resize import resize
+
+
+WIDTHS = (640,)
+
+
+class NullEngine(object):
+    "An engine that never finds barcodes"
+    def __call__(self, img):
+        return []
+
+
+def _render_1d(modules, px=3):
+    row = np.repeat(np.pad(modules, 10, 'constant'), px)
+    return np.tile(np.where(row, 0, 255).astype(np.uint8), (60, 1))
+
+
+def _render_2d(modules, px=6):
+    img = np.where(np.pad(modules, 2, 'constant'), 0, 255).astype(np.uint8)
+    return np.kron(img, np.ones((px, px), dtype=np.uint8))
+
+
+class TestSymbols(unittest.TestCase):
+    def test_code128(self):
+        # (104 + 1*48 + 2*42 + 3*42 + 4*17 + 5*18 + 6*19 + 7*35) % 103
+        self.assertEqual(55, code128_values('PJJ123C')[-2])
+        # Switches to code set C for the trailing even run of digits
+        self.assertEqual(
+            [104, 17, 99, 23, 45], code128_values('12345')[:5]
+        )
+        self.assertEqual([105, 12, 34], code128_values('1234')[:3])
+        # Start, seven characters and check of eleven modules, stop of thirteen
+        self.assertEqual(11 * 9 + 13, len(code128_modules('PJJ123C')))
+        self.assertRaises(ValueError, code128_values, '')
+
+    def test_datamatrix(self):
+        modules = datamatrix_modules('BM001128287')
+        self.assertEqual((14, 14), modules.shape)
+        # Finder pattern
+        self.assertTrue(modules[:, 0].all())
+        self.assertTrue(modules[-1].all())
+        self.assertEqual([True, False] * 7, list(modules[0]))
+        self.assertEqual((26, 26), datamatrix_modules('x' * 44).shape)
+        self.assertRaises(ValueError, datamatrix_modules, 'x' * 45)
+
+    @unittest.skipUnless(ZbarEngine.available(), 'ZbarEngine unavailable')
+    def test_decode_code128(self):
+        img = _render_1d(code128_modules('BM001128287'))
+        self.assertEqual(
+            [b'BM001128287'], [b.data for b in ZbarEngine()(img)]
+        )
+
+    @unittest.skipUnless(LibDMTXEngine.available(), 'LibDMTXEngine unavailable')
+    def test_decode_datamatrix(self):
+        img = _render_2d(datamatrix_modules('BM001128287'))
+        self.assertEqual(
+            [b'BM001128287'], [b.data for b in LibDMTXEngine()(img)]
+        )
+
+
+class TestCorpus(unittest.TestCase):
+    def test_deterministic(self):
+        first, second = specimen(1, widths=WIDTHS), specimen(1, widths=WIDTHS)
+        self.assertTrue(np.array_equal(first.img, second.img))
+        self.assertEqual(first.labels, second.labels)
+        self.assertFalse(
+            np.array_equal(first.img, specimen(1, seed=1, widths=WIDTHS).img)
+        )
+
+    def test_specimens(self):
+        corpus = list(specimens(2, widths=(640, 800)))
+        self.assertEqual(['specimen-0000', 'specimen-0001'], [s.name for s in corpus])
+        self.assertEqual((480, 640, 3), corpus[0].img.shape)
+        self.assertEqual((600, 800, 3), corpus[1].img.shape)
+        self.assertEqual(
+            [CODE128, DATAMATRIX], [l.symbology for l in corpus[0].labels]
+        )
+
+    def test_empty(self):
+        first, second = list(empty_specimens(2, widths=WIDTHS))
+        self.assertEqual('empty-0000', first.name)
+        self.assertEqual([], first.labels)
+        self.assertEqual((480, 640, 3), first.img.shape)
+        self.assertTrue(
+            np.array_equal(first.img, empty_specimen(0, widths=WIDTHS).img)
+        )
+        self.assertFalse(np.array_equal(first.img, second.img))
+
+    def test_write_corpus(self):
+        tempdir = Path(tempfile.mkdtemp())
+        try:
+            write_corpus(tempdir, 2, widths=WIDTHS)
+            self.assertEqual(
+                ['labels.json', 'specimen-0000.png', 'specimen-0001.png'],
+                sorted(p.name for p in tempdir.iterdir())
+            )
+            with tempdir.joinpath('labels.json').open() as f:
+                labels = json.load(f)['labels']
+            self.assertEqual(
+                specimen(0, widths=WIDTHS).labels[0].data,
+                labels['specimen-0000.png'][0]['data']
+            )
+        finally:
+            shutil.rmtree(str(tempdir))
+
+
+class TestRun(unittest.TestCase):
+    def test_benchmark(self):
+        res = benchmark(NullEngine(), resize, specimens(2, widths=WIDTHS))
+        self.assertEqual(2, res['images'])
+        self.assertEqual({CODE128: 2, DATAMATRIX: 2}, res['labels'])
+        self.assertEqual(0, res['recall']['all'])
+        self.assertLess(1, res['engine_calls_per_image'])
+        self.assertEqual(0, res['decoded'])
+        self.assertIsNone(res['engine_calls_per_decode'])
+        self.assertEqual(0, res['empty_images'])
+        self.assertIsNone(res['seconds_per_empty_image'])
+
+    def test_benchmark_empty(self):
+        res = benchmark(NullEngine(), resize, empty_specimens(2, widths=WIDTHS))
+        self.assertEqual(2, res['images'])
+        self.assertEqual(2, res['empty_images'])
+        self.assertEqual({CODE128: 0, DATAMATRIX: 0}, res['labels'])
+        self.assertLess(0, res['seconds_per_empty_image'])
+
+    def test_run(self):
+        report = run(
+            {'null': NullEngine}, {'resize': resize}, 1, widths=WIDTHS, empty=1
+        )
+        self.assertEqual(
+            {'count': 1, 'empty': 1, 'seed': 0, 'widths': [640]},
+            report['corpus']
+        )
+        [result] = report['results']
+        self.assertEqual(2, result['images'])
+        self.assertEqual(1, result['empty_images'])
+        self.assertEqual('null', result['engine'])
+        self.assertEqual('resize', result['strategy'])
+        # Report can be written as JSON
+        json.dumps(report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import shutil
+import unittest
+
+from pathlib import Path
+
+from gouda.barcode import Barcode
+from gouda.batch import decode_serially
+from gouda.cache import ResultCache, cache_key
+
+from .test_batch import ShapeEngine, shape_strategy
+from .utils import temp_directory_with_files
+
+
+TESTDATA = Path(__file__).parent / 'test_data'
+
+RESULT = ('resize', [Barcode('CODE128', b'Stegosaurus'), Barcode('Text', 'x')])
+
+
+class CountingEngine(ShapeEngine):
+    calls = 0
+
+    def __call__(self, img):
+        self.calls += 1
+        return super(CountingEngine, self).__call__(img)
+
+
+class FailingEngine(object):
+    def __call__(self, img):
+        raise ValueError('Failed')
+
+
+class TestResultCache(unittest.TestCase):
+    def test_key(self):
+        self.assertNotEqual(
+            cache_key('zbar', [shape_strategy], False),
+            cache_key('zbar', [shape_strategy], True)
+        )
+        self.assertNotEqual(
+            cache_key('zbar', [shape_strategy], False),
+            cache_key('libdmtx', [shape_strategy], False)
+        )
+        self.assertNotEqual(
+            cache_key('zbar', [shape_strategy], False),
+            cache_key('zbar', [shape_strategy], False, 4)
+        )
+        self.assertEqual(
+            cache_key('zbar', [shape_strategy], False),
+            cache_key('zbar', [shape_strategy], False, 1)
+        )
+
+    def test_lookup(self):
+        with temp_directory_with_files(TESTDATA / 'code128.png') as tempdir:
+            image = tempdir / 'code128.png'
+            with ResultCache(tempdir / 'cache.sqlite', 'key') as cache:
+                self.assertIsNone(cache.lookup(image))
+                cache.store(image, RESULT)
+                self.assertEqual(RESULT, cache.lookup(image))
+
+            # Persisted
+            with ResultCache(tempdir / 'cache.sqlite', 'key') as cache:
+                self.assertEqual(RESULT, cache.lookup(image))
+
+                # Results are addressed by content, not path
+                shutil.copy(str(image), str(tempdir / 'copy.png'))
+                self.assertEqual(RESULT, cache.lookup(tempdir / 'copy.png'))
+
+                # Missing file
+                self.assertIsNone(cache.lookup(tempdir / 'missing.png'))
+
+                # Changed file
+                with image.open('ab') as f:
+                    f.write(b'x')
+                self.assertIsNone(cache.lookup(image))
+
+            # Different key
+            with ResultCache(tempdir / 'cache.sqlite', 'other') as cache:
+                self.assertIsNone(cache.lookup(tempdir / 'copy.png'))
+
+    def test_evict(self):
+        paths = [TESTDATA / p for p in ('code128.png', 'datamatrix.png')]
+        with temp_directory_with_files(*paths) as tempdir:
+            first, second = (tempdir / p.name for p in paths)
+            with ResultCache(tempdir / 'cache.sqlite', 'key', 1) as cache:
+                cache.store(first, RESULT)
+                cache.store(second, RESULT)
+            with ResultCache(tempdir / 'cache.sqlite', 'key', 1) as cache:
+                self.assertIsNone(cache.lookup(first))
+                self.assertEqual(RESULT, cache.lookup(second))
+
+    def test_pending(self):
+        "Digests of files whose results are not stored are not kept"
+        paths = [TESTDATA / p for p in ('code128.png', 'datamatrix.png')]
+        with temp_directory_with_files(*paths) as tempdir:
+            first, second = (tempdir / p.name for p in paths)
+            with ResultCache(tempdir / 'cache.sqlite', 'key') as cache:
+                cache.lookup(first)
+                cache.discard(first)
+                self.assertEqual({}, dict(cache._digests))
+
+                cache.MAX_PENDING = 1
+                cache.lookup(first)
+                cache.lookup(second)
+                self.assertEqual([str(second)], list(cache._digests))
+
+                # Images that could not be decoded
+                results = list(decode_serially(
+                    [first, second], [shape_strategy], FailingEngine(), False,
+                    cache=cache
+                ))
+                self.assertTrue(all(error for path, result, error in results))
+                self.assertEqual({}, dict(cache._digests))
+
+    def test_invalid_max_entries(self):
+        self.assertRaises(ValueError, ResultCache, ':memory:', 'key', 0)
+
+    def test_decode(self):
+        "Cached results are reported without decoding images"
+        paths = [TESTDATA / p for p in ('code128.png', 'datamatrix.png')]
+        with temp_directory_with_files(*paths) as tempdir:
+            paths = [tempdir / p.name for p in paths]
+            with ResultCache(tempdir / 'cache.sqlite', 'key') as cache:
+                for prefetch in (0, 2):
+                    engine = CountingEngine()
+                    results = list(decode_serially(
+                        paths, [shape_strategy], engine, False, prefetch,
+                        cache=cache
+                    ))
+                    self.assertEqual(
+                        [
+                            ('shape', [Barcode('Shape', '100x300')]),
+                            ('shape', [Barcode('Shape', '150x150')]),
+                        ],
+                        [tuple(result) for path, result, error in results]
+                    )
+                    self.assertEqual(0 if prefetch else 2, engine.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
 import shutil
 import sys
+import threading
+import time
 
 from pathlib import Path
 from contextlib import contextmanager
@@ -11,13 +13,15 @@ except ImportError:
     from io import StringIO
 
 
+from gouda.barcode import Barcode
 from gouda.engines import ZbarEngine
-from gouda.scripts.decode_barcodes import main
+from gouda.scripts.decode_barcodes import RenameVisitor, decode, main
+from gouda.watch import Watcher
 
+from .test_batch import shape_strategy
 from .utils import temp_directory_with_files
 
 
-
 @contextmanager
 def capture_stdout():
     sys.stdout, old_stdout = StringIO(), sys.stdout
@@ -47,7 +51,7 @@ class TestRename(unittest.TestCase):
 
         header = (
             'OS,Engine,Directory,File,Image.conversion,Elapsed,N.found,Types,'
-            'Values,Strategy'
+            'Values,Strategy,Read.time,Decode.time,Engine.calls,Timed.out'
         )
         self.assertEqual(header, lines[0])
 
@@ -117,5 +121,60 @@ class TestRename(unittest.TestCase):
             )
 
 
+class ValueEngine(object):
+    "Finds the same value in every image"
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, img):
+        self.calls += 1
+        return [Barcode('CODE128', b'Value')]
+
+
+class TestWatchRename(unittest.TestCase):
+    def _test(self, avoid_collisions, names, expected):
+        """Each image in names is decoded once when renamed files are within
+        the watched directory
+        """
+        with temp_directory_with_files() as tempdir:
+            for name in names:
+                shutil.copy(str(TESTDATA / 'code128.png'), str(tempdir / name))
+            watcher = Watcher(
+                [tempdir], settle=0.2, interval=0.1, polling=True
+            )
+            engine = ValueEngine()
+
+            def stop():
+                time.sleep(2)
+                watcher.stop()
+
+            thread = threading.Thread(target=stop)
+            thread.start()
+            try:
+                with capture_stdout():
+                    decode(
+                        [tempdir], [shape_strategy], engine,
+                        [RenameVisitor(avoid_collisions, watcher=watcher)],
+                        False, watcher=watcher
+                    )
+            finally:
+                thread.join()
+
+            self.assertEqual(len(names), engine.calls)
+            self.assertEqual(
+                expected, sorted(path.name for path in tempdir.iterdir())
+            )
+
+    def test_rename(self):
+        self._test(False, ['first.png'], ['Value.png'])
+
+    def test_avoid_collisions(self):
+        # Value.png is already correctly named, so is not renamed
+        self._test(
+            True, ['Value.png', 'first.png', 'second.png'],
+            ['Value-1.png', 'Value-2.png', 'Value.png']
+        )
+
+
 if __name__ == '__main__':
     unittest.main()
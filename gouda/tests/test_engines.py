@@ -1,15 +1,22 @@
 # -*- coding: utf-8 -*-
+import pickle
+import time
 import unittest
 import sys
 
 from pathlib import Path
 
 import cv2
+import numpy as np
 
 from gouda.barcode import Barcode
 from gouda.engines import (AccusoftEngine, DataSymbolEngine, DTKEngine,
                            InliteEngine, LibDMTXEngine, SoftekEngine,
-                           StecosEngine, ZbarEngine, ZxingEngine)
+                           StecosEngine, ZbarEngine, ZxingEngine,
+                           CompositeEngine)
+from gouda.engines.options import engine_factory
+from gouda.engines.zxing import ZxingResult
+from gouda.gouda_error import GoudaError
 
 
 # TODO LH Can Data Matrix barcodes handle unicode?
@@ -26,9 +33,9 @@ class TestEngine(unittest.TestCase):
     PDF417 = cv2.imread(str(TESTDATA / 'pdf417.png'))
     NOBARCODE = cv2.imread(str(TESTDATA / 'nobarcode.png'))
 
-    def _test_1d(self, engine, type='CODE128'):
+    def _test_1d(self, engine, type='CODE128', img=None):
         expected = [Barcode(type=type, data=b'Stegosaurus')]
-        res = engine(self.CODE128)
+        res = engine(self.CODE128 if img is None else img)
         self.assertEqual(expected, res)
         self.assertEqual([], engine(self.NOBARCODE))
 
@@ -100,6 +107,54 @@ class TestLibDMTXEngine(TestEngine):
     def test_dm(self):
         self._test_dm(LibDMTXEngine())
 
+    def test_options(self):
+        self._test_dm(LibDMTXEngine(
+            shrink=1, gap_size=2, min_edge=10, max_edge=1000, threshold=10,
+            expected_size='square'
+        ))
+        # Triceratops is encoded as a 16x16 barcode
+        self._test_dm(LibDMTXEngine(expected_size='16x16'))
+        self.assertEqual(
+            [], LibDMTXEngine(expected_size='rectangle')(self.DATAMATRIX)
+        )
+
+    def test_invalid_options(self):
+        self.assertRaises(ValueError, LibDMTXEngine, timeout_ms=0)
+        self.assertRaises(ValueError, LibDMTXEngine, ms_per_megapixel=0)
+        self.assertRaises(ValueError, LibDMTXEngine, shrink=0)
+        self.assertRaises(ValueError, LibDMTXEngine, threshold=101)
+        self.assertRaises(ValueError, LibDMTXEngine, min_edge=20, max_edge=10)
+        self.assertRaises(ValueError, LibDMTXEngine, expected_size='11x11')
+
+    def test_timeout(self):
+        engine = LibDMTXEngine(timeout_ms=300)
+        self.assertEqual(300, engine.timeout(4000, 3000))
+        engine = LibDMTXEngine(timeout_ms=300, ms_per_megapixel=100)
+        self.assertEqual(300, engine.timeout(4000, 3000))
+        self.assertEqual(100, engine.timeout(1000, 1000))
+        self.assertEqual(
+            LibDMTXEngine.MINIMUM_TIMEOUT_MS, engine.timeout(100, 100)
+        )
+        self._test_dm(engine)
+        engine = LibDMTXEngine(timeout_ms=None, ms_per_megapixel=100)
+        self.assertEqual(1200, engine.timeout(4000, 3000))
+
+    def test_region(self):
+        engine = LibDMTXEngine()
+        height, width = self.DATAMATRIX.shape[:2]
+        self.assertEqual(
+            [Barcode('Data Matrix', b'Triceratops')],
+            engine(self.DATAMATRIX, region=(0, 0, width, height))
+        )
+        # A region that does not contain the barcode
+        self.assertEqual(
+            [], LibDMTXEngine(margin=0)(self.DATAMATRIX, region=(0, 0, 5, 5))
+        )
+        self.assertRaises(
+            ValueError, engine, self.DATAMATRIX,
+            region=(width + 20, 0, width + 30, 10)
+        )
+
 
 @unittest.skipUnless(SoftekEngine.available(), 'SoftekEngine unavailable')
 class TestSoftekEngine(TestEngine):
@@ -111,13 +166,16 @@ class TestSoftekEngine(TestEngine):
         res = SoftekEngine(datamatrix=False)(self.CODE128)
         self.assertEqual(1, len(res))
         self.assertEqual('CODE128', res[0].type)
-        self.assertIn(res[0].data, ('Stegosau???', 'Stegosaurus'))
+        self.assertIn(res[0].data, (b'Stegosau???', b'Stegosaurus'))
 
     def test_dm(self):
         res = SoftekEngine(datamatrix=True)(self.DATAMATRIX)
         self.assertEqual(1, len(res))
         self.assertEqual('DATAMATRIX', res[0].type)
-        self.assertIn(res[0].data, ('Tricerat???', 'Triceratops'))
+        # Data are bytes on POSIX, text from COM on Windows
+        self.assertIn(res[0].data, (
+            b'Tricerat???', b'Triceratops', u'Tricerat???', u'Triceratops'
+        ))
 
 
 @unittest.skipUnless(StecosEngine.available(), 'StecosEngine unavailable')
@@ -128,13 +186,13 @@ class TestStecosEngine(TestEngine):
         res = StecosEngine(datamatrix=False)(self.CODE128)
         self.assertEqual(1, len(res))
         self.assertEqual('Code 128', res[0].type)
-        self.assertEqual('egosaurus', res[0].data[2:])
+        self.assertEqual(b'egosaurus', res[0].data[2:])
 
     def test_dm(self):
         res = StecosEngine(datamatrix=True)(self.DATAMATRIX)
         self.assertEqual(1, len(res))
         self.assertEqual('Data Matrix', res[0].type)
-        self.assertEqual('iceratops', res[0].data[2:])
+        self.assertEqual(b'iceratops', res[0].data[2:])
 
 
 @unittest.skipUnless(ZbarEngine.available(), 'ZbarEngine unavailable')
@@ -145,11 +203,255 @@ class TestZbarEngine(TestEngine):
     def test_qr(self):
         self._test_qr(ZbarEngine(), type='QRCODE')
 
+    def test_symbologies(self):
+        engine = ZbarEngine(symbologies=('CODE128', 'CODE39'))
+        self._test_1d(engine)
+        self.assertEqual([], engine(self.QRCODE))
+        self.assertRaises(ValueError, ZbarEngine, symbologies=('CODE129',))
+        self.assertRaises(ValueError, ZbarEngine, symbologies=())
+
+    def test_density(self):
+        self._test_1d(ZbarEngine(density=2))
+        self._test_1d(ZbarEngine(density=(1, 0)))
+        self.assertRaises(ValueError, ZbarEngine, density=0)
+        self.assertRaises(ValueError, ZbarEngine, density=(-1, 1))
+
+    def test_greyscale(self):
+        "Greyscale images and crops of them are decoded"
+        engine = ZbarEngine()
+        grey = cv2.cvtColor(self.CODE128, cv2.COLOR_BGR2GRAY)
+        self._test_1d(engine, img=grey)
+        padded = cv2.copyMakeBorder(
+            grey, 10, 10, 10, 10, cv2.BORDER_CONSTANT, value=0xff
+        )
+        self._test_1d(engine, img=padded[5:-5, 5:-5])
+        self.assertEqual([], engine(grey[:0]))
+
+    def test_close(self):
+        engine = ZbarEngine()
+        engine.close()
+        engine.close()
+        self.assertRaises(GoudaError, engine, self.CODE128)
+
 
 @unittest.skipUnless(ZxingEngine.available(), 'ZxingEngine unavailable')
 class TestZxingEngine(TestEngine):
     def test_dm(self):
         self._test_dm(ZxingEngine())
 
+    def test_results(self):
+        "Results include the locations of barcodes"
+        with ZxingEngine() as engine:
+            results = engine.results(self.DATAMATRIX)
+            self.assertEqual(1, len(results))
+            self.assertEqual(b'Triceratops', results[0].data)
+            self.assertLessEqual(3, len(results[0].points))
+            # The process is started once
+            engine(self.NOBARCODE)
+            self.assertEqual(1, engine.counters.spawns)
+
+
+class FakeZxingEngine(ZxingEngine):
+    "A ZxingEngine that uses zxing_worker.py in place of zxing_server"
+    @classmethod
+    def available(cls):
+        return True
+
+    def command(self):
+        return [sys.executable, str(TESTDATA.parent / 'zxing_worker.py')]
+
+
+class TestZxingProcess(unittest.TestCase):
+    IMG = np.full((20, 30), 0xff, dtype=np.uint8)
+
+    def test_results(self):
+        with FakeZxingEngine() as engine:
+            self.assertEqual(
+                [ZxingResult('Data Matrix', b'30x20', [(0, 0), (30, 20)])],
+                engine.results(self.IMG)
+            )
+            self.assertEqual(
+                [Barcode('Data Matrix', b'30x20')],
+                engine(cv2.cvtColor(self.IMG, cv2.COLOR_GRAY2BGR))
+            )
+            self.assertEqual([], engine(np.zeros((0, 10), dtype=np.uint8)))
+            self.assertEqual(1, engine.counters.spawns)
+
+    def test_error(self):
+        "Errors are raised without restarting the process"
+        with FakeZxingEngine() as engine:
+            self.assertRaises(GoudaError, engine, self.IMG[:, :1])
+            self.assertEqual(
+                [Barcode('Data Matrix', b'30x20')], engine(self.IMG)
+            )
+            self.assertEqual(1, engine.counters.spawns)
+
+    def test_restart(self):
+        "The process is restarted if it exits"
+        with FakeZxingEngine() as engine:
+            engine(self.IMG)
+            process, = engine.workers.running()
+            process.kill()
+            process.wait()
+            self.assertEqual(
+                [Barcode('Data Matrix', b'30x20')], engine(self.IMG)
+            )
+            self.assertEqual(2, engine.counters.spawns)
+
+            # An image that always causes the process to exit
+            self.assertRaises(GoudaError, engine, np.zeros_like(self.IMG))
+            self.assertEqual(3, engine.counters.spawns)
+            self.assertEqual(
+                [Barcode('Data Matrix', b'30x20')], engine(self.IMG)
+            )
+            self.assertEqual(4, engine.counters.spawns)
+
+    def test_close(self):
+        engine = FakeZxingEngine()
+        engine(self.IMG)
+        process, = engine.workers.running()
+        engine.close()
+        self.assertIsNotNone(process.poll())
+        engine.close()
+        # A new process is started when required
+        self.assertEqual([Barcode('Data Matrix', b'30x20')], engine(self.IMG))
+        self.assertEqual(2, engine.counters.spawns)
+        engine.close()
+
+
+class FixedEngine(object):
+    "Returns barcodes after sleeping for seconds; records the number of calls"
+    def __init__(self, barcodes, seconds=0):
+        self.barcodes = barcodes
+        self.seconds = seconds
+        self.calls = 0
+
+    def __call__(self, img):
+        self.calls += 1
+        time.sleep(self.seconds)
+        return list(self.barcodes)
+
+
+class RegionEngine(FixedEngine):
+    "Records the regions and shapes of the images that it is given"
+    region_hint = True
+
+    def __init__(self, barcodes):
+        super(RegionEngine, self).__init__(barcodes)
+        self.given = []
+
+    def __call__(self, img, region=None):
+        self.given.append((region, img.shape))
+        return super(RegionEngine, self).__call__(img)
+
+
+class ShapeEngine(FixedEngine):
+    "Records the shapes of the images that it is given"
+    def __init__(self, barcodes):
+        super(ShapeEngine, self).__init__(barcodes)
+        self.given = []
+
+    def __call__(self, img):
+        self.given.append(img.shape)
+        return super(ShapeEngine, self).__call__(img)
+
+
+class TestCompositeEngine(unittest.TestCase):
+    A = Barcode('CODE128', b'A')
+    B = Barcode('Data Matrix', b'B')
+
+    def test_all(self):
+        "Barcodes found by every engine are returned, without duplicates"
+        engine = CompositeEngine([
+            FixedEngine([self.A]), FixedEngine([]),
+            FixedEngine([self.B, self.A])
+        ])
+        self.assertEqual([self.A, self.B], engine(None))
+        self.assertEqual([1, 1, 1], [e.calls for e in engine.engines])
+
+    def test_first(self):
+        "Engines after the first to find barcodes are not called"
+        engines = [
+            FixedEngine([]), FixedEngine([self.B]), FixedEngine([self.A])
+        ]
+        engine = CompositeEngine(engines, mode='first')
+        self.assertEqual([self.B], engine(None))
+        self.assertEqual([1, 1, 0], [e.calls for e in engines])
+        self.assertEqual(
+            [], CompositeEngine([FixedEngine([])], mode='first')(None)
+        )
+
+    def test_cascade(self):
+        "The cheapest engine is called first once costs are known"
+        expensive = FixedEngine([self.A], seconds=0.02)
+        cheap = FixedEngine([self.B])
+        engine = CompositeEngine([expensive, cheap], mode='cascade')
+        self.assertEqual([0, 1], engine.order())
+        # Neither engine has been called, so the given order is used
+        self.assertEqual([self.A], engine(None))
+        self.assertEqual([1, 0], [expensive.calls, cheap.calls])
+        self.assertEqual([1, 0], engine.order())
+        self.assertEqual([self.B], engine(None))
+        self.assertEqual([1, 0], engine.order())
+        self.assertEqual([self.B], engine(None))
+        self.assertEqual([1, 2], [expensive.calls, cheap.calls])
+
+        # The expensive engine is called only when the cheap one fails
+        cheap.barcodes = []
+        self.assertEqual([self.A], engine(None))
+        self.assertEqual([2, 3], [expensive.calls, cheap.calls])
+
+    def test_region_hint(self):
+        "Regions are passed to engines that accept them"
+        self.assertFalse(CompositeEngine([FixedEngine([])]).region_hint)
+
+        region, shape = RegionEngine([self.B]), ShapeEngine([self.A])
+        engine = CompositeEngine([shape, region])
+        self.assertTrue(engine.region_hint)
+        img = np.zeros((100, 200), dtype=np.uint8)
+        self.assertEqual(
+            [self.A, self.B], engine(img, region=(10, 20, 50, 30))
+        )
+        self.assertEqual([((10, 20, 50, 30), (100, 200))], region.given)
+        # Other engines are given only the region
+        self.assertEqual([(10, 40)], shape.given)
+
+        engine(img)
+        self.assertEqual((None, (100, 200)), region.given[-1])
+        self.assertEqual((100, 200), shape.given[-1])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, CompositeEngine, [])
+        self.assertRaises(
+            ValueError, CompositeEngine, [FixedEngine([])], mode='best'
+        )
+
+    def test_engine_factory(self):
+        options = {'a': FixedEngine, 'b': FixedEngine}
+        self.assertIs(FixedEngine, engine_factory('a', options))
+        self.assertRaises(ValueError, engine_factory, 'c', options)
+        self.assertRaises(ValueError, engine_factory, 'a+c', options)
+        self.assertRaises(ValueError, engine_factory, 'a+a', options)
+
+        options = {'a': dict, 'b': list}
+        factory = engine_factory('a+b', options, mode='first')
+        # Factories can be given to worker processes
+        engine = pickle.loads(pickle.dumps(factory))()
+        self.assertEqual('first', engine.mode)
+        self.assertEqual([dict, list], [type(e) for e in engine.engines])
+
+
+@unittest.skipUnless(
+    ZbarEngine.available() and LibDMTXEngine.available(),
+    'ZbarEngine or LibDMTXEngine unavailable'
+)
+class TestZbarLibDMTXEngine(TestEngine):
+    def test_1d(self):
+        self._test_1d(engine_factory('zbar+libdmtx')())
+
+    def test_dm(self):
+        self._test_dm(engine_factory('zbar+libdmtx')())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,131 @@
+import os
+import unittest
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from gouda.batch import decode_image
+from gouda.engines.handoff import (FORMATS, ImageHandoff, encode,
+                                   shared_memory_directory)
+from gouda.strategies.resize import resize
+from gouda.timing import CountingEngine, handoff_seconds
+
+from .utils import temp_directory_with_files
+
+
+TESTDATA = Path(__file__).parent.joinpath('test_data')
+
+
+class FileEngine(object):
+    "Hands images over as files and records their contents"
+    def __init__(self, formats=('.tiff',)):
+        self.image_handoff = ImageHandoff(formats)
+        self.images = []
+
+    def __call__(self, img):
+        with self.image_handoff.file(img) as path:
+            self.images.append(cv2.imread(path, cv2.IMREAD_UNCHANGED))
+        return []
+
+
+class TestEncode(unittest.TestCase):
+    IMG = cv2.imread(str(TESTDATA.joinpath('code128.png')))
+
+    def test_formats(self):
+        "Images are encoded losslessly as greyscale"
+        grey = cv2.cvtColor(self.IMG, cv2.COLOR_BGR2GRAY)
+        for format in FORMATS:
+            decoded = cv2.imdecode(
+                np.frombuffer(encode(self.IMG, format), dtype=np.uint8),
+                cv2.IMREAD_UNCHANGED
+            )
+            self.assertTrue(np.array_equal(grey, decoded), format)
+
+    def test_colour(self):
+        decoded = cv2.imdecode(
+            np.frombuffer(
+                encode(self.IMG, '.bmp', greyscale=False), dtype=np.uint8
+            ),
+            cv2.IMREAD_UNCHANGED
+        )
+        self.assertTrue(np.array_equal(self.IMG, decoded))
+
+    def test_uncompressed(self):
+        grey = cv2.cvtColor(self.IMG, cv2.COLOR_BGR2GRAY)
+        self.assertLess(grey.size, len(encode(grey, '.tiff')))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, encode, self.IMG, '.jpg')
+
+
+class TestImageHandoff(unittest.TestCase):
+    IMG = np.arange(200, dtype=np.uint8).reshape(10, 20)
+
+    def test_cheapest_format(self):
+        with ImageHandoff(('.png', '.tiff', '.bmp')) as handoff:
+            self.assertEqual('.bmp', handoff.format)
+        self.assertRaises(ValueError, ImageHandoff, ('.jpg',))
+        self.assertRaises(ValueError, ImageHandoff, ('.bmp',), slots=0)
+
+    def test_files(self):
+        "Files are reused in turn"
+        with temp_directory_with_files() as directory:
+            handoff = ImageHandoff(
+                ('.pgm',), slots=2, directory=str(directory)
+            )
+            self.assertEqual(
+                str(directory), os.path.dirname(handoff.directory)
+            )
+            paths = set()
+            for value in range(5):
+                img = self.IMG + value
+                with handoff.file(img) as path:
+                    paths.add(path)
+                    self.assertTrue(np.array_equal(
+                        img, cv2.imread(path, cv2.IMREAD_UNCHANGED)
+                    ))
+            self.assertEqual(2, len(paths))
+
+            # Files in use are not reused
+            with handoff.file(self.IMG) as first:
+                with handoff.file(self.IMG) as second:
+                    self.assertNotEqual(first, second)
+
+            self.assertEqual(7, handoff.count)
+            self.assertLess(0, handoff.seconds)
+            handoff.close()
+            self.assertFalse(os.path.exists(handoff.directory))
+
+    def test_shared_memory(self):
+        self.assertTrue(os.path.isdir(shared_memory_directory()))
+
+
+class TestHandoffTiming(unittest.TestCase):
+    def test_counting_engine(self):
+        engine = FileEngine()
+        counting = CountingEngine(engine)
+        before = handoff_seconds()
+        counting(TestImageHandoff.IMG)
+        self.assertAlmostEqual(
+            engine.image_handoff.seconds, handoff_seconds() - before
+        )
+        self.assertAlmostEqual(engine.image_handoff.seconds, counting.handoff)
+        self.assertLessEqual(counting.handoff, counting.elapsed)
+
+    def test_decode_image(self):
+        img = cv2.imread(str(TESTDATA.joinpath('code128.png')))
+        engine = FileEngine()
+        result = decode_image(img, [resize], engine)
+        self.assertEqual(len(engine.images), result.timing.engine_calls)
+        self.assertAlmostEqual(
+            engine.image_handoff.seconds, result.timing.handoff
+        )
+        self.assertEqual(
+            result.timing.handoff, result.timing.as_dict()['handoff']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from pathlib import Path
+
+from gouda.journal import Journal
+from gouda.scripts.decode_barcodes import decode
+
+from .test_batch import ShapeEngine, shape_strategy
+from .utils import temp_directory_with_files
+
+
+TESTDATA = Path(__file__).parent / 'test_data'
+
+
+class RecordingVisitor(object):
+    def __init__(self):
+        self.paths = []
+
+    def result(self, path, result):
+        self.paths.append(path.name)
+
+
+class TestJournal(unittest.TestCase):
+    def test_resume(self):
+        with temp_directory_with_files() as tempdir:
+            journal = tempdir / 'journal'
+            with Journal(journal) as j:
+                self.assertNotIn('a.png', j)
+                j.record('a.png')
+                j.record(Path('b.png'))
+                self.assertIn('a.png', j)
+
+            with Journal(journal, resume=True) as j:
+                self.assertIn(Path('a.png'), j)
+                self.assertIn('b.png', j)
+                j.record('c.png')
+
+            with Journal(journal, resume=True) as j:
+                self.assertIn('a.png', j)
+                self.assertIn('c.png', j)
+
+            # A new journal
+            with Journal(journal) as j:
+                self.assertNotIn('a.png', j)
+
+    def test_incomplete_line(self):
+        "A line that was being written when a run stopped is ignored"
+        with temp_directory_with_files() as tempdir:
+            journal = tempdir / 'journal'
+            with Journal(journal) as j:
+                j.record('a.png')
+            with journal.open('ab') as f:
+                f.write(b'"/incomplete')
+
+            with Journal(journal, resume=True) as j:
+                self.assertIn('a.png', j)
+                j.record('b.png')
+
+            with Journal(journal, resume=True) as j:
+                self.assertIn('a.png', j)
+                self.assertIn('b.png', j)
+
+    def test_decode(self):
+        "Images in the journal are skipped"
+        paths = [TESTDATA / p for p in ('code128.png', 'datamatrix.png')]
+        with temp_directory_with_files(*paths) as tempdir:
+            images = tempdir / 'images'
+            images.mkdir()
+            for p in paths:
+                (tempdir / p.name).rename(images / p.name)
+
+            with Journal(tempdir / 'journal') as journal:
+                journal.record(images / 'code128.png')
+                visitor = RecordingVisitor()
+                decode([images], [shape_strategy], ShapeEngine(), [visitor],
+                       False, journal=journal)
+                self.assertEqual(['datamatrix.png'], visitor.paths)
+
+            with Journal(tempdir / 'journal', resume=True) as journal:
+                visitor = RecordingVisitor()
+                decode([images], [shape_strategy], ShapeEngine(), [visitor],
+                       False, journal=journal)
+                self.assertEqual([], visitor.paths)
+
+
+if __name__ == '__main__':
+    unittest.main()
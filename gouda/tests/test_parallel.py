@@ -0,0 +1,120 @@
+import threading
+import time
+import unittest
+
+from pathlib import Path
+
+import cv2
+
+from gouda.parallel import PerThreadEngine, first, imap
+from gouda.strategies.resize import resize
+from gouda.strategies.roi.roi import roi
+from gouda.timing import CountingEngine
+
+from .test_batch import ShapeEngine
+from .test_timing import SmallEngine
+
+
+TESTDATA = Path(__file__).parent.joinpath('test_data')
+
+
+class ThreadEngine(object):
+    "Records the thread on which it was constructed"
+    def __init__(self):
+        self.thread = threading.current_thread()
+
+    def __call__(self, img):
+        return [self]
+
+
+class Recorder(object):
+    "A function that records the items that it is called with"
+    def __init__(self, function):
+        self.function = function
+        self.items = []
+        self._lock = threading.Lock()
+
+    def __call__(self, item):
+        with self._lock:
+            self.items.append(item)
+        return self.function(item)
+
+
+def _slow_square(item):
+    # Later items finish first
+    time.sleep(0.01 * (5 - item % 5))
+    return item * item
+
+
+class TestImap(unittest.TestCase):
+    def test_order(self):
+        for threads in (1, 4):
+            self.assertEqual(
+                [(i, i * i) for i in range(10)],
+                list(imap(_slow_square, range(10), threads))
+            )
+
+    def test_until(self):
+        "Items after the one that satisfies until are not started"
+        function = Recorder(_slow_square)
+        results = list(imap(function, range(100), 4, until=lambda r: r > 8))
+        self.assertEqual([(0, 0), (1, 1), (2, 4), (3, 9)], results)
+        self.assertGreater(10, len(function.items))
+
+    def test_error(self):
+        "Errors are raised after the items before them"
+        def function(item):
+            if 2 == item:
+                raise ValueError('Failed')
+            return item
+
+        results = imap(function, range(10), 4)
+        self.assertEqual((0, 0), next(results))
+        self.assertEqual((1, 1), next(results))
+        self.assertRaises(ValueError, next, results)
+
+    def test_first(self):
+        for threads in (1, 3):
+            self.assertEqual((4, 16), first(
+                lambda i: i * i if i > 3 else 0, range(10), threads
+            ))
+            self.assertIsNone(first(lambda i: 0, range(10), threads))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, list, imap(abs, [1], 0))
+
+
+class TestPerThreadEngine(unittest.TestCase):
+    def test_per_thread(self):
+        engine = PerThreadEngine(ThreadEngine)
+        results = list(imap(engine, range(20), 4))
+        engines = set(r[0] for item, r in results)
+        self.assertLessEqual(len(engines), 4)
+        # Each engine was constructed by the thread that used it
+        self.assertEqual(len(engines), len(set(e.thread for e in engines)))
+
+
+class TestParallelStrategies(unittest.TestCase):
+    def test_resize(self):
+        "The first scale in order is reported, as when serial"
+        img = cv2.imread(str(TESTDATA.joinpath('code128.png')))
+        serial = CountingEngine(SmallEngine(100))
+        expected = resize(img, serial)
+        self.assertEqual(
+            'resize: scaling factor [0.3] sharpening [0]', expected[0]
+        )
+        for threads in (2, 8):
+            engine = CountingEngine(SmallEngine(100))
+            self.assertEqual(expected, resize(img, engine, threads=threads))
+            # No more than threads - 1 scales beyond the first to succeed
+            self.assertGreater(serial.calls + threads, engine.calls)
+
+    def test_roi(self):
+        img = cv2.imread(str(TESTDATA.joinpath('BM001128287.jpg')))
+        self.assertEqual(
+            roi(img, ShapeEngine()), roi(img, ShapeEngine(), threads=4)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
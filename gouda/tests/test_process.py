@@ -0,0 +1,195 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from functools import partial
+
+import numpy as np
+
+from gouda.barcode import Barcode
+from gouda.batch import DecoderPool
+from gouda.engines.handoff import ImageHandoff
+from gouda.engines.process import (CommandEngine, ProcessCounters,
+                                   WorkerPool, parse_lines)
+from gouda.gouda_error import GoudaError
+
+
+# Prints a line Type:Value with the name of the file given to it, after
+# sleeping if the name contains 'slow'
+PROGRAM = '''
+import os, sys, time
+path = sys.argv[1]
+if 'slow' in path:
+    time.sleep(10)
+if 'error' in path:
+    sys.stderr.write('Failed')
+print('Name:{0}'.format(os.path.basename(path)))
+'''
+
+
+class PythonEngine(CommandEngine):
+    "Runs PROGRAM"
+    def arguments(self, path):
+        return [sys.executable, '-c', PROGRAM, path]
+
+
+class ErrorPythonEngine(PythonEngine):
+    STDERR_IS_ERROR = True
+
+
+class DirectoryPythonEngine(PythonEngine):
+    "Hands images over in directory"
+    def __init__(self, directory):
+        super(DirectoryPythonEngine, self).__init__()
+        self.image_handoff.close()
+        self.image_handoff = ImageHandoff(self.FORMATS, directory=directory)
+
+
+def engine_strategy(img, engine):
+    return 'engine', engine(img)
+
+
+class TestParseLines(unittest.TestCase):
+    def test_parse(self):
+        output = b'CODE128:BM001\r\n\r\nnot a barcode\n Data Matrix : a:b \n'
+        self.assertEqual(
+            [Barcode('CODE128', b'BM001'), Barcode('Data Matrix', b'a:b')],
+            parse_lines(output)
+        )
+        self.assertEqual([], parse_lines(b''))
+        self.assertEqual([Barcode('QR', b'x')], parse_lines(u'QR:x'))
+
+
+class TestCommandEngine(unittest.TestCase):
+    def test_decode_files(self):
+        paths = ['a.tiff', 'b.tiff', 'c.tiff', 'd.tiff']
+        expected = [[Barcode('Name', p.encode('utf8'))] for p in paths]
+        for engine in (PythonEngine(), PythonEngine(processes=3)):
+            self.assertEqual(expected, engine.decode_files(paths))
+            # One run for each file
+            self.assertEqual(4, engine.counters.spawns)
+            self.assertEqual(4, engine.counters.calls)
+            self.assertLess(0, engine.counters.latency)
+
+    def test_call(self):
+        "Images are handed over as files"
+        engine = PythonEngine()
+        barcodes = engine(np.zeros((10, 10), dtype=np.uint8))
+        self.assertEqual(1, len(barcodes))
+        self.assertTrue(barcodes[0].data.endswith(b'.tiff'))
+        self.assertEqual(1, engine.image_handoff.count)
+
+    def test_close(self):
+        engine = PythonEngine()
+        engine(np.zeros((10, 10), dtype=np.uint8))
+        # Files are removed once the program has read them
+        self.assertEqual([], os.listdir(engine.image_handoff.directory))
+        with engine:
+            pass
+        self.assertFalse(os.path.exists(engine.image_handoff.directory))
+
+    def test_decoder_pool(self):
+        "Worker processes remove their files when they exit"
+        directory = tempfile.mkdtemp()
+        try:
+            pool = DecoderPool(
+                partial(DirectoryPythonEngine, directory), [engine_strategy],
+                False, 2
+            )
+            with pool:
+                path = os.path.join(
+                    os.path.dirname(__file__), 'test_data', 'code128.png'
+                )
+                [(path, result, error)] = list(pool.imap([path]))
+            self.assertIsNone(error)
+            self.assertEqual(1, len(result.barcodes))
+            self.assertEqual([], os.listdir(directory))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_timeout(self):
+        "Runs that take too long are killed and made again"
+        engine = PythonEngine(timeout=0.5)
+        self.assertRaises(GoudaError, engine.decode_file, 'slow.tiff')
+        self.assertEqual(2, engine.counters.spawns)
+        self.assertEqual(2, engine.counters.timeouts)
+        self.assertEqual(0, engine.counters.calls)
+
+    def test_stderr(self):
+        self.assertEqual(
+            [Barcode('Name', b'error.tiff')],
+            PythonEngine().decode_file('error.tiff')
+        )
+        self.assertRaises(
+            GoudaError, ErrorPythonEngine().decode_file, 'error.tiff'
+        )
+
+    def test_missing_program(self):
+        class MissingEngine(CommandEngine):
+            def arguments(self, path):
+                return ['/no/such/program', path]
+
+        engine = MissingEngine()
+        self.assertRaises(GoudaError, engine.decode_file, 'a.tiff')
+        self.assertEqual(1, engine.counters.failures)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, PythonEngine, timeout=0)
+        self.assertRaises(ValueError, PythonEngine, processes=0)
+
+
+class TestWorkerPool(unittest.TestCase):
+    def _echo(self, process):
+        process.stdin.write(b'x\n')
+        process.stdin.flush()
+        line = process.stdout.readline()
+        if not line:
+            raise EOFError()
+        return line
+
+    def test_call(self):
+        "Processes are reused"
+        command = [
+            sys.executable, '-c',
+            'import sys\nfor line in sys.stdin:\n'
+            '    sys.stdout.write(line)\n    sys.stdout.flush()'
+        ]
+        pool = WorkerPool(command)
+        try:
+            for _ in range(3):
+                self.assertEqual(b'x\n', pool.call(self._echo))
+            self.assertEqual(1, pool.counters.spawns)
+            self.assertEqual(3, pool.counters.calls)
+        finally:
+            pool.close()
+        self.assertEqual([], pool.running())
+
+    def test_timeout(self):
+        "Processes that take too long are killed and restarted"
+        command = [sys.executable, '-c', 'import time; time.sleep(10)']
+        pool = WorkerPool(command, timeout=0.5)
+        try:
+            self.assertRaises(GoudaError, pool.call, self._echo)
+            self.assertEqual(2, pool.counters.spawns)
+            self.assertEqual(2, pool.counters.timeouts)
+        finally:
+            pool.close()
+
+
+class TestProcessCounters(unittest.TestCase):
+    def test_counters(self):
+        counters = ProcessCounters()
+        self.assertIsNone(counters.latency)
+        counters.add(calls=1, seconds=2.0)
+        counters.add(timeouts=1, seconds=4.0)
+        self.assertEqual(3.0, counters.latency)
+        self.assertEqual({
+            'spawns': 0, 'calls': 1, 'timeouts': 1, 'failures': 0,
+            'seconds': 6.0, 'latency': 3.0,
+        }, counters.as_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
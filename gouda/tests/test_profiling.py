@@ -0,0 +1,100 @@
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import pstats
+
+import gouda.strategies.roi.decode
+
+from gouda.batch import decode_serially
+from gouda.profiling import (Profiler, _function, _is_engine_call,
+                             collapsed_stacks, summarise)
+from gouda.strategies.resize import resize
+from gouda.strategies.roi.roi import roi
+
+
+TESTDATA = Path(__file__).parent.joinpath('test_data')
+
+
+class NullEngine(object):
+    "An engine that never finds barcodes"
+    def __call__(self, img):
+        return []
+
+
+class TestProfiler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.profiler = Profiler()
+        with cls.profiler:
+            list(decode_serially(
+                [TESTDATA.joinpath('code128.png')], [resize, roi], NullEngine(),
+                True
+            ))
+
+    def test_summarise(self):
+        rows = dict(
+            (stage, (calls, seconds))
+            for stage, calls, seconds in summarise(self.profiler.stats())
+        )
+        self.assertEqual(1, rows['cv2.imread'][0])
+        # Each of the four levels of the pyramid is sharpened twice
+        self.assertEqual(8, rows['resize: _unsharpmask'][0])
+        self.assertLess(0, rows['cv2.resize'][0])
+        self.assertEqual(1, rows['Detector._compute_candidates'][0])
+        self.assertIn('Decoder preprocessing', rows)
+        # Operations within _compute_candidates are indented
+        self.assertTrue(any(s.startswith('  ') for s in rows))
+
+    def test_function(self):
+        "Functions are matched by the full paths of their modules"
+        source = gouda.strategies.roi.decode.__file__
+        source = source[:-1] if source.endswith('.pyc') else source
+        match = _function('strategies/roi/decode', '_decode_candidate')
+        self.assertTrue(match((source, 1, '_decode_candidate')))
+        self.assertFalse(match((source, 1, '_compute_barcodes')))
+        self.assertFalse(
+            match(('/lib/site-packages/other/decode.py', 1, '_decode_candidate'))
+        )
+        self.assertFalse(
+            _is_engine_call(('/lib/site-packages/engines/zbar.py', 1, '__call__'))
+        )
+
+    def test_print_summary(self):
+        out = StringIO()
+        self.profiler.print_summary(out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('Stage'))
+        self.assertTrue(lines[-1].startswith('Total'))
+
+    def test_collapsed_stacks(self):
+        lines = list(collapsed_stacks(self.profiler.stats()))
+        self.assertTrue(lines)
+        for line in lines:
+            stack, microseconds = line.rsplit(' ', 1)
+            self.assertLess(0, int(microseconds))
+        self.assertTrue(any('resize:_unsharpmask' in line for line in lines))
+
+    def test_dump(self):
+        tempdir = Path(tempfile.mkdtemp())
+        try:
+            self.profiler.dump(tempdir.joinpath('profile.pstats'))
+            stats = pstats.Stats(str(tempdir.joinpath('profile.pstats')))
+            self.assertTrue(stats.stats)
+
+            self.profiler.dump(tempdir.joinpath('profile.folded'))
+            with tempdir.joinpath('profile.folded').open() as f:
+                self.assertTrue(f.read())
+        finally:
+            shutil.rmtree(str(tempdir))
+
+
+if __name__ == '__main__':
+    unittest.main()
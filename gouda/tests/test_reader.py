@@ -0,0 +1,74 @@
+import unittest
+
+from pathlib import Path
+
+from gouda.reader import prefetch_images, read_images
+
+
+TESTDATA = Path(__file__).parent / 'test_data'
+
+# The small images
+PATHS = sorted(TESTDATA.glob('*.png')) + [TESTDATA / 'missing.png']
+
+
+class Unreadable(object):
+    "A path that raises an error when read"
+    def __str__(self):
+        raise ValueError('Unreadable')
+
+
+class TestReadImages(unittest.TestCase):
+    def test_read(self):
+        res = list(read_images(PATHS, False))
+        self.assertEqual(PATHS, [path for path, img, error in res])
+        self.assertEqual((100, 300, 3), res[0][1].shape)
+        self.assertEqual((None, None), res[-1][1:])
+
+    def test_error(self):
+        path, img, error = next(read_images([Unreadable()], False))
+        self.assertIsNone(img)
+        self.assertIn('Unreadable', error)
+
+
+class TestPrefetchImages(unittest.TestCase):
+    def _test(self, **kwargs):
+        paths = PATHS * 3
+        expected = list(read_images(paths, True))
+        actual = list(prefetch_images(paths, True, **kwargs))
+        self.assertEqual(
+            [path for path, img, error in expected],
+            [path for path, img, error in actual]
+        )
+        for (p, expected, e), (p, actual, e) in zip(expected, actual):
+            if expected is None:
+                self.assertIsNone(actual)
+            else:
+                self.assertEqual(expected.tolist(), actual.tolist())
+
+    def test_prefetch(self):
+        self._test()
+
+    def test_depth(self):
+        self._test(depth=1)
+        self._test(depth=20, threads=2)
+
+    def test_max_bytes(self):
+        self._test(depth=10, max_bytes=1)
+
+    def test_invalid_depth(self):
+        self.assertRaises(ValueError, next, prefetch_images(PATHS, True, depth=0))
+
+    def test_error(self):
+        res = list(prefetch_images([Unreadable(), PATHS[0]], False))
+        self.assertIn('Unreadable', res[0][2])
+        self.assertEqual((100, 300, 3), res[1][1].shape)
+
+    def test_close(self):
+        "Generator can be closed before all images have been read"
+        images = prefetch_images(PATHS, False, depth=2)
+        next(images)
+        images.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
 
-from gouda.strategies.roi.rect import Coordinates, Point, Rect
+import numpy as np
+
+from gouda.strategies.roi.filter import AreaFilter
+from gouda.strategies.roi.rect import Coordinates, Point, Rect, RectSet
 
 
 class TestCoordinates(unittest.TestCase):
@@ -56,5 +59,81 @@ class TestRect(unittest.TestCase):
             a == Point(1, 1)
 
 
+class TestRectSet(unittest.TestCase):
+    R = RectSet([Rect(0, 1, 2, 3), Rect(10, 10, 20, 5), Rect(5, 5, 0, 4)])
+
+    def test_rects(self):
+        self.assertEqual(3, len(self.R))
+        self.assertEqual(
+            [Rect(0, 1, 2, 3), Rect(10, 10, 20, 5), Rect(5, 5, 0, 4)],
+            list(self.R)
+        )
+        self.assertEqual(Rect(10, 10, 20, 5), self.R[1])
+        self.assertIsInstance(self.R[1:], RectSet)
+        self.assertEqual([Rect(5, 5, 0, 4)], list(self.R[np.array([2])]))
+        self.assertEqual(0, len(RectSet()))
+
+    def test_measures(self):
+        self.assertEqual([6, 100, 0], self.R.areas.tolist())
+        self.assertEqual([1.5, 4, np.inf], self.R.aspects.tolist())
+        self.assertEqual(
+            [[0, 1, 2, 4], [10, 10, 30, 15], [5, 5, 5, 9]],
+            self.R.coordinates.tolist()
+        )
+
+    def test_filter(self):
+        self.assertEqual([Rect(0, 1, 2, 3)], list(self.R.filter_area(1, 10)))
+        self.assertEqual(
+            [Rect(10, 10, 20, 5)], list(self.R.filter_area(min_area=10))
+        )
+        self.assertEqual(3, len(self.R.filter_area()))
+        self.assertEqual([Rect(0, 1, 2, 3)], list(self.R.filter_aspect(2)))
+
+    def test_area_filter(self):
+        self.assertEqual(
+            [Rect(10, 10, 20, 5)],
+            list(AreaFilter(min_area=10, max_area=1000).filter(list(self.R)))
+        )
+
+    def test_suppress(self):
+        rects = RectSet([
+            Rect(0, 0, 10, 10), Rect(1, 1, 10, 10), Rect(20, 0, 10, 10),
+            Rect(0, 0, 10, 12),
+        ])
+        # The second and fourth largely overlap the first
+        self.assertEqual(
+            [Rect(1, 1, 10, 10), Rect(20, 0, 10, 10)],
+            list(rects.suppress([1, 2, 1, 0]))
+        )
+        # Nothing overlaps enough to be suppressed
+        self.assertEqual(
+            [Rect(20, 0, 10, 10), Rect(0, 0, 10, 10), Rect(1, 1, 10, 10),
+             Rect(0, 0, 10, 12)],
+            list(rects.suppress([1, 1, 2, 0], threshold=1))
+        )
+        self.assertRaises(ValueError, rects.suppress, [1])
+
+    def test_merge(self):
+        rects = RectSet([
+            Rect(0, 0, 10, 10),
+            Rect(50, 50, 10, 10),
+            # Nested within the first
+            Rect(2, 2, 4, 4),
+            # Largely overlaps the second
+            Rect(51, 51, 10, 10),
+            # Overlaps the first only slightly
+            Rect(8, 8, 10, 10),
+        ])
+        self.assertEqual(
+            [Rect(0, 0, 10, 10), Rect(50, 50, 11, 11), Rect(8, 8, 10, 10)],
+            list(rects.merge())
+        )
+        self.assertEqual(
+            [Rect(0, 0, 18, 18), Rect(50, 50, 11, 11)],
+            list(rects.merge(threshold=0))
+        )
+        self.assertEqual(0, len(RectSet().merge()))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,165 @@
+import json
+import socket
+import threading
+import unittest
+
+from pathlib import Path
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+    from urllib.parse import quote
+except ImportError:
+    from urllib2 import HTTPError, Request, urlopen
+    from urllib import quote
+
+from gouda.barcode import Barcode
+from gouda.batch import DecodeResult, DecoderPool
+from gouda.server import DecodingServer, result_json
+
+from .test_batch import DyingEngine, ShapeEngine, shape_strategy
+
+
+TESTDATA = Path(__file__).parent.joinpath('test_data')
+
+
+class TestResultJson(unittest.TestCase):
+    def test_data(self):
+        "Values that are not valid UTF-8 are reported with replacements"
+        result = DecodeResult('shape', [
+            Barcode('Shape', b'BM\xff'), Barcode('Shape', u'BM\u00e9')
+        ])
+        self.assertEqual(
+            [u'BM\ufffd', u'BM\u00e9'],
+            [b['data'] for b in result_json(result, 0)['barcodes']]
+        )
+
+
+class ServerTestCase(unittest.TestCase):
+    "Serves requests using a pool of one worker that holds an ENGINE"
+    ENGINE = ShapeEngine
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = DecoderPool(cls.ENGINE, [shape_strategy], False, 1)
+        cls.server = DecodingServer(
+            ('127.0.0.1', 0), cls.pool, 'shape', max_pending=1, root=TESTDATA,
+            max_bytes=1024 * 1024
+        )
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.url = 'http://127.0.0.1:{0}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.pool.__exit__(None, None, None)
+
+    def _request(self, path, data=None):
+        "Returns a tuple (status, JSON response)"
+        try:
+            response = urlopen(Request(self.url + path, data), timeout=30)
+        except HTTPError as e:
+            response = e
+        try:
+            return response.code, json.loads(response.read().decode('utf8'))
+        finally:
+            response.close()
+
+    def _raw_post(self, body, length):
+        "Sends body with a Content-Length of length and returns the status"
+        connection = socket.create_connection(self.server.server_address, 30)
+        try:
+            connection.sendall(
+                'POST /decode HTTP/1.1\r\nHost: localhost\r\n'
+                'Content-Length: {0}\r\n\r\n'.format(length).encode('ascii') +
+                body
+            )
+            if len(body) < length:
+                connection.shutdown(socket.SHUT_WR)
+            return int(connection.makefile('rb').readline().split()[1])
+        finally:
+            connection.close()
+
+
+class TestDecodingServer(ServerTestCase):
+    def test_post(self):
+        with TESTDATA.joinpath('code128.png').open('rb') as f:
+            status, body = self._request('/decode', f.read())
+        self.assertEqual(200, status)
+        self.assertEqual('shape', body['strategy'])
+        self.assertEqual([{'type': 'Shape', 'data': '100x300'}], body['barcodes'])
+        self.assertEqual(1, body['timing']['engine_calls'])
+        self.assertLessEqual(0, body['elapsed'])
+
+    def test_not_an_image(self):
+        status, body = self._request('/decode', b'not an image')
+        self.assertEqual(400, status)
+        self.assertEqual('Not an image', body['error'])
+
+    def test_path(self):
+        path = str(TESTDATA.joinpath('code128.png'))
+        status, body = self._request('/decode?path=' + quote(path))
+        self.assertEqual(200, status)
+        self.assertEqual([{'type': 'Shape', 'data': '100x300'}], body['barcodes'])
+
+        status, body = self._request('/decode?path=' + quote(__file__))
+        self.assertEqual(403, status)
+
+        status, body = self._request(
+            '/decode?path=' + quote(str(TESTDATA.joinpath('missing.png')))
+        )
+        self.assertEqual(404, status)
+
+    def test_too_large(self):
+        path = str(TESTDATA.joinpath('BM001128287.jpg'))
+        status, body = self._request('/decode?path=' + quote(path))
+        self.assertEqual(413, status)
+
+    def test_busy(self):
+        "Requests are refused when all slots are held"
+        with self.server._slot():
+            with TESTDATA.joinpath('code128.png').open('rb') as f:
+                status, body = self._request('/decode', f.read())
+        self.assertEqual(503, status)
+
+    def test_busy_not_read(self):
+        "Requests are refused before their bodies are sent"
+        with self.server._slot():
+            self.assertEqual(503, self._raw_post(b'', 1000))
+
+    def test_incomplete(self):
+        self.assertEqual(400, self._raw_post(b'x' * 10, 1000))
+        # The slot was released
+        self.assertEqual(0, self._request('/health')[1]['pending'])
+        data = TESTDATA.joinpath('code128.png').read_bytes()
+        self.assertEqual(200, self._request('/decode', data)[0])
+
+    def test_health(self):
+        status, body = self._request('/health')
+        self.assertEqual(200, status)
+        self.assertEqual('shape', body['engine'])
+        self.assertEqual(0, body['pending'])
+        self.assertEqual(1, body['max_pending'])
+
+    def test_not_found(self):
+        self.assertEqual(404, self._request('/nothing')[0])
+
+
+class TestWorkerDied(ServerTestCase):
+    ENGINE = DyingEngine
+
+    def test_post(self):
+        "Requests for images that kill the worker release their slots"
+        data = TESTDATA.joinpath('code128.png').read_bytes()
+        for attempt in range(2):
+            status, body = self._request('/decode', data)
+            self.assertEqual(500, status)
+            self.assertIn('Worker process died', body['error'])
+            self.assertEqual(0, self._request('/health')[1]['pending'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,19 @@ import unittest
 
 from pathlib import Path
 
+from gouda.barcode import Barcode
 from gouda.engines import InliteEngine, LibDMTXEngine, ZbarEngine, SoftekEngine
+from gouda.parallel import PerThreadEngine
+from gouda.strategies.roi.decode import Decoder
+from gouda.strategies.roi.detect import Detector
+from gouda.strategies.roi.filter import AreaFilter
+from gouda.strategies.roi.rect import Rect
 from gouda.strategies.roi.roi import roi
-from gouda.strategies.resize import resize
+from gouda.strategies.resize import FACTORS, module_size, resize
+from gouda.timing import CountingEngine
 
 import cv2
+import numpy as np
 
 
 TESTDATA = Path(__file__).parent / 'test_data'
@@ -108,5 +116,157 @@ class TestStrategies(unittest.TestCase):
         self.assertIsNone(resize(img, engine, minimum_pixels=3))
 
 
+class RecordingEngine(object):
+    "An engine that records the images that it is given and finds nothing"
+    def __init__(self):
+        self.images = []
+
+    def __call__(self, img):
+        self.images.append(img)
+        return []
+
+
+class TestResize(unittest.TestCase):
+    def test_sizes(self):
+        "The image is given to the engine at each factor and sharpening"
+        img = cv2.imread(str(TESTDATA / 'BM001128287.jpg'))
+        height, width = img.shape[:2]
+        engine = RecordingEngine()
+        self.assertIsNone(resize(img, engine, minimum_pixels=100))
+        expected = [
+            (int(round(height * f)), int(round(width * f)), 3)
+            for f in FACTORS
+            if 1 == f or min(height, width) * f >= 99.5
+        ]
+        self.assertEqual(
+            3 * expected, [i.shape for i in engine.images]
+        )
+        self.assertIs(img, engine.images[0])
+        # Sharpened images differ from the original
+        count = len(expected)
+        for index in range(count):
+            self.assertFalse(np.array_equal(
+                engine.images[index], engine.images[count + index]
+            ))
+
+    def test_coarse(self):
+        img = np.zeros((100, 200), dtype=np.uint8)
+        engine = RecordingEngine()
+        self.assertIsNone(resize(img, engine, search='coarse'))
+        widths = [i.shape[1] for i in engine.images]
+        self.assertEqual([200, 160, 120, 80, 40, 180, 140, 100], widths[:8])
+        # All scales are tried at each level of sharpening
+        self.assertEqual(57, len(widths))
+        self.assertEqual(widths[:19], widths[19:38])
+        self.assertEqual(sorted(widths[:19]), sorted(
+            int(round(200 * f)) for f in FACTORS if f >= 0.1
+        ))
+
+    def test_module(self):
+        "Scales closest to a module size of three pixels are tried first"
+        # Stripes six pixels wide
+        img = np.tile(
+            np.repeat(np.array([0, 255] * 50, dtype=np.uint8), 6), (200, 1)
+        )
+        self.assertEqual(6, module_size(img))
+        self.assertIsNone(module_size(np.zeros((200, 200), dtype=np.uint8)))
+
+        engine = RecordingEngine()
+        self.assertIsNone(resize(img, engine, search='module'))
+        self.assertEqual(300, engine.images[0].shape[1])
+        # All scales are tried at each level of sharpening
+        self.assertEqual(60, len(engine.images))
+
+    def test_invalid_search(self):
+        img = np.zeros((100, 200), dtype=np.uint8)
+        self.assertRaises(
+            ValueError, resize, img, RecordingEngine(), search='random'
+        )
+
+
+class NumberingEngine(RecordingEngine):
+    "Finds a different barcode in each image that it is given"
+    def __call__(self, img):
+        self.images.append(img)
+        return [Barcode('Number', len(self.images))]
+
+
+class RegionEngine(object):
+    "Records the regions and shapes of the images that it is given"
+    region_hint = True
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, img, region=None):
+        self.calls.append((region, img.shape))
+        return []
+
+
+class TestRoi(unittest.TestCase):
+    IMG = cv2.imread(str(TESTDATA / 'BM001128287.jpg'))
+
+    def test_scores(self):
+        "Candidates are decoded in decreasing order of score"
+        detector = Detector(self.IMG)
+        candidates = AreaFilter().filter(detector.candidates)
+        ordered = candidates.suppress(detector.scores(candidates))
+        self.assertTrue(all(r in list(candidates) for r in ordered))
+        scores = [detector.score(r) for r in ordered]
+        self.assertEqual(sorted(scores, reverse=True), scores)
+        self.assertTrue(all(0 <= s <= 1 for s in scores))
+        self.assertEqual(0, detector.score(Rect(0, 0, 0, 10)))
+
+    def test_expected(self):
+        "Candidates are not decoded once expected barcodes have been found"
+        img = np.zeros((100, 100), dtype=np.uint8)
+        candidates = [Rect(10 * i, 0, 10, 10) for i in range(5)]
+        engine = NumberingEngine()
+        self.assertEqual(5, len(list(Decoder(img, candidates, engine))))
+
+        engine = NumberingEngine()
+        barcodes = list(Decoder(img, candidates, engine, expected=2))
+        self.assertEqual([1, 2], [b.data for b in barcodes])
+        self.assertEqual(2, len(engine.images))
+
+        # Barcodes in candidates that were under way are also reported
+        engine = NumberingEngine()
+        barcodes = list(
+            Decoder(img, candidates, engine, expected=2, threads=2)
+        )
+        self.assertLessEqual(2, len(barcodes))
+        self.assertGreater(4, len(engine.images))
+
+        self.assertRaises(
+            ValueError, Decoder, img, candidates, engine, expected=0
+        )
+
+    def test_region_hint(self):
+        "Engines with a region_hint are given the candidate and its context"
+        img = np.zeros((200, 200), dtype=np.uint8)
+        candidates = [Rect(10, 100, 20, 30)]
+        engine = RegionEngine()
+        list(Decoder(img, candidates, engine))
+        # Context is clipped to the left of the image
+        self.assertEqual(((10, 32, 30, 62), (94, 62)), engine.calls[0])
+
+        # Through the wrappers used by decode_image and by threads
+        engine = RegionEngine()
+        list(Decoder(
+            img, candidates, CountingEngine(PerThreadEngine(lambda: engine))
+        ))
+        self.assertEqual(((10, 32, 30, 62), (94, 62)), engine.calls[0])
+
+        # Other engines are given only the candidate
+        engine = NumberingEngine()
+        list(Decoder(img, candidates, engine))
+        self.assertEqual((30, 20), engine.images[0].shape)
+
+    def test_roi_expected(self):
+        method, barcodes = roi(self.IMG, NumberingEngine(), expected=1)
+        self.assertEqual('roi', method)
+        self.assertEqual([1], [b.data for b in barcodes])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,198 @@
+import json
+import pickle
+import time
+import unittest
+
+from functools import partial
+from pathlib import Path
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import numpy as np
+
+from gouda.barcode import Barcode
+from gouda.batch import (DecodeResult, DecoderPool, decode_image,
+                         decode_serially)
+from gouda.cache import ResultCache
+from gouda.gouda_error import DeadlineExceeded
+from gouda.scripts.decode_barcodes import JSONLinesReportVisitor
+from gouda.strategies.resize import resize, scale_and_sharpening
+from gouda.strategies.roi.decode import Decoder
+from gouda.strategies.roi.rect import Rect
+from gouda.strategies.roi.roi import roi
+from gouda.timing import CountingEngine, Timing, clock
+
+from .test_batch import ShapeEngine, shape_strategy
+from .utils import temp_directory_with_files
+
+
+TESTDATA = Path(__file__).parent.joinpath('test_data')
+
+
+class SmallEngine(object):
+    """An engine that finds a barcode only in images no wider than width
+    """
+    def __init__(self, width):
+        self.width = width
+
+    def __call__(self, img):
+        if img.shape[1] <= self.width:
+            return [Barcode('Small', 'x')]
+        else:
+            return []
+
+
+class TestTiming(unittest.TestCase):
+    def test_counting_engine(self):
+        engine = CountingEngine(SmallEngine(10))
+        self.assertEqual(10, engine.width)
+        self.assertEqual([], engine(np.zeros((20, 20), dtype=np.uint8)))
+        # Calls that raise are counted
+        self.assertRaises(AttributeError, engine, None)
+        self.assertEqual(2, engine.calls)
+        self.assertLessEqual(0, engine.elapsed)
+
+    def test_scale_and_sharpening(self):
+        self.assertEqual(
+            (0.85, 2),
+            scale_and_sharpening('resize: scaling factor [0.85] sharpening [2]')
+        )
+        self.assertIsNone(scale_and_sharpening('roi'))
+        self.assertIsNone(scale_and_sharpening(None))
+
+    def test_resize(self):
+        "Winning scale and number of engine calls are recorded"
+        path = TESTDATA.joinpath('code128.png')
+        results = list(decode_serially([path], [resize], SmallEngine(250), True))
+        [(p, result, error)] = results
+        self.assertIsNone(error)
+        timing = result.timing
+        # Width of image is 300
+        self.assertEqual(0.8, timing.scale)
+        self.assertEqual(0, timing.sharpening)
+        self.assertEqual(5, timing.engine_calls)
+        self.assertEqual([('resize', timing.decode, 5)], timing.strategies)
+        self.assertLess(0, timing.read)
+        self.assertFalse(timing.cached)
+
+    def test_no_barcodes(self):
+        "All strategies are recorded if no barcodes are found"
+        path = TESTDATA.joinpath('code128.png')
+        [(p, result, error)] = decode_serially(
+            [path], [resize, partial(resize, minimum_pixels=100)],
+            SmallEngine(0), True
+        )
+        self.assertEqual((None, []), result)
+        self.assertEqual(
+            ['resize', 'resize(minimum_pixels=100)'],
+            [s[0] for s in result.timing.strategies]
+        )
+        self.assertIsNone(result.timing.scale)
+
+    def test_pickle(self):
+        timing = Timing()
+        timing.read = 1.0
+        result = pickle.loads(pickle.dumps(DecodeResult('s', [], timing)))
+        self.assertEqual(('s', []), result)
+        self.assertEqual(1.0, result.timing.read)
+
+    def test_pool(self):
+        "Timings are sent from worker processes"
+        path = TESTDATA.joinpath('code128.png')
+        with DecoderPool(ShapeEngine, [shape_strategy], False, 1) as pool:
+            [(p, result, error)] = pool.imap([path])
+        self.assertEqual(1, result.timing.engine_calls)
+        self.assertLess(0, result.timing.read)
+
+    def test_jsonl(self):
+        path = TESTDATA.joinpath('code128.png')
+        out = StringIO()
+        visitor = JSONLinesReportVisitor('shape', False, out)
+        for p, result, error in decode_serially(
+                [path], [shape_strategy], ShapeEngine(), False):
+            visitor.result(p, result)
+        # Results that lack timings
+        visitor.result(path, ('shape', []))
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(2, len(lines))
+        record = json.loads(lines[0])
+        self.assertEqual(str(path), record['path'])
+        self.assertEqual([{'type': 'Shape', 'data': '100x300'}], record['barcodes'])
+        self.assertEqual('shape', record['strategy'])
+        self.assertEqual(1, record['timing']['engine_calls'])
+        self.assertEqual(
+            ['shape_strategy'],
+            [s['strategy'] for s in record['timing']['strategies']]
+        )
+        self.assertIsNone(json.loads(lines[1])['timing'])
+
+
+class SlowEngine(object):
+    """An engine that takes delay seconds to find barcodes - the first call
+    finds a barcode if found_first is True
+    """
+    def __init__(self, delay, found_first=False):
+        self.delay = delay
+        self.found_first = found_first
+        self.calls = 0
+
+    def __call__(self, img):
+        time.sleep(self.delay)
+        self.calls += 1
+        return [Barcode('Slow', 'x')] if self.found_first and 1 == self.calls else []
+
+
+class TestDeadline(unittest.TestCase):
+    IMG = np.zeros((200, 200), dtype=np.uint8)
+
+    def test_engine(self):
+        engine = CountingEngine(SlowEngine(0), deadline=clock() - 1)
+        self.assertRaises(DeadlineExceeded, engine, self.IMG)
+        self.assertTrue(engine.timed_out)
+        self.assertEqual(0, engine.calls)
+
+    def test_resize(self):
+        "Strategies stop between calls to the engine"
+        engine = SlowEngine(0.05)
+        result = decode_image(self.IMG, [resize, roi], engine, timeout=0.1)
+        self.assertEqual((None, []), result)
+        self.assertTrue(result.timing.timed_out)
+        self.assertGreater(5, engine.calls)
+        # roi was not run
+        self.assertEqual(['resize'], [s[0] for s in result.timing.strategies])
+
+    def test_no_timeout(self):
+        result = decode_image(self.IMG, [resize], SlowEngine(0), timeout=10)
+        self.assertFalse(result.timing.timed_out)
+
+    def test_partial(self):
+        "Decoder reports barcodes that were found before the deadline"
+        engine = CountingEngine(
+            SlowEngine(0.1, found_first=True), deadline=clock() + 0.05
+        )
+        candidates = [Rect(0, 0, 50, 50), Rect(50, 50, 50, 50)]
+        self.assertEqual(
+            [Barcode('Slow', 'x')], list(Decoder(self.IMG, candidates, engine))
+        )
+        self.assertTrue(engine.timed_out)
+        self.assertEqual(1, engine.calls)
+
+    def test_not_cached(self):
+        "Results of images that timed out are not cached"
+        with temp_directory_with_files(TESTDATA.joinpath('code128.png')) as tempdir:
+            path = tempdir.joinpath('code128.png')
+            with ResultCache(str(tempdir.joinpath('cache.sqlite')), 'k') as cache:
+                [(p, result, error)] = decode_serially(
+                    [path], [resize], SlowEngine(0.05), True, cache=cache,
+                    timeout=0.01
+                )
+                self.assertTrue(result.timing.timed_out)
+                self.assertIsNone(cache.lookup(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import shutil
+import unittest
+
+from pathlib import Path
+
+from gouda.walk import FileFilter, is_image_file, walk
+
+from .utils import temp_directory_with_files
+
+
+TESTDATA = Path(__file__).parent / 'test_data'
+
+
+class TestWalk(unittest.TestCase):
+    def setUp(self):
+        self._context = temp_directory_with_files()
+        self.root = self._context.__enter__()
+        for d in ('a', 'b/c', 'thumbs'):
+            (self.root / d).mkdir(parents=True)
+        for name in ('a/2.png', 'a/1.jpg', 'b/c/3.PNG', 'thumbs/4.png'):
+            shutil.copy(str(TESTDATA / 'code128.png'), str(self.root / name))
+        (self.root / 'b/notes.xml').write_bytes(b'<notes/>')
+        (self.root / 'b/junk.tif').write_bytes(b'junk')
+
+    def tearDown(self):
+        self._context.__exit__(None, None, None)
+
+    def _walk(self, *args, **kwargs):
+        return [
+            p.relative_to(self.root).as_posix()
+            for p in walk([self.root], FileFilter(*args, **kwargs))
+        ]
+
+    def test_default(self):
+        "Files and directories are visited together in order of name"
+        self.assertEqual(
+            ['a/1.jpg', 'a/2.png', 'b/c/3.PNG', 'b/junk.tif', 'thumbs/4.png'],
+            self._walk()
+        )
+
+    def test_all_files(self):
+        self.assertIn('b/notes.xml', self._walk(extensions=None))
+
+    def test_check_magic(self):
+        self.assertEqual(
+            ['a/1.jpg', 'a/2.png', 'b/c/3.PNG', 'thumbs/4.png'],
+            self._walk(extensions=None, check_magic=True)
+        )
+
+    def test_include_exclude(self):
+        self.assertEqual(
+            ['a/2.png', 'b/c/3.PNG'],
+            self._walk(include=['*.png', '*.PNG'], exclude=['thumbs'])
+        )
+        self.assertEqual(
+            ['a/1.jpg', 'a/2.png', 'b/junk.tif', 'thumbs/4.png'],
+            self._walk(exclude=['b/c'])
+        )
+
+    def test_files(self):
+        "Paths of files are yielded even if they would not be selected"
+        self.assertEqual(
+            [self.root / 'b/notes.xml'], list(walk([self.root / 'b/notes.xml']))
+        )
+
+    def test_is_image_file(self):
+        self.assertTrue(is_image_file(TESTDATA / 'BM001128287.jpg'))
+        self.assertTrue(is_image_file(TESTDATA / 'code128.png'))
+        self.assertFalse(is_image_file(self.root / 'b/junk.tif'))
+        self.assertFalse(is_image_file(self.root / 'missing.png'))
+
+
+if __name__ == '__main__':
+    unittest.main()
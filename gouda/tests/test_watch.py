@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from pathlib import Path
+
+from gouda.walk import FileFilter
+from gouda.watch import Watcher, _libc_inotify
+
+from .utils import temp_directory_with_files
+
+
+TESTDATA = Path(__file__).parent / 'test_data'
+
+
+class TestWatcher(unittest.TestCase):
+    def _test(self, polling):
+        with temp_directory_with_files(TESTDATA / 'code128.png') as tempdir:
+            watcher = Watcher(
+                [tempdir], settle=0.2, interval=0.1, polling=polling
+            )
+
+            def create():
+                time.sleep(0.3)
+                (tempdir / 'sub').mkdir()
+                shutil.copy(
+                    str(TESTDATA / 'qrcode.png'), str(tempdir / 'sub/new.png')
+                )
+                (tempdir / 'notes.xml').write_bytes(b'<notes/>')
+                time.sleep(1)
+                watcher.stop()
+
+            thread = threading.Thread(target=create)
+            thread.start()
+            try:
+                paths = list(watcher)
+            finally:
+                thread.join()
+
+            self.assertEqual(
+                [tempdir / 'code128.png', tempdir / 'sub/new.png'], paths
+            )
+
+    def _watch(self, watcher, change):
+        "Returns the paths iterated by watcher while change is called"
+        def run():
+            try:
+                change()
+                time.sleep(1)
+            finally:
+                watcher.stop()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        try:
+            return list(watcher)
+        finally:
+            thread.join()
+
+    def _test_include(self, polling):
+        "Patterns are matched relative to the watched directory"
+        with temp_directory_with_files(TESTDATA / 'code128.png') as tempdir:
+            # A tree that is moved into the watched directory as a whole
+            staging = Path(tempfile.mkdtemp(dir=str(tempdir)))
+            (staging / 'sub').mkdir()
+            shutil.copy(str(TESTDATA / 'qrcode.png'), str(staging / 'sub'))
+            watcher = Watcher(
+                [tempdir], FileFilter(include=['sub/*.png']), settle=0.2,
+                interval=0.1, polling=polling
+            )
+
+            def change():
+                time.sleep(0.3)
+                os.rename(str(staging / 'sub'), str(tempdir / 'sub'))
+
+            self.assertEqual(
+                [tempdir / 'sub/qrcode.png'], self._watch(watcher, change)
+            )
+
+    def _test_removed(self, polling):
+        "Files that are removed and then replaced are iterated again"
+        with temp_directory_with_files(TESTDATA / 'code128.png') as tempdir:
+            path = tempdir / 'code128.png'
+            # Replaced by a file with the same size and modification time
+            os.utime(str(path), (1000000000, 1000000000))
+            watcher = Watcher(
+                [tempdir], settle=0.2, interval=0.1, polling=polling
+            )
+
+            def change():
+                time.sleep(0.5)
+                data = path.read_bytes()
+                path.unlink()
+                time.sleep(0.5)
+                path.write_bytes(data)
+                os.utime(str(path), (1000000000, 1000000000))
+
+            self.assertEqual([path, path], self._watch(watcher, change))
+
+    def test_polling(self):
+        self._test(True)
+        self._test_include(True)
+        self._test_removed(True)
+
+    @unittest.skipUnless(_libc_inotify(), 'inotify unavailable')
+    def test_inotify(self):
+        self._test(False)
+        self._test_include(False)
+        self._test_removed(False)
+
+    def test_not_directory(self):
+        self.assertRaises(ValueError, Watcher, [TESTDATA / 'code128.png'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""Stands in for gouda/java/zxing_server in tests, speaking the same protocol.
+
+Each image is reported as holding a single Data Matrix barcode whose text is
+the size of the image. An image that is one pixel wide is reported as an
+error and an image that is entirely black causes the process to exit.
+"""
+import struct
+import sys
+
+
+def main():
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+    stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+    while True:
+        header = stdin.read(8)
+        if not header:
+            break
+        width, height = struct.unpack('>ii', header)
+        pixels = stdin.read(width * height)
+        if 1 == width:
+            message = b'java.lang.IllegalArgumentException'
+            stdout.write(struct.pack('>ii', -1, len(message)) + message)
+        elif not any(bytearray(pixels)):
+            sys.exit(1)
+        else:
+            text = '{0}x{1}'.format(width, height).encode('utf8')
+            stdout.write(struct.pack('>i', 1))
+            stdout.write(struct.pack('>i', 11) + b'DATA_MATRIX')
+            stdout.write(struct.pack('>i', len(text)) + text)
+            stdout.write(struct.pack('>iffff', 2, 0, 0, width, height))
+        stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Timing the stages of decoding an image
+"""
+import threading
+import timeit
+
+from gouda.gouda_error import DeadlineExceeded, DecodingCancelled
+
+
+# The most precise wall-clock timer available
+clock = timeit.default_timer
+
+
+# Time spent by each thread handing images to engines that run in other
+# processes
+_handoff = threading.local()
+
+
+def record_handoff(seconds):
+    "Records seconds spent by this thread handing an image to an engine"
+    _handoff.seconds = handoff_seconds() + seconds
+
+
+def handoff_seconds():
+    "Total time recorded by record_handoff on this thread"
+    return getattr(_handoff, 'seconds', 0.0)
+
+
+class Timing(object):
+    """Time spent, in seconds, on the stages of processing an image.
+
+    read - reading the image, or None if it was not read
+    strategies - list of tuples (strategy, seconds, engine calls), one for
+        each strategy that was run, in order
+    engine_calls - number of calls to the engine
+    engine - time spent within calls to the engine
+    handoff - time, within engine, spent handing images to engines that run
+        in other processes
+    scale, sharpening - of the image in which the resize strategy found
+        barcodes, otherwise None
+    reduction - the image was decoded at 1 / reduction of its size, as read
+        from its file
+    cached - True if the result was taken from a cache, in which case the
+        image was neither read nor decoded
+    timed_out - True if decoding stopped because the time allowed for the
+        image ran out, in which case the result holds only the barcodes
+        found before then
+    """
+    def __init__(self, cached=False):
+        self.read = None
+        self.strategies = []
+        self.engine_calls = 0
+        self.engine = 0.0
+        self.handoff = 0.0
+        self.scale = self.sharpening = None
+        self.reduction = 1
+        self.cached = cached
+        self.timed_out = False
+
+    def __repr__(self):
+        return 'Timing({0!r})'.format(self.as_dict())
+
+    @property
+    def decode(self):
+        "Time spent running strategies"
+        return sum(seconds for strategy, seconds, calls in self.strategies)
+
+    @property
+    def total(self):
+        "Time spent reading and decoding"
+        return (self.read or 0.0) + self.decode
+
+    def as_dict(self):
+        "A dict of the timings, suitable for serializing as JSON"
+        return {
+            'read': self.read,
+            'decode': self.decode,
+            'total': self.total,
+            'strategies': [
+                {'strategy': strategy, 'seconds': seconds, 'engine_calls': calls}
+                for strategy, seconds, calls in self.strategies
+            ],
+            'engine_calls': self.engine_calls,
+            'engine': self.engine,
+            'handoff': self.handoff,
+            'scale': self.scale,
+            'sharpening': self.sharpening,
+            'reduction': self.reduction,
+            'cached': self.cached,
+            'timed_out': self.timed_out,
+        }
+
+
+class CountingEngine(object):
+    """Wraps an engine, counting the calls made to it and the time spent
+    within them. Other attributes are those of the wrapped engine.
+
+    If deadline, a value of clock(), is given, calls made after it raise
+    DeadlineExceeded, so that strategies stop between calls to the engine.
+    Likewise, if cancelled, a threading.Event, is given, calls made once it
+    is set raise DecodingCancelled.
+
+    Can be called from more than one thread, in which case elapsed is the
+    sum of the time spent in each thread. handoff is the part of elapsed that
+    was recorded by record_handoff. Keyword arguments, such as the region
+    given by the roi strategy, are passed to the engine.
+    """
+    def __init__(self, engine, deadline=None, cancelled=None):
+        self.engine = engine
+        self.deadline = deadline
+        self.cancelled = cancelled
+        self.calls = 0
+        self.elapsed = 0.0
+        self.handoff = 0.0
+        self.timed_out = False
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name in ('engine', '_lock'):
+            # Not yet set - avoid infinite recursion
+            raise AttributeError(name)
+        return getattr(self.engine, name)
+
+    def __call__(self, img, **kwargs):
+        start = clock()
+        if self.cancelled is not None and self.cancelled.is_set():
+            raise DecodingCancelled('Decoding cancelled')
+        elif self.deadline is not None and start >= self.deadline:
+            self.timed_out = True
+            raise DeadlineExceeded('Deadline exceeded')
+        handoff = handoff_seconds()
+        try:
+            return self.engine(img, **kwargs)
+        finally:
+            elapsed = clock() - start
+            handoff = handoff_seconds() - handoff
+            with self._lock:
+                self.calls += 1
+                self.elapsed += elapsed
+                self.handoff += handoff
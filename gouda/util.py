@@ -2,9 +2,12 @@ from __future__ import print_function
 
 import glob
 
+from functools import partial
+
 from pathlib import Path
 
 import cv2
+import numpy as np
 
 try:
     from winreg import OpenKey, HKEY_LOCAL_MACHINE
@@ -21,11 +24,84 @@ def debug_print(*args, **kwargs):
         print(*args, **kwargs)
 
 
-def read_image(path, greyscale):
-    if greyscale:
-        return cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+def describe_strategy(strategy):
+    "A textual description of strategy, which might be a functools.partial"
+    if isinstance(strategy, partial):
+        args = [repr(a) for a in strategy.args]
+        args += sorted(
+            '{0}={1!r}'.format(k, v) for k, v in strategy.keywords.items()
+        )
+        return '{0}({1})'.format(
+            describe_strategy(strategy.func), ', '.join(args)
+        )
+    else:
+        return getattr(strategy, '__name__', None) or type(strategy).__name__
+
+
+def barcode_text(data):
+    """The text of data, the value of a Barcode, which could be either str or
+    bytes. bytes are decoded as UTF-8; bytes that are not valid UTF-8 are
+    replaced by U+FFFD.
+    """
+    return data.decode('utf8', 'replace') if isinstance(data, bytes) else data
+
+
+# Factors by which images can be reduced when they are read
+REDUCTIONS = (1, 2, 4, 8)
+
+
+def _imread_flags(greyscale, reduction):
+    "Flags for cv2.imread or None if cv2 cannot read at reduction"
+    if 1 == reduction:
+        return cv2.IMREAD_GRAYSCALE if greyscale else cv2.IMREAD_COLOR
+    elif reduction not in REDUCTIONS:
+        raise ValueError('Invalid reduction [{0}]'.format(reduction))
+    else:
+        # Not available before OpenCV 3.2
+        return getattr(cv2, 'IMREAD_REDUCED_{0}_{1}'.format(
+            'GRAYSCALE' if greyscale else 'COLOR', reduction
+        ), None)
+
+
+def _reduce(img, reduction):
+    "Used when cv2 cannot read images at reduced size"
+    if img is None or 1 == reduction:
+        return img
+    else:
+        return cv2.resize(
+            img, None, fx=1.0 / reduction, fy=1.0 / reduction,
+            interpolation=cv2.INTER_AREA
+        )
+
+
+def read_image(path, greyscale, reduction=1):
+    """Returns the image at path, or None if path could not be read.
+
+    If reduction - one of REDUCTIONS - is greater than 1, the image is read at
+    1 / reduction of its size. JPEG images are then decoded at the reduced
+    size, which is much faster and needs much less memory.
+    """
+    flags = _imread_flags(greyscale, reduction)
+    if flags is None:
+        return _reduce(
+            cv2.imread(str(path), _imread_flags(greyscale, 1)), reduction
+        )
+    else:
+        return cv2.imread(str(path), flags)
+
+
+def read_image_data(data, greyscale, reduction=1):
+    """Returns the image encoded in data - the contents of an image file - or
+    None if data is not an image. See read_image for reduction.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    flags = _imread_flags(greyscale, reduction)
+    if flags is None:
+        return _reduce(
+            cv2.imdecode(buffer, _imread_flags(greyscale, 1)), reduction
+        )
     else:
-        return cv2.imread(str(path))
+        return cv2.imdecode(buffer, flags)
 
 
 def expand_wildcard(args):
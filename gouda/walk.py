@@ -0,0 +1,148 @@
+"""Finding image files in directory trees
+"""
+import fnmatch
+import os
+
+from pathlib import Path
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
+from gouda.util import debug_print
+
+
+# Extensions of the image formats that OpenCV can read
+IMAGE_EXTENSIONS = frozenset([
+    '.bmp', '.dib', '.jpeg', '.jpg', '.jpe', '.jp2', '.png', '.webp', '.pbm',
+    '.pgm', '.ppm', '.pnm', '.sr', '.ras', '.tiff', '.tif',
+])
+
+
+# Leading bytes of the image formats that OpenCV can read
+_MAGIC = (
+    b'\xff\xd8\xff',                          # JPEG
+    b'\x89PNG\r\n\x1a\n',                     # PNG
+    b'II*\x00', b'MM\x00*',                   # TIFF
+    b'BM',                                    # Windows bitmap
+    b'\x00\x00\x00\x0cjP  \r\n\x87\n',        # JPEG 2000
+    b'\xff\x4f\xff\x51',                      # JPEG 2000 codestream
+    b'\x59\xa6\x6a\x95',                      # Sun raster
+    b'P1', b'P2', b'P3', b'P4', b'P5', b'P6',  # Portable bitmaps
+)
+
+
+def is_image_file(path):
+    "Returns True if the leading bytes of path are those of an image format"
+    try:
+        with open(str(path), 'rb') as f:
+            header = f.read(16)
+    except EnvironmentError:
+        return False
+    else:
+        return (
+            header.startswith(_MAGIC) or
+            (header.startswith(b'RIFF') and b'WEBP' == header[8:12])
+        )
+
+
+class FileFilter(object):
+    """Selects files found in directories.
+
+    Files are selected if their extensions are in extensions - any file if
+    extensions is None - and, if check_magic is True, if their leading bytes
+    are those of an image format.
+
+    include and exclude are sequences of glob patterns. Patterns that contain
+    a '/' are matched against paths relative to the directory being walked,
+    others against names. If include is given, only files that match at least
+    one of include are selected. Files and directories that match any of
+    exclude are skipped.
+    """
+    def __init__(self, extensions=IMAGE_EXTENSIONS, check_magic=False,
+                 include=None, exclude=None):
+        if extensions is not None:
+            extensions = frozenset(e.lower() for e in extensions)
+        self.extensions = extensions
+        self.check_magic = check_magic
+        self.include = list(include) if include else []
+        self.exclude = list(exclude) if exclude else []
+
+    @staticmethod
+    def _matches(patterns, name, relative):
+        return any(
+            fnmatch.fnmatch(relative if '/' in p else name, p) for p in patterns
+        )
+
+    def accept_dir(self, name, relative):
+        "Returns True if the directory should be walked"
+        return not self._matches(self.exclude, name, relative)
+
+    def accept_file(self, path, name, relative):
+        "Returns True if the file should be processed"
+        if (self.extensions is not None and
+                os.path.splitext(name)[1].lower() not in self.extensions):
+            return False
+        elif self.include and not self._matches(self.include, name, relative):
+            return False
+        elif self._matches(self.exclude, name, relative):
+            return False
+        elif self.check_magic and not is_image_file(path):
+            debug_print('Not an image [{0}]'.format(path))
+            return False
+        else:
+            return True
+
+
+def _listing(directory):
+    "Returns an iterator of the entries in directory, sorted by name"
+    try:
+        return iter(sorted(scandir(directory), key=lambda e: e.name))
+    except EnvironmentError as e:
+        debug_print('Unable to list [{0}]: [{1}]'.format(directory, e))
+        return iter([])
+
+
+def walk_directory(directory, file_filter=None, relative=''):
+    """Generator of Paths of files within directory selected by file_filter.
+    relative is the path of directory, ending with '/', relative to the
+    directory against which file_filter's patterns are matched - for
+    example, a directory that is being watched.
+    """
+    # Directories are visited depth first and the entries in each are visited
+    # in order of name, whether files or subdirectories. Only the listings of
+    # the directories between directory and the current entry are held in
+    # memory.
+    file_filter = file_filter or FileFilter()
+    pending = [(_listing(str(directory)), relative)]
+    while pending:
+        entries, relative = pending[-1]
+        entry = next(entries, None)
+        if entry is None:
+            pending.pop()
+            continue
+
+        entry_relative = relative + entry.name
+        if entry.is_dir():
+            if file_filter.accept_dir(entry.name, entry_relative):
+                pending.append((_listing(entry.path), entry_relative + '/'))
+        elif file_filter.accept_file(entry.path, entry.name, entry_relative):
+            yield Path(entry.path)
+
+
+def walk(paths, file_filter=None):
+    """Generator of Paths of files in paths. Paths of directories are walked
+    and the files within them selected by file_filter - by default, files with
+    image extensions. Paths of files are always yielded.
+
+    Paths are yielded in a stable order as they are found, rather than after
+    the whole tree has been listed.
+    """
+    file_filter = file_filter or FileFilter()
+    for p in sorted(Path(p) for p in paths):
+        if p.is_dir():
+            for f in walk_directory(p, file_filter):
+                yield f
+        else:
+            yield p
@@ -0,0 +1,374 @@
+"""Watching directories for new image files
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from collections import deque
+from pathlib import Path
+
+from gouda.util import debug_print
+from gouda.walk import FileFilter, walk, walk_directory
+
+
+# File systems on which inotify does not report changes made by other hosts
+NETWORK_FILE_SYSTEMS = frozenset([
+    '9p', 'afs', 'cifs', 'fuse.sshfs', 'ncpfs', 'nfs', 'nfs4', 'smb3', 'smbfs',
+])
+
+
+def _libc_inotify():
+    "Returns libc if it provides inotify, otherwise None"
+    if sys.platform.startswith('linux'):
+        try:
+            libc = ctypes.CDLL(
+                ctypes.util.find_library('c') or 'libc.so.6', use_errno=True
+            )
+            libc.inotify_init1
+        except (OSError, AttributeError):
+            pass
+        else:
+            return libc
+    return None
+
+
+def file_system_type(path):
+    """Returns the type of the file system that contains path, as given in
+    /proc/mounts, or None if that is not known
+    """
+    try:
+        with open('/proc/mounts') as f:
+            mounts = [line.split() for line in f]
+    except EnvironmentError:
+        return None
+    else:
+        path = os.path.realpath(str(path))
+        best, fs_type = '', None
+        for mount in mounts:
+            # Spaces in mount points are escaped as \040
+            point = mount[1].replace('\\040', ' ')
+            prefix = point.rstrip('/') + '/'
+            if ((path == point or path.startswith(prefix)) and
+                    len(point) > len(best)):
+                best, fs_type = point, mount[2]
+        return fs_type
+
+
+class _Inotify(object):
+    """A minimal interface to Linux's inotify, via ctypes
+    """
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+
+    IN_CLOEXEC = 0o2000000
+    IN_NONBLOCK = 0o4000
+
+    MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+            IN_CREATE | IN_DELETE)
+    REMOVED = IN_MOVED_FROM | IN_DELETE
+
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, libc):
+        self._libc = libc
+        self._fd = libc.inotify_init1(self.IN_CLOEXEC | self.IN_NONBLOCK)
+        if self._fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        # Mapping from watch descriptor to directory
+        self._watches = {}
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def add(self, directory):
+        wd = self._libc.inotify_add_watch(
+            self._fd, str(directory).encode(sys.getfilesystemencoding()),
+            self.MASK | self.IN_ONLYDIR
+        )
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), str(directory))
+        self._watches[wd] = str(directory)
+
+    def read(self, timeout):
+        """Returns a list of tuples (path, is_dir, removed) for events that
+        occur within timeout seconds. removed is True if path was deleted or
+        moved away. None is returned if the kernel's queue of events
+        overflowed, in which case events were lost.
+        """
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if errno.EAGAIN == e.errno:
+                return []
+            else:
+                raise
+
+        events, offset, overflowed = [], 0, False
+        while offset < len(buffer):
+            wd, mask, cookie, length = self.EVENT.unpack_from(buffer, offset)
+            offset += self.EVENT.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                overflowed = True
+            elif mask & self.IN_IGNORED:
+                self._watches.pop(wd, None)
+            elif wd in self._watches and name:
+                path = os.path.join(
+                    self._watches[wd], name.decode(sys.getfilesystemencoding())
+                )
+                events.append((
+                    path, bool(mask & self.IN_ISDIR), bool(mask & self.REMOVED)
+                ))
+        return None if overflowed else events
+
+
+class Watcher(object):
+    """Iterates Paths of files within directories as they are created or
+    modified, once they are stable - their sizes and modification times have
+    not changed for settle seconds. Files are selected by file_filter - see
+    gouda.walk.FileFilter. If existing is True, files that exist when watching
+    starts are also iterated.
+
+    inotify is used where it is available, unless polling is True. inotify does
+    not report changes made by other hosts to network file systems, so by
+    default directories on network file systems are polled. Directories are
+    polled every interval seconds.
+
+    Files that the caller creates within the directories, for example by
+    renaming files that were iterated, can be excluded by ignore().
+
+    Iteration does not end until stop() is called.
+    """
+    def __init__(self, paths, file_filter=None, settle=2.0, interval=5.0,
+                 polling=None, existing=True):
+        if settle < 0:
+            raise ValueError('Invalid settle [{0}]'.format(settle))
+        elif interval <= 0:
+            raise ValueError('Invalid interval [{0}]'.format(interval))
+
+        self.directories = [Path(p) for p in paths]
+        for d in self.directories:
+            if not d.is_dir():
+                raise ValueError('Not a directory [{0}]'.format(d))
+
+        self.file_filter = file_filter or FileFilter()
+        self.settle, self.interval = settle, interval
+        self.existing = existing
+
+        libc = _libc_inotify()
+        if polling is None:
+            polling = not libc or any(
+                file_system_type(d) in NETWORK_FILE_SYSTEMS
+                for d in self.directories
+            )
+        elif not polling and not libc:
+            raise ValueError('inotify is not available')
+        self.polling = polling
+        self._libc = libc
+
+        # Mapping from path to (signature, time at which signature was seen)
+        self._candidates = {}
+        # Mapping from path to signature of files that have been iterated,
+        # forgotten once they no longer exist
+        self._done = {}
+        # Tuples (path, signature) given to ignore, not yet added to _done
+        self._ignored = deque()
+        self._stopped = False
+
+    def __iter__(self):
+        return self.watch()
+
+    def stop(self):
+        "Iteration ends after the next file or the next check for files"
+        self._stopped = True
+
+    def ignore(self, path):
+        """Records that path, a file that the caller has created, is not to be
+        iterated unless it later changes. Can be called from any thread.
+        """
+        path = Path(path)
+        try:
+            self._ignored.append((path, self._signature(path)))
+        except EnvironmentError:
+            pass
+
+    def _add_ignored(self):
+        "Adds files given to ignore to those that have been iterated"
+        while self._ignored:
+            path, signature = self._ignored.popleft()
+            self._candidates.pop(path, None)
+            self._done[path] = signature
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(str(path))
+        return stat.st_size, stat.st_mtime
+
+    def _seen(self, path):
+        "Records that path might be new or might have changed"
+        self._add_ignored()
+        path = Path(path)
+        if path not in self._candidates:
+            try:
+                signature = self._signature(path)
+            except EnvironmentError:
+                # Deleted or moved before it could be examined
+                return
+            if self._done.get(path) != signature:
+                self._candidates[path] = (signature, time.time())
+
+    def _stable(self):
+        "Returns a sorted list of candidate paths that have become stable"
+        self._add_ignored()
+        now, stable = time.time(), []
+        for path, (signature, since) in list(self._candidates.items()):
+            try:
+                current = self._signature(path)
+            except EnvironmentError:
+                del self._candidates[path]
+            else:
+                if current != signature:
+                    self._candidates[path] = (current, now)
+                elif now - since >= self.settle:
+                    del self._candidates[path]
+                    self._done[path] = signature
+                    stable.append(path)
+        return sorted(stable)
+
+    def _scan(self, directories):
+        """Examines the files within directories, which must be those being
+        watched, and forgets files that have been iterated but no longer
+        exist
+        """
+        found = set()
+        for path in walk(directories, self.file_filter):
+            found.add(path)
+            self._seen(path)
+        for path in [p for p in self._done if p not in found]:
+            del self._done[path]
+
+    def _scan_directory(self, directory):
+        """Examines the files within directory, a subdirectory of one of
+        those being watched
+        """
+        relative = self._relative(directory) + '/'
+        for path in walk_directory(directory, self.file_filter, relative):
+            self._seen(path)
+
+    def _removed(self, path, is_dir):
+        "Forgets path, and the files within it if it is a directory"
+        path = Path(path)
+        if is_dir:
+            for p in [p for p in self._done if path in p.parents]:
+                del self._done[p]
+        else:
+            self._done.pop(path, None)
+
+    def _relative(self, path):
+        for d in self.directories:
+            try:
+                return Path(path).relative_to(d).as_posix()
+            except ValueError:
+                pass
+        return Path(path).name
+
+    def _watch_tree(self, inotify, directory):
+        "Watches directory and its subdirectories"
+        inotify.add(directory)
+        for root, dirs, files in os.walk(str(directory)):
+            for name in list(dirs):
+                path = os.path.join(root, name)
+                if self.file_filter.accept_dir(name, self._relative(path)):
+                    inotify.add(path)
+                else:
+                    dirs.remove(name)
+
+    def watch(self):
+        "Generator of Paths of files as they become stable"
+        self._stopped = False
+        inotify = None if self.polling else _Inotify(self._libc)
+        try:
+            if inotify:
+                debug_print('Watching {0} using inotify'.format(
+                    [str(d) for d in self.directories]
+                ))
+                for d in self.directories:
+                    self._watch_tree(inotify, d)
+            else:
+                debug_print('Polling {0} every [{1}] seconds'.format(
+                    [str(d) for d in self.directories], self.interval
+                ))
+
+            if self.existing:
+                self._scan(self.directories)
+            else:
+                # Consider only files that are created or modified from now
+                for path in walk(self.directories, self.file_filter):
+                    try:
+                        self._done[path] = self._signature(path)
+                    except EnvironmentError:
+                        pass
+            polled = time.time()
+
+            while not self._stopped:
+                for path in self._stable():
+                    debug_print('Stable [{0}]'.format(path))
+                    yield path
+                    if self._stopped:
+                        return
+
+                # Check candidates frequently enough to notice when they
+                # become stable
+                timeout = self.interval
+                if self._candidates:
+                    timeout = min(timeout, max(0.1, self.settle / 4.0))
+
+                if inotify:
+                    events = inotify.read(timeout)
+                    if events is None:
+                        debug_print('inotify queue overflowed')
+                        self._scan(self.directories)
+                    else:
+                        for path, is_dir, removed in events:
+                            name = os.path.basename(path)
+                            relative = self._relative(path)
+                            if removed:
+                                self._removed(path, is_dir)
+                            elif is_dir:
+                                if self.file_filter.accept_dir(name, relative):
+                                    # Watch the new directory and examine any
+                                    # files created before it was watched
+                                    self._watch_tree(inotify, path)
+                                    self._scan_directory(path)
+                            elif self.file_filter.accept_file(
+                                    path, name, relative):
+                                self._seen(path)
+                else:
+                    time.sleep(timeout)
+                    if time.time() - polled >= self.interval:
+                        polled = time.time()
+                        self._scan(self.directories)
+        finally:
+            if inotify:
+                inotify.close()
@@ -3,7 +3,7 @@ import sys
 
 import gouda
 
-SCRIPTS = ['decode_barcodes']
+SCRIPTS = ['decode_barcodes', 'serve_barcodes']
 
 URL = 'https://github.com/NaturalHistoryMuseum/gouda/'
 
@@ -18,8 +18,8 @@ setup_data = {
     'description': gouda.__doc__,
     'long_description': 'Visit {0} for more details.'.format(URL),
     'packages': [
-        'gouda', 'gouda.engines', 'gouda.java', 'gouda.strategies',
-        'gouda.strategies.roi', 'gouda.tests',
+        'gouda', 'gouda.benchmarks', 'gouda.engines', 'gouda.java',
+        'gouda.strategies', 'gouda.strategies.roi', 'gouda.tests',
     ],
     'include_package_data': True,
     'test_suite': 'gouda.tests',
@@ -37,7 +37,9 @@ setup_data = {
         'numpy>=1.8.2',
     ],
     'extras_require': {
-        ':python_version=="2.7"': ['pathlib>=1.0.1'],
+        ':python_version=="2.7"': [
+            'futures>=3.0.5', 'pathlib>=1.0.1', 'scandir>=1.5'
+        ],
     },
     'classifiers': [
         'Development Status :: 4 - Beta',